@@ -0,0 +1,94 @@
+"""
+Benchmark of the symbolic MPO construction for ab initio Hamiltonians.
+
+For each FCIDUMP file (or random integrals with ``--random NORB``) the build time of the
+operator table, the symbolic MPO and the numeric MPO is reported together with the
+peak memory traced during the construction and the MPO bond dimension. Example::
+
+    python benchmark_symbolic_mpo.py h2o_fcidump.txt ../renormalizer/mps/tests/H6.txt --random 10
+"""
+
+import argparse
+import json
+import logging
+import re
+import time
+import tracemalloc
+
+import numpy as np
+
+from renormalizer import Model, Mpo
+from renormalizer.model import h_qc
+from renormalizer.mps.symbolic_mpo import construct_symbolic_mpo, _terms_to_table
+
+
+def read_norb(fname):
+    with open(fname) as fin:
+        return int(re.search(r"NORB\s*=\s*(\d+)", fin.readline()).group(1))
+
+
+def random_integrals(norb, seed=2020):
+    # the same as ``RANDOM_INTEGRAL`` in h2o_qc.py. No symmetry is present so the MPO is large
+    rng = np.random.default_rng(seed)
+    spin_norbs = norb * 2
+    h1e = rng.uniform(-1, 1, size=(spin_norbs, spin_norbs))
+    h2e = rng.uniform(-1, 1, size=(spin_norbs, spin_norbs, spin_norbs, spin_norbs))
+    h1e = 0.5 * (h1e + h1e.T)
+    h2e = 0.5 * (h2e + h2e.transpose((2, 3, 0, 1)))
+    return h1e, h2e
+
+
+def run(name, h1e, h2e):
+    basis, ham_terms = h_qc.qc_model(h1e, h2e)
+    model = Model(basis, ham_terms)
+    res = {"name": name, "nterms": len(ham_terms)}
+
+    time0 = time.perf_counter()
+    table, factor = _terms_to_table(model, model.ham_terms, 0)
+    time1 = time.perf_counter()
+    construct_symbolic_mpo(table, factor)
+    time2 = time.perf_counter()
+    res["table_time"] = time1 - time0
+    res["symbolic_time"] = time2 - time1
+
+    # tracing slows down the construction, so the memory is measured in a separate run
+    tracemalloc.start()
+    construct_symbolic_mpo(table, factor)
+    res["symbolic_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+    tracemalloc.stop()
+    del table, factor
+
+    time0 = time.perf_counter()
+    mpo = Mpo(model)
+    res["mpo_time"] = time.perf_counter() - time0
+    res["max_bond_dim"] = max(mpo.bond_dims)
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fcidump", nargs="*", help="FCIDUMP files")
+    parser.add_argument("--random", type=int, nargs="*", default=[], metavar="NORB",
+                        help="number of spatial orbitals of random integrals")
+    parser.add_argument("--json", help="append the results to the file in JSON lines")
+    args = parser.parse_args()
+    logging.getLogger("renormalizer").setLevel(logging.WARNING)
+
+    inputs = []
+    for fname in args.fcidump:
+        inputs.append((fname, lambda fname=fname: h_qc.read_fcidump(fname, read_norb(fname))[:2]))
+    for norb in args.random:
+        inputs.append((f"random-{norb}", lambda norb=norb: random_integrals(norb)))
+
+    for name, get_integrals in inputs:
+        res = run(name, *get_integrals())
+        print(f"{res['name']}: {res['nterms']} terms, bond dim {res['max_bond_dim']}, "
+              f"table {res['table_time']:.2f} s, symbolic {res['symbolic_time']:.2f} s "
+              f"(peak {res['symbolic_peak_mb']:.1f} MB), Mpo {res['mpo_time']:.2f} s")
+        if args.json is not None:
+            with open(args.json, "a") as fout:
+                fout.write(json.dumps(res) + "\n")
+
+
+if __name__ == "__main__":
+    main()
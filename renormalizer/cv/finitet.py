@@ -55,6 +55,10 @@ class SpectraFtCV(SpectraCv):
         see test/test_abs.py for example
 
     """
+
+    # the identity is the first block and -H is the last block
+    a_identity_idx = 0
+
     def __init__(
         self,
         model,
@@ -99,8 +103,6 @@ class SpectraFtCV(SpectraCv):
         self.cv_mpo = self.cv_mps
         self.b_mpo = self.b_mps
 
-        self.a_oper = None
-
     def init_cv_mpo(self):
         cv_mpo = Mpo.finiteT_cv(self.model, 1, self.m_max,
                                 self.spectratype, percent=1.0)
@@ -159,8 +161,11 @@ class SpectraFtCV(SpectraCv):
         return self.dump_dir is not None and self.job_name is not None
 
     def oper_prepare(self, omega):
-        identity = Mpo.identity(self.model).scale(omega)
-        self.a_oper = identity.add(self.h_mpo.scale(-1, inplace=False))
+        # a_oper = omega - H as I \oplus -H with the coefficient of the identity block
+        if self.a_blocks is None:
+            assert len(self.h_mpo) > 1
+            self.a_blocks = Mpo.identity(self.model).add(self.h_mpo.scale(-1, inplace=False))
+        self.a_coeff = omega
 
     def optimize_cv(self, lr_group, isite, percent=0):
         if self.spectratype == "abs":
@@ -228,7 +233,7 @@ class SpectraFtCV(SpectraCv):
                 moveaxis(self.b_mpo[isite - 1], (1, 2), (2, 1)),
                 forth_R)[self.condition(dag_qnmat, [down_exciton, up_exciton])]
 
-        a_oper_isite = asxp(self.a_oper[isite - 1])
+        a_oper_isite = self.a_oper_site(isite - 1)
         h_mpo_isite = asxp(self.h_mpo[isite - 1])
         # construct preconditioner
         Idt = xp.identity(h_mpo_isite.shape[1])
@@ -606,13 +611,13 @@ class SpectraFtCV(SpectraCv):
                          ([1, 0], "bcde, fedb->cf")]
                 first_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite],
-                    dag_cv_isite, self.a_oper[isite - 1],
-                    self.a_oper[isite - 1], cv_isite))
+                    dag_cv_isite, self.a_blocks[isite - 1],
+                    self.a_blocks[isite - 1], cv_isite))
 
                 second_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, second_LR[isite],
                     dag_cv_isite,
-                    self.a_oper[isite - 1], cv_isite,
+                    self.a_blocks[isite - 1], cv_isite,
                     self.h_mpo[isite - 1]))
                 third_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, third_LR[isite], self.h_mpo[isite - 1],
@@ -635,12 +640,12 @@ class SpectraFtCV(SpectraCv):
                          ([1, 0], "bcde, bdcf->ef")]
                 first_LR[isite] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite - 1],
-                    dag_cv_isite, self.a_oper[isite - 1],
-                    self.a_oper[isite - 1], cv_isite))
+                    dag_cv_isite, self.a_blocks[isite - 1],
+                    self.a_blocks[isite - 1], cv_isite))
                 second_LR[isite] = asnumpy(multi_tensor_contract(
                     path1, second_LR[isite - 1],
                     dag_cv_isite,
-                    self.a_oper[isite - 1], cv_isite,
+                    self.a_blocks[isite - 1], cv_isite,
                     self.h_mpo[isite - 1]))
                 third_LR[isite] = asnumpy(multi_tensor_contract(
                     path1, third_LR[isite - 1], self.h_mpo[isite - 1],
@@ -666,12 +671,12 @@ class SpectraFtCV(SpectraCv):
                          ([1, 0], "bcde, fedb->cf")]
                 first_LR[isite - 1] = multi_tensor_contract(
                     path1, first_LR[isite],
-                    dag_cv_isite, self.a_oper[isite - 1],
-                    self.a_oper[isite - 1], cv_isite)
+                    dag_cv_isite, self.a_blocks[isite - 1],
+                    self.a_blocks[isite - 1], cv_isite)
                 second_LR[isite - 1] = multi_tensor_contract(
                     path1, second_LR[isite],
                     dag_cv_isite,
-                    self.a_oper[isite - 1], cv_isite,
+                    self.a_blocks[isite - 1], cv_isite,
                     self.h_mpo[isite - 1])
                 third_LR[isite - 1] = multi_tensor_contract(
                     path1, third_LR[isite], self.h_mpo[isite - 1],
@@ -693,12 +698,12 @@ class SpectraFtCV(SpectraCv):
                 first_LR[isite] = multi_tensor_contract(
                     path1, first_LR[isite - 1],
                     dag_cv_isite,
-                    self.a_oper[isite - 1], self.a_oper[isite - 1], cv_isite)
+                    self.a_blocks[isite - 1], self.a_blocks[isite - 1], cv_isite)
 
                 second_LR[isite] = multi_tensor_contract(
                     path1, second_LR[isite - 1],
                     dag_cv_isite,
-                    self.a_oper[isite - 1], cv_isite,
+                    self.a_blocks[isite - 1], cv_isite,
                     self.h_mpo[isite - 1])
                 third_LR[isite] = multi_tensor_contract(
                     path1, third_LR[isite - 1], self.h_mpo[isite - 1],
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 # Author: Tong Jiang <tongjiang1000@gmail.com>
 # correction vector base
+import os
+
 import numpy as np
 from multiprocessing import Pool
 import multiprocessing
 from renormalizer.mps import Mpo
+from renormalizer.mps.matrix import asxp
 from renormalizer.utils import Quantity
 from renormalizer.utils.elementop import construct_e_op_dict, ph_op_matrix
 import importlib.util
@@ -13,42 +16,117 @@ from typing import List
 
 logger = logging.getLogger(__name__)
 
+# the spectra object shared by all the frequencies solved in a worker process
+_worker_obj = None
+
+
+def _init_worker(obj):
+    # the object is transferred once per worker rather than once per frequency
+    global _worker_obj
+    _worker_obj = obj
+
+
+def _append_checkpoint(checkpoint, omega, value):
+    # one short line per frequency. Appending is cheap and a crash
+    # loses at most the line being written
+    with open(checkpoint, "a") as fout:
+        fout.write(f"{omega!r} {value!r}\n")
+
+
+def _load_checkpoint(checkpoint):
+    done = {}
+    if checkpoint is None or not os.path.exists(checkpoint):
+        return done
+    with open(checkpoint) as fin:
+        for line in fin:
+            items = line.split()
+            # the last line may be incomplete
+            if len(items) != 2:
+                continue
+            try:
+                omega, value = float(items[0]), float(items[1])
+            except ValueError:
+                continue
+            done[omega] = value
+    return done
+
+
+def _solve_chunk(obj, freq_chunk, checkpoint):
+    # frequencies in the chunk are solved in order. ``obj.cv_mps`` is updated
+    # in place so each frequency starts from the converged
+    # correction vector of the previous one
+    res = []
+    for omega in freq_chunk:
+        value = obj.cv_solve(omega)
+        res.append(value)
+        if checkpoint is not None:
+            _append_checkpoint(checkpoint, omega, value)
+    return res
+
+
+def _worker_solve_chunk(args):
+    return _solve_chunk(_worker_obj, *args)
+
+
 def batch_run(freq_reg, cores, obj, filename=None):
     """
     batch run of cv calculation
     freq_reg: list object, frequecny windown
     cores: number of cores to be used in multiprocessing calculation
     obj: SpectraZtCV or SpectraFtCV
+    filename: the file to save the spectra. The finished frequencies are
+        recorded in ``filename + ".part"`` during the calculation, and they are
+        skipped if the calculation is restarted.
+
+    The frequency window is divided into ``cores`` contiguous chunks. The frequencies
+    in a chunk are solved sequentially by one process, and the correction vector of
+    each frequency is used as the initial guess of the next one.
     """
     logger.info(f"{len(freq_reg)} total frequency points to do")
-    spectra = []
     obj.batch_run = True
 
+    if filename is not None:
+        checkpoint = f"{filename}.part"
+    else:
+        checkpoint = None
+    done = _load_checkpoint(checkpoint)
+    if done:
+        logger.info(f"{len(done)} frequency points loaded from {checkpoint}")
+    todo = [omega for omega in freq_reg if float(omega) not in done]
+
     if cores > 1:
         # multiprocessing
         if importlib.util.find_spec("cupy"):
             multiprocessing.set_start_method('forkserver', force=True)
-        pool = Pool(processes=cores)
-        logger.info(f"{cores} multiprocess parallelization activated")
-        for i_spec in pool.imap(obj.cv_solve, freq_reg):
-            spectra.append(i_spec)
-            if filename is not None:
-                np.save(f"{filename}", spectra)
-        pool.close()
-        pool.join()
+        nchunks = max(min(cores, len(todo)), 1)
+        chunks = [chunk.tolist() for chunk in np.array_split(np.array(todo), nchunks) if len(chunk) != 0]
+        if chunks:
+            pool = Pool(processes=len(chunks), initializer=_init_worker, initargs=(obj,))
+            logger.info(f"{len(chunks)} multiprocess parallelization activated")
+            for chunk, chunk_res in zip(chunks, pool.imap(_worker_solve_chunk, [(chunk, checkpoint) for chunk in chunks])):
+                done.update(zip(chunk, chunk_res))
+            pool.close()
+            pool.join()
     elif cores == 1:
         # single process
-        for omega in freq_reg:
-            spectra.append(obj.cv_solve(omega))
-            if filename is not None:
-                np.save(f"{filename}", spectra)
+        done.update(zip(todo, _solve_chunk(obj, todo, checkpoint)))
     else:
         assert False
 
+    spectra = [done[float(omega)] for omega in freq_reg]
+    if filename is not None:
+        np.save(f"{filename}", spectra)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
     return spectra
 
 
 class SpectraCv(object):
+
+    # the index of the identity block in the bonds of ``a_blocks``
+    a_identity_idx: int = None
+
     def __init__(
         self,
         model,
@@ -103,6 +181,14 @@ class SpectraCv(object):
         else:
             self.cv_mps = cv_mps
         
+        # A = a_blocks with the identity block scaled by a_coeff, see `a_oper_site`.
+        # a_blocks is independent of the frequency and is built once
+        self.a_blocks = None
+        self.a_coeff = None
+        # the environments left by the last frequency, which are valid
+        # for the next frequency if cv_mps is not changed in between
+        self._lr_cache = None
+
         # results
         self.hop_time = []
         self.macro_iteration_result = []
@@ -137,7 +223,12 @@ class SpectraCv(object):
                 assert False
 
             if isweep == 1:
-                lr_group = self.initialize_LR()
+                if self._lr_cache is not None and self._lr_cache[0] is self.cv_mps \
+                        and self._lr_cache[1] is self.a_blocks:
+                    # the environments do not depend on omega
+                    lr_group = self._lr_cache[2]
+                else:
+                    lr_group = self.initialize_LR()
             
             micro_iteration_result = []
             for isite in irange:
@@ -163,6 +254,8 @@ class SpectraCv(object):
                     converged = True
                     break
         
+        self._lr_cache = (self.cv_mps, self.a_blocks, lr_group)
+
         if converged:
             logger.info("cv converged!")
         else:
@@ -188,9 +281,29 @@ class SpectraCv(object):
     def init_b_mps(self):
         raise NotImplementedError
     
-    def oper_prepare(self, omgea):
+    def oper_prepare(self, omega):
+        # set a_blocks and a_coeff
         raise NotImplementedError
 
+    def a_oper_site(self, idx):
+        r"""
+        The site tensor of the operator :math:`A` at ``idx``.
+
+        ``a_blocks`` is the direct sum of the frequency independent operators
+        (:math:`H` and the identity), so the bonds inside the MPO are block diagonal.
+        Scaling the identity block of any bond by ``a_coeff`` yields :math:`A`,
+        and the bond at the right of the site (or the left of the last site) is scaled here.
+        Because only the optimized site has the scaled bond, the environments
+        built with ``a_blocks`` are the same for all frequencies.
+        """
+        mo = asxp(self.a_blocks[idx])
+        axis = 0 if idx == len(self.a_blocks) - 1 else 3
+        weights = np.ones(mo.shape[axis])
+        weights[self.a_identity_idx] = self.a_coeff
+        shape = [1] * mo.ndim
+        shape[axis] = -1
+        return mo * asxp(weights.reshape(shape))
+
     def optimize_cv(self, lr_group, isite, percent=0):
         raise NotImplementedError
 
@@ -5,7 +5,8 @@ import os
 import pytest
 
 from renormalizer.mps.backend import np
-from renormalizer.mps import Mpo
+from renormalizer.mps import Mpo, Mps
+from renormalizer.mps.matrix import asnumpy
 from renormalizer.cv import batch_run
 from renormalizer.cv.zerot import SpectraZtCV
 from renormalizer.cv.finitet import SpectraFtCV
@@ -30,6 +31,33 @@ def test_zt_abs(method):
     assert np.allclose(result, standard_value, rtol=1.e-2)
 
 
+def test_a_oper_site():
+    mps = Mps.random(holstein_model, 1, 10)
+    e0 = 0.01
+    spectra = SpectraZtCV(holstein_model, "abs", 10, 5.e-5, b_mps=mps, e0=e0, cv_mps=mps)
+    h_mpo = spectra.h_mpo
+    for omega in [0.05, 0.08]:
+        spectra.oper_prepare(omega)
+        std = mps.expectation(h_mpo) - (e0 + omega) * mps.expectation(Mpo.identity(holstein_model))
+        for idx in range(len(mps)):
+            a_oper = spectra.a_blocks.copy()
+            a_oper[idx] = asnumpy(spectra.a_oper_site(idx))
+            assert mps.expectation(a_oper) == pytest.approx(std)
+
+
+def test_batch_run_checkpoint(tmp_path):
+    freq_reg = [0.065, 0.084, 0.09]
+    spectra = SpectraZtCV(holstein_model, "abs", 10, 5.e-5, rtol=1e-3)
+    filename = str(tmp_path / "abs_zt")
+    # pretend the first frequency has been finished by a previous run
+    with open(filename + ".part", "w") as fout:
+        fout.write(f"{freq_reg[0]!r} 1.0\n")
+    result = batch_run(freq_reg, 2, spectra, filename=filename)
+    assert result[0] == 1.0
+    assert not os.path.exists(filename + ".part")
+    assert np.allclose(np.load(filename + ".npy"), result)
+
+
 @pytest.mark.parametrize("model", (holstein_model, holstein_model4))
 def test_ft_abs(model):
     with open(os.path.join(cur_dir, "abs_ft.npy"), "rb") as fin:
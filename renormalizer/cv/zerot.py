@@ -51,6 +51,10 @@ class SpectraZtCV(SpectraCv):
         see test/test_abs.py for example
 
     """
+
+    # H is the first block and the identity is the last block
+    a_identity_idx = -1
+
     def __init__(
         self,
         model,
@@ -74,8 +78,6 @@ class SpectraZtCV(SpectraCv):
             rtol=rtol, b_mps=b_mps, e0=e0, cv_mps=cv_mps,
         )
 
-        self.a_oper = None
-
     def init_b_mps(self):
         # get the right hand site vector b, Ax=b
         # b = -eta * dipole * \psi_0
@@ -121,9 +123,12 @@ class SpectraZtCV(SpectraCv):
         return cv_mps
 
     def oper_prepare(self, omega):
-        # set up a_oper = (H_0 - e0 - omega)
-        identity = Mpo.identity(self.model).scale(-self.e0 - omega)
-        self.a_oper = self.h_mpo.add(identity)
+        # set up a_oper = (H_0 - e0 - omega) as H_0 \oplus I
+        # with the coefficient of the identity block
+        if self.a_blocks is None:
+            assert len(self.h_mpo) > 1
+            self.a_blocks = self.h_mpo.add(Mpo.identity(self.model))
+        self.a_coeff = -self.e0 - omega
     
     def optimize_cv(self, lr_group, isite, percent=0.0):
         # depending on the spectratype, to restrict the exction
@@ -179,11 +184,13 @@ class SpectraZtCV(SpectraCv):
                 self.b_mps[isite - 1], second_R
             )[qn_mask]
 
+        # the bond scaled by the frequency is within the optimized sites
         if self.method == "2site":
-            a_oper_isite2 = asxp(self.a_oper[isite - 2])
+            a_oper_isite2 = self.a_oper_site(isite - 2)
+            a_oper_isite1 = asxp(self.a_blocks[isite - 1])
         else:
             a_oper_isite2 = None
-        a_oper_isite1 = asxp(self.a_oper[isite - 1])
+            a_oper_isite1 = self.a_oper_site(isite - 1)
 
         # use the diagonal part of mat_a to construct the preconditinoner
         # for linear solver
@@ -324,7 +331,7 @@ class SpectraZtCV(SpectraCv):
             for isite in range(len(self.cv_mps), 1, -1):
                 first_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite], self.cv_mps[isite - 1],
-                    self.a_oper[isite - 1], self.a_oper[isite - 1],
+                    self.a_blocks[isite - 1], self.a_blocks[isite - 1],
                     self.cv_mps[isite - 1]))
                 second_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path2, second_LR[isite], self.b_mps[isite - 1],
@@ -340,7 +347,7 @@ class SpectraZtCV(SpectraCv):
                 mps_isite = asxp(self.cv_mps[isite - 1])
                 first_LR[isite] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite - 1], mps_isite,
-                    self.a_oper[isite - 1], self.a_oper[isite - 1],
+                    self.a_blocks[isite - 1], self.a_blocks[isite - 1],
                     self.cv_mps[isite - 1]))
                 second_LR[isite] = asnumpy(multi_tensor_contract(
                     path2, second_LR[isite - 1], self.b_mps[isite - 1],
@@ -361,7 +368,7 @@ class SpectraZtCV(SpectraCv):
                          ([1, 0], "bcd, edb->ce")]
                 first_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite], self.cv_mps[isite - 1],
-                    self.a_oper[isite - 1], self.a_oper[isite - 1],
+                    self.a_blocks[isite - 1], self.a_blocks[isite - 1],
                     self.cv_mps[isite - 1]))
                 second_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path2, second_LR[isite], self.b_mps[isite - 1],
@@ -376,7 +383,7 @@ class SpectraZtCV(SpectraCv):
                          ([1, 0], "bcd, bce->de")]
                 first_LR[isite] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite - 1], self.cv_mps[isite - 1],
-                    self.a_oper[isite - 1], self.a_oper[isite - 1],
+                    self.a_blocks[isite - 1], self.a_blocks[isite - 1],
                     self.cv_mps[isite - 1]))
                 second_LR[isite] = asnumpy(multi_tensor_contract(
                     path2, second_LR[isite - 1], self.b_mps[isite - 1],
@@ -392,7 +399,7 @@ class SpectraZtCV(SpectraCv):
                          ([1, 0], "bcd, edb->ce")]
                 first_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite], self.cv_mps[isite - 1],
-                    self.a_oper[isite - 1], self.a_oper[isite - 1],
+                    self.a_blocks[isite - 1], self.a_blocks[isite - 1],
                     self.cv_mps[isite - 1]))
                 second_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path2, second_LR[isite], self.b_mps[isite - 1],
@@ -407,7 +414,7 @@ class SpectraZtCV(SpectraCv):
                          ([1, 0], "bcd, bce->de")]
                 first_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path1, first_LR[isite - 2], self.cv_mps[isite - 2],
-                    self.a_oper[isite - 2], self.a_oper[isite - 2],
+                    self.a_blocks[isite - 2], self.a_blocks[isite - 2],
                     self.cv_mps[isite - 2]))
                 second_LR[isite - 1] = asnumpy(multi_tensor_contract(
                     path2, second_LR[isite - 2], self.b_mps[isite - 2],
@@ -3,5 +3,6 @@
 
 from renormalizer.lib.davidson.davidson import davidson
 from renormalizer.lib.integrate.integrate import solve_ivp
-from renormalizer.lib.krylov.krylov import expm_krylov
-from renormalizer.lib.bipartite_matching.bipartite_matching import max_bipartite_matching, max_bipartite_matching2, bipartite_vertex_cover
+from renormalizer.lib.krylov.krylov import expm_krylov, KrylovWorkspace
+from renormalizer.lib.bipartite_matching.bipartite_matching import max_bipartite_matching, max_bipartite_matching2, bipartite_vertex_cover, \
+    bipartite_vertex_cover_sparse
@@ -126,3 +126,37 @@ def bipartite_vertex_cover(bigraph, algo="Hopcroft-Karp"):
     res_new = new_konig()
     #assert res_old == res_new
     return res_new
+
+
+def bipartite_vertex_cover_sparse(graph):
+    r"""Bipartite minimum vertex cover by Koenig's theorem for a sparse graph
+
+    The vectorized counterpart of :func:`bipartite_vertex_cover` with the Hopcroft-Karp
+    algorithm. The alternating forest is built level by level with array operations,
+    so no python loop over the vertices or the edges is involved.
+
+    :param graph: csr matrix. The rows are the vertices in U and the columns are the vertices in V.
+                  Nonzero elements are the edges
+    :returns: boolean array for U, boolean array for V
+    :complexity: `O(\sqrt(|V|)*|E|)`
+    """
+    graph = csr_matrix(graph)
+    nU, nV = graph.shape
+    matchV = maximum_bipartite_matching(graph, perm_type='row')
+    assert len(matchV) == nV
+
+    visitU = np.zeros(nU, dtype=bool)
+    visitV = np.zeros(nV, dtype=bool)
+    # -- starting with free vertices in U
+    matched = np.zeros(nU, dtype=bool)
+    matched[matchV[matchV != -1]] = True
+    wait_u = np.nonzero(~matched)[0]
+    while len(wait_u) > 0:
+        visitU[wait_u] = True
+        v = np.unique(graph[wait_u].indices)
+        v = v[~visitV[v]]
+        visitV[v] = True
+        assert np.all(matchV[v] != -1)  # otherwise match is not maximum
+        wait_u = matchV[v]
+        wait_u = wait_u[~visitU[wait_u]]
+    return ~visitU, visitV
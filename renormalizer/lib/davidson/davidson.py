@@ -46,9 +46,16 @@ def davidson(
     nroots=1,
     lessio=False,
     follow_state=False,
+    batch=False,
 ):
+    # if ``batch``, ``aop`` accepts a 2D array whose columns are the trial vectors
+    # and returns the products in the same layout
+    if batch:
+        _aop = lambda xs: list(numpy.ascontiguousarray(aop(numpy.stack(xs, axis=1)).T))
+    else:
+        _aop = lambda xs: [aop(x) for x in xs]
     e, x = davidson1(
-        lambda xs: [aop(x) for x in xs],
+        _aop,
         x0,
         precond,
         tol,
@@ -6,12 +6,15 @@ import numpy as np
 
 
 from renormalizer.utils.log import DEFAULT_NP_ERRCONFIG
+from renormalizer.utils.profiler import profiler
 from renormalizer.lib.integrate import _ivp
 
 
 def solve_ivp(*args, **kwargs):
-    with np.errstate(**DEFAULT_NP_ERRCONFIG):
-        return _ivp.solve_ivp(*args, **kwargs)
+    with np.errstate(**DEFAULT_NP_ERRCONFIG), profiler.region("ode", method=kwargs.get("method", "RK45")):
+        sol = _ivp.solve_ivp(*args, **kwargs)
+        profiler.add(ode_nfev=sol.nfev, ode_steps=len(sol.t))
+        return sol
 
 
 update_wrapper(solve_ivp, _ivp.solve_ivp)
@@ -7,12 +7,40 @@ from scipy.linalg import eigh_tridiagonal
 import numpy as np
 
 from renormalizer.mps.backend import xp
+from renormalizer.utils.profiler import profiler
 
 
 logger = logging.getLogger(__name__)
 
 
-def _expm_krylov(alpha, beta, V, v_norm, dt):
+class KrylovWorkspace:
+    r"""
+    Reusable storage of the Krylov vectors of :func:`expm_krylov`.
+
+    The storage grows to the largest size requested and is shared by the calls with different
+    vector sizes, such as the local problems at different sites in TDVP. The storage is not pickled.
+    """
+    def __init__(self):
+        self._buffer = None
+
+    def get(self, nvec: int, n: int, dtype, old: xp.ndarray = None) -> xp.ndarray:
+        # an array of shape (nvec, n). The content of ``old`` is kept if the storage is reallocated
+        size = nvec * n
+        if self._buffer is None or self._buffer.size < size or self._buffer.dtype != dtype:
+            buffer = xp.empty(size, dtype=dtype)
+            if old is not None:
+                buffer[:old.size] = old.ravel()
+            self._buffer = buffer
+        return self._buffer[:size].reshape(nvec, n)
+
+    def release(self):
+        self._buffer = None
+
+    def __getstate__(self):
+        return {"_buffer": None}
+
+
+def _expm_krylov(alpha, beta, v_norm, dt):
     # diagonalize Hessenberg matrix (tridiagonal matrix for hermitian matrix A)
     try:
         w_hess, u_hess = eigh_tridiagonal(alpha, beta)
@@ -21,64 +49,127 @@ def _expm_krylov(alpha, beta, V, v_norm, dt):
         h = np.diag(alpha) + np.diag(beta, k=-1) + np.diag(beta, k=1)
         w_hess, u_hess = np.linalg.eigh(h)
 
-    return V @ xp.asarray(u_hess @ (v_norm * np.exp(dt*w_hess) * u_hess[0]))
-
+    # the coefficients in the Krylov vectors
+    return u_hess @ (v_norm * np.exp(dt*w_hess) * u_hess[0])
 
-def expm_krylov(Afunc, dt, vstart: xp.ndarray, block_size=50):
-    """
-    Compute Krylov subspace approximation of the matrix exponential
-    applied to input vector: `expm(dt*A)*v`.
-    A is a hermitian matrix.
-    Reference:
-        M. Hochbruck and C. Lubich
-        On Krylov subspace approximations to the matrix exponential operator
-        SIAM J. Numer. Anal. 34, 1911 (1997)
-    """
-    if not np.iscomplex(dt):
-        dt = dt.real
 
-    # normalize starting vector
-    vstart = xp.asarray(vstart)
-    nrmv = float(xp.linalg.norm(vstart))
+def _lanczos_expm(Afunc, dt, v: xp.ndarray, block_size, max_size, workspace):
+    # Lanczos iteration with at most ``max_size`` Krylov vectors. Returns the Krylov vectors,
+    # the coefficients of ``expm(sub_dt*A)*v`` in the Krylov vectors, and ``sub_dt``.
+    # ``sub_dt`` is smaller than ``dt`` if not converged within ``max_size`` vectors
+    n = len(v)
+    nrmv = float(xp.linalg.norm(v))
     assert nrmv > 0
-    vstart = vstart / nrmv
 
-    alpha = np.zeros(block_size)
-    beta  = np.zeros(block_size - 1)
+    V = workspace.get(min(block_size, max_size), n, v.dtype)
+    V[0] = v / nrmv
+    alpha = np.zeros(len(V))
+    beta = np.zeros(len(V))
+    coef = None
 
-    V = xp.empty((block_size, len(vstart)), dtype=vstart.dtype)
-    V[0] = vstart
-    res = None
+    for j in range(max_size):
 
-
-    for j in range(len(vstart)):
-        
         w = Afunc(V[j])
         alpha[j] = xp.vdot(w, V[j]).real
 
-        if j == len(vstart)-1:
+        if j == n-1:
             #logger.debug("the krylov subspace is equal to the full space")
-            return _expm_krylov(alpha[:j+1], beta[:j], V[:j+1, :].T, nrmv, dt), j+1
-        
-        if len(V) == j+1:
-            V, old_V = xp.empty((len(V) + block_size, len(vstart)), dtype=vstart.dtype), V
-            V[:len(old_V)] = old_V
-            del old_V
-            alpha = np.concatenate([alpha, np.zeros(block_size)])
-            beta = np.concatenate([beta, np.zeros(block_size)])
+            return V[:j+1], _expm_krylov(alpha[:j+1], beta[:j], nrmv, dt), dt
 
         w -= alpha[j]*V[j] + (beta[j-1]*V[j-1] if j > 0 else 0)
         beta[j] = xp.linalg.norm(w)
-        if beta[j] < 100*len(vstart)*np.finfo(float).eps:
+        if beta[j] < 100*n*np.finfo(float).eps:
             # logger.warning(f'beta[{j}] ~= 0 encountered during Lanczos iteration.')
-            return _expm_krylov(alpha[:j+1], beta[:j], V[:j+1, :].T, nrmv, dt), j+1
+            return V[:j+1], _expm_krylov(alpha[:j+1], beta[:j], nrmv, dt), dt
 
         if 3 < j and j % 2 == 0:
-            new_res = _expm_krylov(alpha[:j+1], beta[:j], V[:j+1].T, nrmv, dt)
-            if res is not None and xp.allclose(res, new_res):
-                return new_res, j+1
-            else:
-                res = new_res
+            # the Krylov vectors are orthonormal, so the norm of the difference of the coefficients
+            # is the norm of the difference of the results. The criterion is
+            # the 2-norm counterpart of `allclose` of the results
+            new_coef = _expm_krylov(alpha[:j+1], beta[:j], nrmv, dt)
+            if coef is not None:
+                diff = np.linalg.norm(new_coef - np.pad(coef, (0, len(new_coef) - len(coef))))
+                if diff <= 1e-5 * np.linalg.norm(new_coef) + 1e-8 * np.sqrt(n):
+                    return V[:j+1], new_coef, dt
+            coef = new_coef
+
+        if j + 1 == max_size:
+            break
+
+        if len(V) == j+1:
+            V = workspace.get(min(len(V) + block_size, max_size), n, v.dtype, old=V)
+            alpha = np.concatenate([alpha, np.zeros(len(V) - len(alpha))])
+            beta = np.concatenate([beta, np.zeros(len(V) - len(beta))])
+
         V[j + 1] = w / beta[j]
 
+    # Not converged. Find a smaller time step within the subspace by the error estimate
+    # beta_m |(expm(sub_dt*T) e_1)_m|. See the reference of `expm_krylov`
+    sub_dt = dt
+    while True:
+        coef = _expm_krylov(alpha, beta[:-1], nrmv, sub_dt)
+        if beta[-1] * abs(coef[-1]) < 1e-8 * nrmv:
+            return V, coef, sub_dt
+        sub_dt = sub_dt / 2
+
+
+@profiler.profile("krylov", lambda Afunc, dt, vstart, *args, **kwargs: {"dim": vstart.size})
+def expm_krylov(Afunc, dt, vstart: xp.ndarray, block_size=50, max_size=None, workspace=None):
+    """
+    Compute Krylov subspace approximation of the matrix exponential
+    applied to input vector: `expm(dt*A)*v`.
+    A is a hermitian matrix.
+    Reference:
+        M. Hochbruck and C. Lubich
+        On Krylov subspace approximations to the matrix exponential operator
+        SIAM J. Numer. Anal. 34, 1911 (1997)
+
+    Parameters
+    ----------
+    Afunc : callable
+        The function to calculate `A*v`.
+    dt : float or complex
+        The time step.
+    vstart : xp.ndarray
+        The input vector.
+    block_size : int
+        The number of the Krylov vectors allocated at once.
+    max_size : int, optional
+        The maximum number of the Krylov vectors. If the approximation is not converged,
+        the vector is evolved by a fraction of ``dt`` and the iteration is restarted from the
+        evolved vector. Default is ``None``, which means no limit.
+    workspace : KrylovWorkspace, optional
+        The storage of the Krylov vectors reused across the calls.
+
+    Returns
+    -------
+    res : xp.ndarray
+        `expm(dt*A)*v`.
+    nsteps : int
+        The total number of the Krylov vectors.
+    """
+    if not np.iscomplex(dt):
+        dt = dt.real
 
+    vstart = xp.asarray(vstart)
+    n = len(vstart)
+    if max_size is None:
+        max_size = n
+    max_size = min(max_size, n)
+    if max_size < min(n, 2):
+        raise ValueError(f"max_size should be at least 2. Got {max_size}")
+    if workspace is None:
+        workspace = KrylovWorkspace()
+
+    v = vstart
+    nsteps = 0
+    while True:
+        V, coef, sub_dt = _lanczos_expm(Afunc, dt, v, block_size, max_size, workspace)
+        nsteps += len(V)
+        # a new array that does not share the memory with the workspace
+        v = V.T @ xp.asarray(coef)
+        if sub_dt == dt:
+            profiler.add(krylov_vectors=nsteps)
+            return v, nsteps
+        logger.debug(f"Krylov subspace exceeds {max_size}. Restart with the remaining time step.")
+        dt = dt - sub_dt
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from renormalizer.lib import bipartite_vertex_cover, bipartite_vertex_cover_sparse
+import pytest
+import numpy as np
+import scipy.sparse
+
+
+@pytest.mark.parametrize("shape", ((30, 50), (50, 30), (40, 40)))
+@pytest.mark.parametrize("density", (0.02, 0.1))
+def test_vertex_cover_sparse(shape, density):
+    graph = scipy.sparse.random(*shape, density=density, format="csr", random_state=2022)
+    # no isolated vertices
+    n = max(shape)
+    graph = graph + scipy.sparse.csr_matrix((np.ones(n), (np.arange(n) % shape[0], np.arange(n) % shape[1])), shape=shape)
+    graph.data[:] = 1
+    rowbool, colbool = bipartite_vertex_cover_sparse(graph)
+    # every edge is covered
+    rows, cols = graph.nonzero()
+    assert np.all(rowbool[rows] | colbool[cols])
+    # the same cover as the list based implementation
+    bigraph = [graph.indices[graph.indptr[i]:graph.indptr[i+1]] for i in range(shape[0])]
+    rowbool_ref, colbool_ref = bipartite_vertex_cover(bigraph)
+    assert np.all(rowbool == rowbool_ref) and np.all(colbool == colbool_ref)
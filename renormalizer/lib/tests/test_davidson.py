@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+from renormalizer.lib import davidson
+import pytest
+import numpy as np
+
+
+@pytest.mark.parametrize("nroots", (1, 3))
+def test_batch(nroots):
+    N = 100
+    a = np.random.rand(N, N)
+    a += a.T
+    a += np.diag(np.arange(N))
+    diag = np.diag(a)
+    precond = lambda x, e, *args: x / (diag - e + 1e-4)
+    x0 = [np.eye(N)[i] for i in range(nroots)]
+
+    count = 0
+    def aop(x):
+        nonlocal count
+        count += 1
+        return a @ x
+
+    e1, c1 = davidson(aop, x0, precond, nroots=nroots)
+    ncall = count
+    count = 0
+    e2, c2 = davidson(aop, x0, precond, nroots=nroots, batch=True)
+    assert np.allclose(e1, e2)
+    assert np.allclose(e2, np.linalg.eigvalsh(a)[:nroots])
+    if 1 < nroots:
+        # each iteration is one single call
+        assert count < ncall
@@ -2,7 +2,7 @@
 
 
 from renormalizer.mps.backend import xp
-from renormalizer.lib import expm_krylov
+from renormalizer.lib import expm_krylov, KrylovWorkspace
 import pytest
 import numpy as np
 from scipy.linalg import expm
@@ -31,3 +31,20 @@ def test_expm(N, imag, block_size):
     res1 = expm(a1) @ v
     res2, _ = expm_krylov(lambda x: a2.dot(x), 1, xp.array(v), block_size)
     assert xp.allclose(res1, res2)
+
+
+@pytest.mark.parametrize("max_size", (4, 8, 20))
+def test_expm_restart(max_size):
+    N = 200
+    a = np.random.rand(N, N) / N
+    a = a + a.T
+    v = np.random.rand(N) + 1j * np.random.rand(N)
+    res1 = expm(-1j * a) @ v
+    workspace = KrylovWorkspace()
+    res2, nsteps = expm_krylov(lambda x: a.dot(x), -1j, xp.array(v), max_size=max_size, workspace=workspace)
+    assert xp.allclose(res1, res2)
+    # the workspace is bounded by the maximum subspace size
+    assert workspace._buffer.size <= max_size * N
+    # reuse the workspace with a different vector size
+    res3, _ = expm_krylov(lambda x: a[:10, :10].dot(x), -1j, xp.array(v[:10]), workspace=workspace)
+    assert xp.allclose(expm(-1j * a[:10, :10]) @ v[:10], res3)
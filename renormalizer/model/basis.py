@@ -1,6 +1,6 @@
 import numpy as np
 from renormalizer.model import Op
-from typing import Union, List
+from typing import Union, List, Dict
 import scipy.linalg
 import scipy.special
 import itertools
@@ -46,6 +46,19 @@ class BasisSet:
             self.sigmaqn.append(np.array(qn))
         self.sigmaqn:np.ndarray = np.array(self.sigmaqn)
 
+        # the matrices of the operators without the factor. See ``op_mat``
+        self._op_cache: Dict = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_op_cache"] = {}
+        return state
+
+    def __setstate__(self, state):
+        # bases pickled before the cache was introduced
+        state.setdefault("_op_cache", {})
+        self.__dict__.update(state)
+
     def __str__(self):
         ret = f"dof: {self.dof}, nbas: {self.nbas}"
         if not np.all(self.sigmaqn == 0):
@@ -55,7 +68,7 @@ class BasisSet:
     def __repr__(self):
         return str(self)
 
-    def op_mat(self, op: Op):
+    def op_mat(self, op: Union[Op, str]):
         """
         Matrix representation under the basis set of the input operator.
         The factor is included.
@@ -70,6 +83,48 @@ class BasisSet:
         mat : :class:`np.ndarray`
             Matrix representation of ``op``.
         """
+        factor = op.factor if isinstance(op, Op) else 1.0
+        return self.cached_op_mat(op) * factor
+
+    def op_key(self, op: Union[Op, str]):
+        """
+        The key of the operator in the cache of :meth:`cached_op_mat`.
+        Operators with the same key have the same matrix up to the factor.
+        """
+        if not isinstance(op, Op):
+            return op
+        if self.multi_dof:
+            # the matrix depends on which DoFs in the basis are involved
+            return op.symbol, tuple(op.dofs)
+        return op.symbol
+
+    def cached_op_mat(self, op: Union[Op, str]):
+        """
+        Matrix representation of the input operator without the factor.
+        The matrix is calculated once for each :meth:`op_key` and is read-only.
+
+        Parameters
+        ----------
+        op : Op
+            The operator. For basis set with only one DoF, :class:``str`` is also acceptable.
+
+        Returns
+        -------
+        mat : :class:`np.ndarray`
+            Matrix representation of ``op`` with unit factor.
+        """
+        key = self.op_key(op)
+        mat = self._op_cache.get(key)
+        if mat is None:
+            if not isinstance(op, Op):
+                op = Op(op, None)
+            mat = np.array(self._op_mat(op))
+            mat.setflags(write=False)
+            self._op_cache[key] = mat
+        return mat
+
+    def _op_mat(self, op: Op):
+        # the matrix of ``op`` ignoring the factor. Implemented by the subclasses
         raise NotImplementedError
 
     @property
@@ -140,14 +195,14 @@ class BasisSHO(BasisSet):
         if dvr:
             self.dvr_x, self.dvr_v = scipy.linalg.eigh(self.op_mat("x"))
             self.dvr = True
+            # the cached matrices are not in the DVR representation
+            self._op_cache.clear()
 
     def __str__(self):
         return f"BasisSHO(dof: {self.dof}, x0: {self.x0}, omega: {self.omega}, nbas: {self.nbas})"
 
-    def op_mat(self, op: Union[Op, str]):
-        if not isinstance(op, Op):
-            op = Op(op, None)
-        op_symbol, op_factor = op.symbol, op.factor
+    def _op_mat(self, op: Op):
+        op_symbol = op.symbol
 
         if op_symbol in ["b", "b b", r"b^\dagger", r"b^\dagger b^\dagger", r"b^\dagger b", r"b b^\dagger", r"b^\dagger+b"]:
             if self._recurssion_flag == 0 and not np.allclose(self.x0, 0):
@@ -155,9 +210,6 @@ class BasisSHO(BasisSet):
 
         self._recurssion_flag += 1
 
-        # so many if-else might be a potential performance problem in the future
-        # changing to lazy-evaluation dict should be better
-
         # second quantization formula
         if op_symbol == "b":
             mat = np.diag(np.sqrt(np.arange(1, self.nbas)), k=1)
@@ -325,7 +377,7 @@ class BasisSHO(BasisSet):
             raise ValueError(f"op_symbol:{op_symbol} is not supported. ")
 
         self._recurssion_flag -= 1
-        return mat * op_factor
+        return mat
 
     def copy(self, new_dof):
         return self.__class__(new_dof, omega=self.omega,
@@ -354,10 +406,8 @@ class BasisHopsBoson(BasisSet):
     def __init__(self, dof, nbas):
         super().__init__(dof, nbas, [0] * nbas)
 
-    def op_mat(self, op: Union[Op, str]):
-        if not isinstance(op, Op):
-            op = Op(op, None)
-        op_symbol, op_factor = op.symbol, op.factor
+    def _op_mat(self, op: Op):
+        op_symbol = op.symbol
 
         if op_symbol == r"b^\dagger b":
             mat = np.diag(np.arange(self.nbas))
@@ -371,7 +421,7 @@ class BasisHopsBoson(BasisSet):
             mat = np.eye(self.nbas)
         else:
             raise ValueError(f"op_symbol:{op_symbol} is not supported.")
-        return mat * op_factor
+        return mat
 
     def copy(self, new_dof):
         return self.__class__(new_dof, self.nbas)
@@ -436,10 +486,8 @@ class BasisSineDVR(BasisSet):
     def __str__(self):
         return f"BasisSineDVR(xi: {self.xi}, xf: {self.xf}, nbas: {self.nbas})"
 
-    def op_mat(self, op: Union[Op, str]):
-        if not isinstance(op, Op):
-            op = Op(op, None)
-        op_symbol, op_factor = op.symbol, op.factor
+    def _op_mat(self, op: Op):
+        op_symbol = op.symbol
 
         if op_symbol == "I":
             mat = np.eye(self.nbas)
@@ -589,7 +637,7 @@ class BasisSineDVR(BasisSet):
         else:
             raise ValueError(f"op_symbol:{op_symbol} is not supported. ")
 
-        return mat * op_factor
+        return mat
 
     def _du(self):
         # int_0^L <j(u)|1*du|k(u)>  u=x-xi du=\frac{\partial}{\partial u}
@@ -714,9 +762,9 @@ class BasisMultiElectron(BasisSet):
         self.dof_name_map = {name: i for i, name in enumerate(dof)}
         super().__init__(dof, len(dof), sigmaqn)
 
-    def op_mat(self, op: Op):
+    def _op_mat(self, op: Op):
 
-        op_symbol, op_factor = op.split_symbol, op.factor
+        op_symbol = op.split_symbol
 
         if len(op_symbol) == 1:
             if op_symbol[0] == "I":
@@ -744,7 +792,7 @@ class BasisMultiElectron(BasisSet):
         else:
             raise ValueError(f"op_symbol:{op_symbol} is not supported")
 
-        return mat * op_factor
+        return mat
 
     def copy(self, new_dof):
         return self.__class__(new_dof, self.sigmaqn)
@@ -774,9 +822,9 @@ class BasisMultiElectronVac(BasisSet):
         self.dof_name_map = {k: v + 1 for v, k in enumerate(dof)}
         super().__init__(dof, len(dof) + 1, sigmaqn)
 
-    def op_mat(self, op: Op):
+    def _op_mat(self, op: Op):
 
-        op_symbol, op_factor = op.split_symbol, op.factor
+        op_symbol = op.split_symbol
 
         if len(op_symbol) == 1:
             op_symbol = op_symbol[0]
@@ -813,7 +861,7 @@ class BasisMultiElectronVac(BasisSet):
             else:
                 raise ValueError(f"op_symbol:{op_symbol} is not supported")
 
-        return mat * op_factor
+        return mat
 
     def copy(self, new_dof):
         return self.__class__(new_dof)
@@ -843,10 +891,8 @@ class BasisSimpleElectron(BasisSet):
     def __init__(self, dof):
         super().__init__(dof, 2, [0, 1])
 
-    def op_mat(self, op):
-        if not isinstance(op, Op):
-            op = Op(op, None)
-        op_symbol, op_factor = op.symbol, op.factor
+    def _op_mat(self, op: Op):
+        op_symbol = op.symbol
 
         mat = np.zeros((2, 2))
 
@@ -861,7 +907,7 @@ class BasisSimpleElectron(BasisSet):
         else:
             raise ValueError(f"op_symbol:{op_symbol} is not supported")
 
-        return mat * op_factor
+        return mat
 
     def copy(self, new_dof):
         return self.__class__(new_dof)
@@ -898,10 +944,8 @@ class BasisHalfSpin(BasisSet):
             sigmaqn = [0, 0]
         super().__init__(dof, 2, sigmaqn)
 
-    def op_mat(self, op: Union[Op, str]):
-        if not isinstance(op, Op):
-            op = Op(op, None)
-        op_symbol, op_factor = op.split_symbol, op.factor
+    def _op_mat(self, op: Op):
+        op_symbol = op.split_symbol
 
         if len(op_symbol) == 1:
             op_symbol = op_symbol[0]
@@ -928,7 +972,7 @@ class BasisHalfSpin(BasisSet):
             for o in op_symbol:
                 mat = mat @ self.op_mat(o)
 
-        return mat * op_factor
+        return mat
 
     def copy(self, new_dof):
         return self.__class__(new_dof, self.sigmaqn)
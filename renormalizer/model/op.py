@@ -213,18 +213,23 @@ class Op:
             return [Op(self.symbol, self.dofs, qn=self.qn_list)], self.factor
         # group operators according to site index.
         # The same site idx (the same basis) in one group.
-        grouped_op_info: Dict[int, List[Op]] = defaultdict(list)
+        # The symbols, DoF names and quantum numbers of each group are collected
+        # and the elementary operator is constructed at once
+        grouped_op_info: Dict[int, Tuple[List, List, List]] = defaultdict(lambda: ([], [], []))
         for elem_symbol, elem_name, qn in zip(self.split_symbol, self.dofs, self.qn_list):
             site_idx = dof_to_siteidx.get(elem_name)
             if site_idx is None:
                 raise ValueError(f"Unknown DoF name {elem_name} in {self}.")
             # Note that the order of operators on each site is not changed
-            grouped_op_info[site_idx].append(Op(elem_symbol, elem_name, qn=qn))
+            symbols, dofs, qns = grouped_op_info[site_idx]
+            symbols.append(elem_symbol)
+            dofs.append(elem_name)
+            qns.append(qn)
         # Construct elementary operators. Small site index first.
         ops = []
         for site_idx in sorted(grouped_op_info.keys()):
-            elem_ops: List[Op] = grouped_op_info[site_idx]
-            ops.append(Op.product(elem_ops))
+            symbols, dofs, qns = grouped_op_info[site_idx]
+            ops.append(Op(" ".join(symbols), dofs, qn=qns))
         return ops, self.factor
 
     @property
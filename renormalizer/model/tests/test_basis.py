@@ -39,6 +39,26 @@ def test_high_moment():
     assert np.allclose(sho.op_mat("p^3"), sho.op_mat("p p p"))
 
 
+def test_op_mat_cache():
+    import pickle
+    sho = Ba.BasisSHO("v", 0.1, 10, dvr=True)
+    # the cache is built after the DVR transformation
+    assert np.allclose(sho.op_mat("x"), np.diag(sho.dvr_x))
+    mat = sho.op_mat(Op("x^2", "v", factor=2))
+    assert np.allclose(mat, 2 * sho.op_mat("x^2"))
+    # the returned matrix is a copy and the cached matrix is read-only
+    mat[0, 0] = 100
+    assert not np.allclose(sho.op_mat("x^2"), mat)
+    assert not sho.cached_op_mat("x^2").flags.writeable
+    # the cache is keyed by the DoFs for bases with multiple DoFs
+    vac = Ba.BasisMultiElectronVac([0, 1])
+    assert vac.op_key(Op(r"a^\dagger", 0)) != vac.op_key(Op(r"a^\dagger", 1))
+    assert vac.op_mat(Op(r"a^\dagger", 1))[2, 0] == 1
+    assert vac.op_mat(Op(r"a^\dagger", 0))[2, 0] == 0
+    # the cache is not pickled
+    assert not pickle.loads(pickle.dumps(sho))._op_cache
+
+
 @pytest.mark.parametrize("basistype", ("SHO", "SHODVR", "SineDVR"))
 def test_VibBasis(basistype):
     nv = 2
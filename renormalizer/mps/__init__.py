@@ -1,7 +1,12 @@
 from renormalizer.mps.backend import backend
+from renormalizer.mps.mpo_cache import mpo_cache, MpoCache
+from renormalizer.mps.mpfile import MpFile
 from renormalizer.mps.mpo import Mpo
 from renormalizer.mps.mps import Mps, BraKetPair
 from renormalizer.mps.mpdm import MpDm
 from renormalizer.mps.thermalprop import ThermalProp, load_thermal_state
-from renormalizer.mps.gs import optimize_mps
+from renormalizer.mps.gs import optimize_mps, DMRG
 from renormalizer.mps.tda import TDA
+from renormalizer.mps.observable import ObservablePlan
+from renormalizer.mps.thermal_sampling import ThermalPureStateProp, ThermalPropEnsemble, random_phase_state
+from renormalizer.mps.session import EvolutionSession
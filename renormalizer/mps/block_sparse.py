@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+import itertools
+import logging
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+from renormalizer.mps.backend import np
+from renormalizer.mps.svd_qn import qn_sector_index
+
+logger = logging.getLogger(__name__)
+
+
+def qn_sectors(qn: np.ndarray) -> Dict[tuple, np.ndarray]:
+    r""" Group the indices of a leg by quantum number.
+
+    Parameters
+    ----------
+    qn : np.ndarray
+        Quantum number of each index of the leg, with shape ``(dim, qn_size)``.
+
+    Returns
+    -------
+    sectors : dict
+        Mapping from the quantum number (as a tuple) to the indices of the leg
+        carrying the quantum number, in ascending order.
+    """
+    keys, order, bounds = qn_sector_index(qn)
+    return {tuple(q): order[bounds[i]:bounds[i+1]] for i, q in enumerate(keys.tolist())}
+
+
+class BlockSparseTensor:
+    r""" Tensor with U(1) symmetry stored as dense blocks of allowed quantum number sectors.
+
+    Each leg ``i`` carries a quantum number table ``qn[i]`` with shape ``(dim_i, qn_size)``
+    and a direction ``signs[i]`` (``+1`` or ``-1``). A block labeled by the quantum numbers
+    :math:`q_i` of the legs is allowed only if :math:`\sum_i s_i q_i = q_{\rm tot}`.
+    Symmetry-forbidden blocks are never stored nor touched in the contractions.
+
+    Parameters
+    ----------
+    qn : list of np.ndarray
+        Quantum number table of each leg.
+    signs : list of int
+        Direction of each leg.
+    qntot : np.ndarray
+        The total quantum number of the tensor.
+    blocks : dict
+        Mapping from the quantum number of the legs (a tuple of tuples) to the dense block.
+        The indices of the block are the indices of the leg with the corresponding
+        quantum number in ascending order.
+    dtype :
+        Data type of the tensor. Inferred from the blocks if not provided.
+    """
+    def __init__(self, qn: List[np.ndarray], signs: Sequence[int], qntot, blocks: Dict[tuple, np.ndarray] = None, dtype=None):
+        assert len(qn) == len(signs)
+        assert all(s in (1, -1) for s in signs)
+        self.qn: List[np.ndarray] = [np.asarray(q).reshape(len(q), -1) for q in qn]
+        self.signs: Tuple[int] = tuple(int(s) for s in signs)
+        self.qntot: np.ndarray = np.asarray(qntot).reshape(-1)
+        self.sectors: List[Dict[tuple, np.ndarray]] = [qn_sectors(q) for q in self.qn]
+        if blocks is None:
+            blocks = {}
+        self.blocks: Dict[tuple, np.ndarray] = blocks
+        if dtype is None:
+            dtype = np.result_type(*blocks.values()) if blocks else np.float64
+        self.dtype = dtype
+
+    @classmethod
+    def from_dense(cls, array: np.ndarray, qn: List[np.ndarray], signs: Sequence[int], qntot) -> "BlockSparseTensor":
+        r""" Construct from a dense tensor. Elements in symmetry-forbidden blocks are dropped.
+        """
+        array = np.asarray(array)
+        assert array.ndim == len(qn)
+        new = cls(qn, signs, qntot, dtype=array.dtype)
+        assert array.shape == new.shape
+        for key in new.allowed_keys():
+            idx = [new.sectors[i][q] for i, q in enumerate(key)]
+            new.blocks[key] = array[np.ix_(*idx)]
+        return new
+
+    @classmethod
+    def zeros(cls, qn: List[np.ndarray], signs: Sequence[int], qntot, dtype=np.float64) -> "BlockSparseTensor":
+        new = cls(qn, signs, qntot, dtype=dtype)
+        for key in new.allowed_keys():
+            shape = [len(new.sectors[i][q]) for i, q in enumerate(key)]
+            new.blocks[key] = np.zeros(shape, dtype=dtype)
+        return new
+
+    def allowed_keys(self):
+        r""" Iterate through the labels of all symmetry-allowed blocks.
+        """
+        if self.ndim == 0:
+            return
+        sign_last = self.signs[-1]
+        last_sectors = self.sectors[-1]
+        for key in itertools.product(*[s.keys() for s in self.sectors[:-1]]):
+            residue = self.qntot.copy()
+            for sign, q in zip(self.signs, key):
+                residue = residue - sign * np.array(q)
+            q_last = tuple((sign_last * residue).tolist())
+            if q_last in last_sectors:
+                yield key + (q_last,)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.qn)
+
+    @property
+    def shape(self) -> Tuple[int]:
+        return tuple(len(q) for q in self.qn)
+
+    @property
+    def size(self) -> int:
+        r""" Number of elements of the equivalent dense tensor."""
+        return int(np.prod(self.shape))
+
+    @property
+    def nnz(self) -> int:
+        r""" Number of stored elements."""
+        return sum(b.size for b in self.blocks.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in self.blocks.values())
+
+    @property
+    def density(self) -> float:
+        r""" Fraction of the dense tensor that is actually stored."""
+        return self.nnz / self.size
+
+    def to_dense(self) -> np.ndarray:
+        array = np.zeros(self.shape, dtype=self.dtype)
+        for key, block in self.blocks.items():
+            idx = [self.sectors[i][q] for i, q in enumerate(key)]
+            array[np.ix_(*idx)] = block
+        return array
+
+    def copy(self) -> "BlockSparseTensor":
+        blocks = {key: block.copy() for key, block in self.blocks.items()}
+        return self.__class__(self.qn, self.signs, self.qntot, blocks, self.dtype)
+
+    def conj(self) -> "BlockSparseTensor":
+        r""" Complex conjugate. The directions of the legs are reversed, so that
+        the result could be contracted with the original tensor.
+        """
+        blocks = {key: block.conj() for key, block in self.blocks.items()}
+        signs = [-s for s in self.signs]
+        return self.__class__(self.qn, signs, -self.qntot, blocks, self.dtype)
+
+    def scale(self, val) -> "BlockSparseTensor":
+        blocks = {key: block * val for key, block in self.blocks.items()}
+        return self.__class__(self.qn, self.signs, self.qntot, blocks)
+
+    def norm(self) -> float:
+        return float(np.sqrt(sum(np.vdot(b, b).real for b in self.blocks.values())))
+
+    def transpose(self, axes: Sequence[int]) -> "BlockSparseTensor":
+        axes = list(axes)
+        assert sorted(axes) == list(range(self.ndim))
+        blocks = {tuple(key[i] for i in axes): block.transpose(axes) for key, block in self.blocks.items()}
+        qn = [self.qn[i] for i in axes]
+        signs = [self.signs[i] for i in axes]
+        return self.__class__(qn, signs, self.qntot, blocks, self.dtype)
+
+    def tensordot(self, other: "BlockSparseTensor", axes) -> "BlockSparseTensor":
+        r""" Contract with another block-sparse tensor, in the same way as ``np.tensordot``.
+        Only pairs of blocks with matching quantum numbers on the contracted legs
+        are multiplied.
+
+        The contracted legs should have the same quantum number table and opposite directions.
+        """
+        if isinstance(axes, int):
+            axes = (list(range(self.ndim - axes, self.ndim)), list(range(axes)))
+        axes_a, axes_b = [list(np.atleast_1d(ax)) for ax in axes]
+        assert len(axes_a) == len(axes_b)
+        for i, j in zip(axes_a, axes_b):
+            if self.signs[i] != -other.signs[j]:
+                raise ValueError(f"Leg {i} and leg {j} have the same direction.")
+            if not np.array_equal(self.qn[i], other.qn[j]):
+                raise ValueError(f"Quantum numbers of leg {i} and leg {j} do not match.")
+        free_a = [i for i in range(self.ndim) if i not in axes_a]
+        free_b = [j for j in range(other.ndim) if j not in axes_b]
+
+        # group the blocks of ``other`` by the quantum number of the contracted legs
+        grouped_b = defaultdict(list)
+        for key_b, block_b in other.blocks.items():
+            grouped_b[tuple(key_b[j] for j in axes_b)].append((key_b, block_b))
+
+        blocks = {}
+        for key_a, block_a in self.blocks.items():
+            for key_b, block_b in grouped_b.get(tuple(key_a[i] for i in axes_a), []):
+                key = tuple(key_a[i] for i in free_a) + tuple(key_b[j] for j in free_b)
+                res = np.tensordot(block_a, block_b, axes=(axes_a, axes_b))
+                if key in blocks:
+                    blocks[key] = blocks[key] + res
+                else:
+                    blocks[key] = res
+
+        qn = [self.qn[i] for i in free_a] + [other.qn[j] for j in free_b]
+        signs = [self.signs[i] for i in free_a] + [other.signs[j] for j in free_b]
+        dtype = np.result_type(self.dtype, other.dtype)
+        return self.__class__(qn, signs, self.qntot + other.qntot, blocks, dtype)
+
+    def __repr__(self):
+        return f"BlockSparseTensor(shape={self.shape}, blocks={len(self.blocks)}, density={self.density:.3f})"
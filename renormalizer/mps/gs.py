@@ -16,11 +16,12 @@ import opt_einsum as oe
 from renormalizer.lib import davidson
 from renormalizer.mps.backend import xp, OE_BACKEND, primme, IMPORT_PRIMME_EXCEPTION
 from renormalizer.mps.matrix import multi_tensor_contract, tensordot, asnumpy, asxp
-from renormalizer.mps.hop_expr import  hop_expr
+from renormalizer.mps.hop_expr import  hop_expr, hop_block_sparse, environ_block_sparse, mpo_site_block_sparse
 from renormalizer.mps.svd_qn import get_qn_mask
 from renormalizer.mps import Mpo, Mps
 from renormalizer.mps.lib import Environ, cvec2cmat
 from renormalizer.utils import Quantity
+from renormalizer.utils.profiler import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +72,7 @@ def optimize_mps(mps: Mps, mpo: Mpo, omega: float = None) -> Tuple[List, Mps]:
     See Also
     --------
     renormalizer.utils.configs.OptimizeConfig : The optimization configuration.
+    DMRG : Resumable driver for warm-started calculations.
 
     Note
     ----
@@ -79,71 +81,204 @@ def optimize_mps(mps: Mps, mpo: Mpo, omega: float = None) -> Tuple[List, Mps]:
     updated with returned mps.model.
     """
 
-    assert mps.optimize_config.method in ["2site", "1site"]
-    logger.info(f"optimization method: {mps.optimize_config.method}")
-    logger.info(f"e_rtol: {mps.optimize_config.e_rtol}")
-    logger.info(f"e_atol: {mps.optimize_config.e_atol}")
-    logger.info(f"procedure: {mps.optimize_config.procedure}")
-
-    # ensure that mps is left or right-canonical
-    # TODO: start from a mix-canonical MPS
-    if mps.is_left_canonical:
-        mps.ensure_right_canonical()
-        env = "R"
-    else:
-        mps.ensure_left_canonical()
-        env = "L"
+    return DMRG(mps, mpo, omega).kernel()
 
-    # construct the environment matrix
-    if omega is not None:
-        identity = Mpo.identity(mpo.model)
-        mpo = mpo.add(identity.scale(-omega))
-        environ = Environ(mps, [mpo, mpo], env)
-    else:
-        environ = Environ(mps, mpo, env)
 
-    macro_iteration_result = []
-    # Idx of the active site with lowest energy for each sweep
-    # determines the index of active site of the returned mps
-    opt_e_idx: int = None
-    res_mps: Union[Mps, List[Mps]] = None
-    for isweep, (mmax, percent) in enumerate(mps.optimize_config.procedure):
-        logger.debug(f"isweep: {isweep}")
-        logger.debug(f"mmax, percent: {mmax}, {percent}")
-        logger.debug(f"{mps}")
+class DMRG:
+    r""" Resumable DMRG driver.
+
+    Unlike :func:`optimize_mps`, the driver keeps the sweeping MPS, the environment
+    tensors and the last eigenvectors of the local problem between calls of
+    :meth:`kernel`. A subsequent call continues the sweeps from where the last one stopped
+    instead of canonicalising the MPS and rebuilding all environments from scratch.
+    When the Hamiltonian is changed through :meth:`update_mpo`,
+    only the environments involving the modified MPO sites are recalculated.
+    This makes parameter scans warm-started.
 
-        micro_iteration_result, res_mps, mpo = single_sweep(mps, mpo, environ, omega, mmax, percent, opt_e_idx)
+    Parameters
+    ----------
+    mps : renormalizer.mps.Mps
+        initial guess of mps. The MPS is overwritten during the optimization.
+    mpo : renormalizer.mps.Mpo
+        mpo of Hamiltonian
+    omega: float, optional
+        target the eigenpair near omega with special variational function
+        :math:(\hat{H}-\omega)^2. Default is `None`.
 
-        opt_e = min(micro_iteration_result)
-        macro_iteration_result.append(opt_e[0])
-        opt_e_idx = opt_e[1]
+    A typical parameter scan reads::
 
-        logger.debug(
-            f"{isweep+1} sweeps are finished, lowest energy = {min(macro_iteration_result)}"
-        )
-        # check if convergence
-        if isweep > 0 and percent == 0:
-            v1, v2 = sorted(macro_iteration_result)[:2]
-            if np.allclose(
-                v1, v2, rtol=mps.optimize_config.e_rtol, atol=mps.optimize_config.e_atol
-            ):
-                logger.info("DMRG has converged!")
-                break
-    else:
-        logger.warning("DMRG did not converge! Please increase the procedure!")
-        logger.info(f"The lowest two energies: {sorted(macro_iteration_result)[:2]}.")
-
-    assert res_mps is not None
-    # remove the redundant basis near the edge
-    if mps.optimize_config.nroots == 1:
-        res_mps = res_mps.normalize("mps_only").ensure_left_canonical().canonicalise()
-        logger.info(f"{res_mps}")
-    else:
-        res_mps = [mp.normalize("mps_only").ensure_left_canonical().canonicalise() for mp in res_mps]
-        logger.info(f"{res_mps[0]}")
-    return macro_iteration_result, res_mps
+        dmrg = DMRG(mps, mpo)
+        energies, mps_opt = dmrg.kernel()
+        for mpo in mpo_list:
+            dmrg.update_mpo(mpo)
+            energies, mps_opt = dmrg.kernel([[m, 0], [m, 0]])
+    """
+    def __init__(self, mps: Mps, mpo: Mpo, omega: float = None):
+        assert mps.optimize_config.method in ["2site", "1site"]
+        self.mps: Mps = mps
+        self.omega: float = omega
+        # the operator actually used in the sweeps
+        self.mpo: Mpo = self._shift_mpo(mpo)
+        self.environ: Environ = None
+        # the local eigenvectors at the end of the last sweep
+        # used as the initial guess for the first site of the next sweep
+        self.last_c: Tuple[List[int], List[np.ndarray]] = None
+        # the range of MPO sites modified since the environments were constructed
+        self._stale: Tuple[int, int] = None
+
+    def _shift_mpo(self, mpo: Mpo) -> Mpo:
+        if self.omega is None:
+            return mpo
+        identity = Mpo.identity(mpo.model)
+        return mpo.add(identity.scale(-self.omega))
+
+    @property
+    def operator(self) -> Union[Mpo, List[Mpo]]:
+        if self.omega is None:
+            return self.mpo
+        else:
+            return [self.mpo, self.mpo]
+
+    def update_mpo(self, mpo: Mpo, omega: float = None) -> List[int]:
+        r""" Replace the Hamiltonian, and optionally the target energy.
+
+        Parameters
+        ----------
+        mpo : renormalizer.mps.Mpo
+            the new mpo of Hamiltonian. Should have the same number of sites as the old one.
+        omega : float, optional
+            the new target energy. Only applicable if the driver is constructed with ``omega``.
+
+        Returns
+        -------
+        changed_sites : list of int
+            The sites at which the MPO (shifted by ``omega``) is changed.
+            Environments containing these sites are recalculated in the next :meth:`kernel`.
+        """
+        if omega is not None:
+            if self.omega is None:
+                raise ValueError("The driver is not constructed for omega targeting.")
+            self.omega = omega
+        new_mpo = self._shift_mpo(mpo)
+        assert new_mpo.site_num == self.mpo.site_num
+
+        changed_sites = []
+        for idx, (mt_old, mt_new) in enumerate(zip(self.mpo, new_mpo)):
+            if mt_old.shape != mt_new.shape or not np.allclose(mt_old.array, mt_new.array):
+                changed_sites.append(idx)
+        logger.info(f"MPO changed at sites: {changed_sites}")
+
+        self.mpo = new_mpo
+        if changed_sites:
+            first, last = changed_sites[0], changed_sites[-1]
+            if self._stale is not None:
+                first, last = min(first, self._stale[0]), max(last, self._stale[1])
+            self._stale = (first, last)
+        return changed_sites
+
+    def _refresh_environ(self):
+        # only the environments read by the next sweep have to be recalculated.
+        # The other side is overwritten during the sweep
+        if self._stale is None:
+            return
+        first, last = self._stale
+        mps = self.mps
+        if mps.to_right:
+            for idx in range(min(last, mps.site_num - 1), 0, -1):
+                self.environ.GetLR("R", idx, mps, self.operator, method="System")
+        else:
+            for idx in range(max(first, 0), mps.site_num - 1):
+                self.environ.GetLR("L", idx, mps, self.operator, method="System")
+        self._stale = None
+
+    @profiler.profile("optimize_mps")
+    def kernel(self, procedure: List = None) -> Tuple[List, Union[Mps, List[Mps]]]:
+        r""" Perform the DMRG sweeps.
+
+        Parameters
+        ----------
+        procedure : list, optional
+            The ``[mmax, percent]`` of each sweep.
+            Default is ``mps.optimize_config.procedure``.
+
+        Returns
+        -------
+        energy : list
+            list of energy of each marco sweep.
+        mps : renormalizer.mps.Mps
+            optimized ground state MPS.
+            Note it's not the same with the sweeping MPS stored in the driver.
+        """
+        mps = self.mps
+        if procedure is None:
+            procedure = mps.optimize_config.procedure
+        logger.info(f"optimization method: {mps.optimize_config.method}")
+        logger.info(f"e_rtol: {mps.optimize_config.e_rtol}")
+        logger.info(f"e_atol: {mps.optimize_config.e_atol}")
+        logger.info(f"procedure: {procedure}")
+
+        if self.environ is None:
+            # ensure that mps is left or right-canonical
+            if mps.is_left_canonical:
+                mps.ensure_right_canonical()
+                env = "R"
+            else:
+                mps.ensure_left_canonical()
+                env = "L"
+            # construct the environment matrix
+            self.environ = Environ(mps, self.operator, env)
+            self._stale = None
+        else:
+            # continue from the last sweep. The MPS is canonical at the end of the last sweep
+            logger.info("restart from the last sweep")
+            self._refresh_environ()
+
+        macro_iteration_result = []
+        # Idx of the active site with lowest energy for each sweep
+        # determines the index of active site of the returned mps
+        opt_e_idx: int = None
+        res_mps: Union[Mps, List[Mps]] = None
+        for isweep, (mmax, percent) in enumerate(procedure):
+            logger.debug(f"isweep: {isweep}")
+            logger.debug(f"mmax, percent: {mmax}, {percent}")
+            logger.debug(f"{mps}")
+
+            micro_iteration_result, res_mps, self.mpo, self.last_c = single_sweep(
+                mps, self.mpo, self.environ, self.omega, mmax, percent, opt_e_idx, self.last_c
+            )
+
+            opt_e = min(micro_iteration_result)
+            macro_iteration_result.append(opt_e[0])
+            opt_e_idx = opt_e[1]
 
+            logger.debug(
+                f"{isweep+1} sweeps are finished, lowest energy = {min(macro_iteration_result)}"
+            )
+            # check if convergence
+            if isweep > 0 and percent == 0:
+                v1, v2 = sorted(macro_iteration_result)[:2]
+                if np.allclose(
+                    v1, v2, rtol=mps.optimize_config.e_rtol, atol=mps.optimize_config.e_atol
+                ):
+                    logger.info("DMRG has converged!")
+                    break
+        else:
+            logger.warning("DMRG did not converge! Please increase the procedure!")
+            logger.info(f"The lowest two energies: {sorted(macro_iteration_result)[:2]}.")
+
+        assert res_mps is not None
+        # remove the redundant basis near the edge
+        if mps.optimize_config.nroots == 1:
+            res_mps = res_mps.normalize("mps_only").ensure_left_canonical().canonicalise()
+            logger.info(f"{res_mps}")
+        else:
+            res_mps = [mp.normalize("mps_only").ensure_left_canonical().canonicalise() for mp in res_mps]
+            logger.info(f"{res_mps[0]}")
+        return macro_iteration_result, res_mps
 
+
+@profiler.profile("optimize_sweep", lambda mps, mpo, environ, omega, mmax, *args, **kwargs:
+                  {"mmax": mmax, "to_right": mps.to_right})
 def single_sweep(
     mps: Mps,
     mpo: Mpo,
@@ -151,7 +286,8 @@ def single_sweep(
     omega: float,
     mmax: int,
     percent: float,
-    last_opt_e_idx: int
+    last_opt_e_idx: int,
+    last_c: Tuple[List[int], List[np.ndarray]] = None,
 ):
 
     method = mps.optimize_config.method
@@ -163,7 +299,9 @@ def single_sweep(
     res_mps: Union[Mps, List[Mps]] = None
     # energies after optimizing each site
     micro_iteration_result = []
-    for imps in mps.iter_idx_list(full=True):
+    # block-sparse MPO site tensors, converted once in the sweep
+    mo_bs = {}
+    for imps in profiler.sweep("optimize_site", mps.iter_idx_list(full=True)):
         if method == "2site" and (
             (mps.to_right and imps == mps.site_num - 1)
             or ((not mps.to_right) and imps == 0)
@@ -226,6 +364,10 @@ def single_sweep(
                 cguess = [asnumpy(raw_cguess)[qn_mask]]
             else:
                 cguess = []
+                if not averaged_ms and last_c is not None and last_c[0] == cidx:
+                    # the first site of the sweep is the last site of the previous sweep
+                    # and the eigenvectors are in the same basis
+                    cguess = [cs[qn_mask] for cs in last_c[1] if cs.shape == cshape]
                 for ms in averaged_ms:
                     if method == "1site":
                         raw_cguess = asnumpy(ms)
@@ -240,7 +382,19 @@ def single_sweep(
             cguess.extend(
                 [np.random.rand(guess_dim) - 0.5 for i in range(len(cguess), nroots)]
             )
-            e, c = eigh_iterative(mps, qn_mask, ltensor, rtensor, cmo, omega, cguess)
+            if mps.optimize_config.block_sparse and omega is None:
+                for idx in cidx:
+                    if idx not in mo_bs:
+                        sigmaqn = np.array(mps._get_sigmaqn(idx)).reshape(-1, mps.model.qn_size)
+                        mo_bs[idx] = mpo_site_block_sparse(
+                            mpo[idx], mpo._get_lsys_qn(idx), sigmaqn, mpo._get_lsys_qn(idx + 1)
+                        )
+                l_bs = environ_block_sparse(ltensor, mps._get_lsys_qn(cidx[0]), mpo._get_lsys_qn(cidx[0]), "L")
+                r_bs = environ_block_sparse(rtensor, mps._get_lsys_qn(cidx[-1] + 1), mpo._get_lsys_qn(cidx[-1] + 1), "R")
+                block_hop = hop_block_sparse(l_bs, r_bs, [mo_bs[idx] for idx in cidx], qn_mask)
+            else:
+                block_hop = None
+            e, c = eigh_iterative(mps, qn_mask, ltensor, rtensor, cmo, omega, cguess, block_hop)
 
         # if multi roots, both davidson and primme return np.ndarray
         if nroots > 1:
@@ -262,14 +416,18 @@ def single_sweep(
                         cstruct[iroot], cidx, qnbigl, qnbigr, mmax, percent
                     )
 
+        if nroots > 1:
+            last_c = (cidx, cstruct)
         averaged_ms = mps._update_mps(cstruct, cidx, qnbigl, qnbigr, mmax, percent)
         if mps.compress_config.ofs is not None:
             mpo.try_swap_site(mps.model, mps.compress_config.ofs_swap_jw)
+            mo_bs.clear()
 
     mps._switch_direction()
-    return micro_iteration_result, res_mps, mpo
+    return micro_iteration_result, res_mps, mpo, last_c
 
 
+@profiler.profile("eigensolver", lambda mps, qn_mask, *args, **kwargs: {"algo": "direct", "shape": qn_mask.shape})
 def eigh_direct(
     mps: Mps,
     qn_mask: np.ndarray,
@@ -345,6 +503,8 @@ def eigh_direct(
     return e, c
 
 
+@profiler.profile("eigensolver", lambda mps, qn_mask, *args, **kwargs:
+                  {"algo": mps.optimize_config.algo, "shape": qn_mask.shape})
 def eigh_iterative(
     mps: Mps,
     qn_mask: np.ndarray,
@@ -353,8 +513,10 @@ def eigh_iterative(
     cmo: List[xp.ndarray],
     omega: float,
     cguess: List[np.ndarray],
+    block_hop=None,
 ):
     # iterative algorithm
+    # ``block_hop`` is the block-sparse effective Hamiltonian by `hop_block_sparse`
     method = mps.optimize_config.method
     inverse = mps.optimize_config.inverse
 
@@ -413,30 +575,35 @@ def eigh_iterative(
     # contraction expression
     cshape = qn_mask.shape
     expr = hop_expr(ltensor, rtensor, cmo, cshape, omega is not None)
+    # the batch size of trial vectors varies during the iteration, so the
+    # batched expressions are constructed on demand
+    batch_exprs = {}
 
     count = 0
 
     def hop(x):
         nonlocal count
-        count += 1
-        clist = []
+        if block_hop is not None:
+            count += 1 if x.ndim == 1 else x.shape[1]
+            return block_hop(x) * inverse
         if x.ndim == 1:
-            clist.append(x)
-        else:
-            for icol in range(x.shape[1]):
-                clist.append(x[:, icol])
-        res = []
-        for c in clist:
+            count += 1
             # convert c to initial structure according to qn pattern
-            cstruct = asxp(cvec2cmat(c, qn_mask))
+            cstruct = asxp(cvec2cmat(x, qn_mask))
             cout = expr(cstruct) * inverse
             # convert structure c to 1d according to qn
-            res.append(asnumpy(cout)[qn_mask])
-
-        if len(res) == 1:
-            return res[0]
-        else:
-            return np.stack(res, axis=1)
+            return asnumpy(cout)[qn_mask]
+
+        # all of the vectors (columns of x) are contracted at once
+        # with the vector index treated as an additional tensor index
+        nvec = x.shape[1]
+        count += nvec
+        if nvec not in batch_exprs:
+            batch_exprs[nvec] = hop_expr(ltensor, rtensor, cmo, cshape, omega is not None, batch=nvec)
+        cstruct = np.zeros(cshape + (nvec,), dtype=x.dtype)
+        cstruct[qn_mask] = x
+        cout = batch_exprs[nvec](asxp(cstruct)) * inverse
+        return asnumpy(cout)[qn_mask]
 
     # Find the eigenvectors
     algo = mps.optimize_config.algo
@@ -445,7 +612,7 @@ def eigh_iterative(
         precond = lambda x, e, *args: x / (hdiag - e + 1e-4)
 
         e, c = davidson(
-            hop, cguess, precond, max_cycle=100, nroots=nroots, max_memory=64000
+            hop, cguess, precond, max_cycle=100, nroots=nroots, max_memory=64000, batch=True
         )
         # if one root, davidson return e as np.float
 
@@ -2,10 +2,38 @@
 
 import opt_einsum as oe
 
-from renormalizer.mps.matrix import asxp
+from renormalizer.mps.backend import np
+from renormalizer.mps.block_sparse import BlockSparseTensor
+from renormalizer.mps.matrix import asxp, asnumpy
+from renormalizer.utils.profiler import profiler
 
 
-def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
+def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False, batch:int=None):
+    r""" Construct the contraction expression of the effective Hamiltonian
+    applied on the local coefficient tensor.
+
+    Parameters
+    ----------
+    ltensor : np.ndarray
+        The left environment.
+    rtensor : np.ndarray
+        The right environment.
+    cmo : list of np.ndarray
+        The local MPO site tensors.
+    cshape : tuple
+        The shape of the local coefficient tensor.
+    twolayer : bool
+        Whether the environments contain two layers of MPO, i.e. :math:`H^2`.
+    batch : int
+        If not ``None``, the expression takes a stack of ``batch`` coefficient tensors
+        with an additional last index and returns a stack with the same layout.
+        All of the vectors are then treated in one contraction.
+
+    Returns
+    -------
+    expr : opt_einsum.contract.ContractExpression
+        The expression to be called with the coefficient tensor.
+    """
 
     nsite = len(cmo)
     # whether have the ancilla
@@ -33,39 +61,28 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #   |   f   |
             #   O-c-O-i-O
             #   S-d h k-S
-            expr = oe.contract_expression(
-                "abcd, befg, cfhi, jgik, aej -> dhk",
-                ltensor, cmo[0], cmo[0], rtensor, cshape,
-                constants=[0, 1, 2, 3]
-            )
+            subscripts = "abcd, befg, cfhi, jgik, aej -> dhk"
+            operands = [ltensor, cmo[0], cmo[0], rtensor]
         else:
             #   S-a e   j o-S
             #   O-b-O-g-O-l-O
             #   |   f   k   |
             #   O-c-O-i-O-n-O
             #   S-d h   m p-S
-            expr = oe.contract_expression(
-                "abcd, befg, cfhi, gjkl, ikmn, olnp, aejo -> dhmp",
-                ltensor, cmo[0], cmo[0], cmo[1], cmo[1], rtensor, cshape,
-                constants=[0, 1, 2, 3, 4, 5],
-            )
-        # early return
-        return expr
+            subscripts = "abcd, befg, cfhi, gjkl, ikmn, olnp, aejo -> dhmp"
+            operands = [ltensor, cmo[0], cmo[0], cmo[1], cmo[1], rtensor]
 
     # Single layer, the most common case
     # Could be written in an automatic way
     # But for now probably an overkill
-    if nsite == 0:
+    elif nsite == 0:
         # S-a   l-S
         #
         # O-b - b-O
         #
         # S-c   k-S
-        expr = oe.contract_expression(
-            "abc, lbk, ck -> al",
-            ltensor, rtensor, cshape,
-            constants=[0, 1],
-        )
+        subscripts = "abc, lbk, ck -> al"
+        operands = [ltensor, rtensor]
     elif nsite == 1:
         if not ancilla:
             # S-a   l-S
@@ -73,11 +90,8 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             # O-b-O-f-O
             #     e
             # S-c   k-S
-            expr = oe.contract_expression(
-                "abc, bdef, lfk, cek -> adl",
-                ltensor, cmo[0], rtensor, cshape,
-                constants=[0, 1, 2],
-            )
+            subscripts = "abc, bdef, lfk, cek -> adl"
+            operands = [ltensor, cmo[0], rtensor]
         else:
             # S-a   l-S
             #     d
@@ -85,11 +99,8 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #     e
             # S-c   k-S
             #     g
-            expr = oe.contract_expression(
-                "abc, bdef, lfk, cegk -> adgl",
-                ltensor, cmo[0], rtensor, cshape,
-                constants=[0, 1, 2],
-            )
+            subscripts = "abc, bdef, lfk, cegk -> adgl"
+            operands = [ltensor, cmo[0], rtensor]
     else:
         if not ancilla:
             # S-a       l-S
@@ -97,11 +108,8 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             # O-b-O-f-O-j-O
             #     e   h
             # S-c       k-S
-            expr = oe.contract_expression(
-                "abc, bdef, fghj, ljk, cehk -> adgl",
-                ltensor, cmo[0], cmo[1], rtensor, cshape,
-                constants=[0, 1, 2, 3],
-            )
+            subscripts = "abc, bdef, fghj, ljk, cehk -> adgl"
+            operands = [ltensor, cmo[0], cmo[1], rtensor]
         else:
             # S-a       l-S
             #     d   g
@@ -109,10 +117,165 @@ def hop_expr(ltensor, rtensor, cmo, cshape, twolayer:bool=False):
             #     e   h
             # S-c       k-S
             #     m   n
-            expr = oe.contract_expression(
-                "abc, bdef, fghj, ljk, cemhnk -> admgnl",
-                ltensor, cmo[0], cmo[1], rtensor, cshape,
-                constants=[0, 1, 2, 3],
-            )
+            subscripts = "abc, bdef, fghj, ljk, cemhnk -> admgnl"
+            operands = [ltensor, cmo[0], cmo[1], rtensor]
+
+    # the coefficient tensor is always the last operand
+    inputs, output = subscripts.replace(" ", "").split("->")
+    if batch is not None:
+        # an index not used in any of the expressions above
+        inputs += "z"
+        output += "z"
+        cshape = tuple(cshape) + (batch,)
+    expr = oe.contract_expression(
+        f"{inputs}->{output}", *operands, cshape,
+        constants=list(range(len(operands)))
+    )
+    if profiler.enabled:
+        shapes = [operand.shape for operand in operands] + [tuple(cshape)]
+        flops = oe.contract_path(f"{inputs}->{output}", *shapes, shapes=True)[1].opt_cost
+        expr = _ProfiledExpr(expr, int(flops))
+    return expr
+
+
+def environ_block_sparse(tensor, bond_qn, mpo_bond_qn, domain: str) -> BlockSparseTensor:
+    r""" Convert a single layer environment to :class:`~renormalizer.mps.block_sparse.BlockSparseTensor`.
+    The directions of the legs follow `MatrixProduct.block_sparse` and the bra is conjugated.
+
+    Parameters
+    ----------
+    tensor : np.ndarray
+        The environment with legs (bra, MPO, ket).
+    bond_qn : np.ndarray
+        The quantum numbers of the MPS bond in the L-system convention.
+    mpo_bond_qn : np.ndarray
+        The quantum numbers of the MPO bond in the L-system convention.
+    domain : str
+        ``"L"`` for the left environment and ``"R"`` for the right environment.
+
+    Returns
+    -------
+    tensor : BlockSparseTensor
+        The block-sparse environment.
+    """
+    assert domain in ["L", "R"]
+    signs = [1, -1, -1] if domain == "L" else [-1, 1, 1]
+    zero = np.zeros(np.asarray(bond_qn).reshape(len(bond_qn), -1).shape[1], dtype=int)
+    return BlockSparseTensor.from_dense(asnumpy(tensor), [bond_qn, mpo_bond_qn, bond_qn], signs, zero)
+
+
+def mpo_site_block_sparse(mo, lbond_qn, sigmaqn, rbond_qn) -> BlockSparseTensor:
+    r""" Convert an MPO site tensor to :class:`~renormalizer.mps.block_sparse.BlockSparseTensor`.
+    Different from `MatrixProduct.block_sparse`, the physical legs are not fused.
+
+    Parameters
+    ----------
+    mo : np.ndarray
+        The MPO site tensor.
+    lbond_qn : np.ndarray
+        The quantum numbers of the left MPO bond in the L-system convention.
+    sigmaqn : np.ndarray
+        The quantum numbers of the physical legs.
+    rbond_qn : np.ndarray
+        The quantum numbers of the right MPO bond in the L-system convention.
+
+    Returns
+    -------
+    tensor : BlockSparseTensor
+        The block-sparse MPO site tensor.
+    """
+    zero = np.zeros(np.asarray(sigmaqn).shape[1], dtype=int)
+    return BlockSparseTensor.from_dense(asnumpy(mo), [lbond_qn, sigmaqn, sigmaqn, rbond_qn], [1, 1, -1, -1], zero)
+
+
+def hop_block_sparse(l_bs, r_bs, mo_bs, qn_mask):
+    r""" Construct the effective Hamiltonian applied on the local coefficient vector
+    with block-sparse tensors. Only the blocks allowed by the quantum number conservation
+    are contracted. The environments and the MPO site tensors are converted beforehand by
+    :func:`environ_block_sparse` and :func:`mpo_site_block_sparse`, so that they can be
+    reused. Single layer environments without ancilla only.
+
+    Parameters
+    ----------
+    l_bs : BlockSparseTensor
+        The left environment.
+    r_bs : BlockSparseTensor
+        The right environment.
+    mo_bs : list of BlockSparseTensor
+        The local MPO site tensors.
+    qn_mask : np.ndarray
+        The quantum number mask of the local coefficient tensor.
+
+    Returns
+    -------
+    hop : callable
+        The function that takes the coefficient vector (the allowed elements of the
+        coefficient tensor, ``coeff[qn_mask]``) or the stack of vectors as the columns
+        of a matrix and returns the result in the same layout.
+    """
+    nsite = len(mo_bs)
+    assert nsite in [1, 2] and nsite + 2 == qn_mask.ndim
+    zero = l_bs.qntot
+    qnl = l_bs.qn[2]
+    qnr = r_bs.qn[2]
+    sigmaqn = [mo.qn[1] for mo in mo_bs]
+
+    # the position of the allowed elements of each block in the coefficient vector
+    template = BlockSparseTensor([qnl] + list(sigmaqn) + [qnr], [1] * (nsite + 1) + [-1], zero)
+    pos = np.full(qn_mask.shape, -1)
+    pos[qn_mask] = np.arange(np.sum(qn_mask))
+    block_pos = {}
+    for key in template.allowed_keys():
+        idx = pos[np.ix_(*[template.sectors[i][q] for i, q in enumerate(key)])]
+        assert np.all(idx != -1)
+        block_pos[key] = idx
+    assert sum(idx.size for idx in block_pos.values()) == np.sum(qn_mask)
+
+    def hop(x):
+        squeeze = x.ndim == 1
+        if squeeze:
+            x = x.reshape(-1, 1)
+        nvec = x.shape[1]
+        # the vectors are treated as an additional leg without quantum number
+        batch_qn = np.zeros((nvec, len(zero)), dtype=int)
+        batch_key = tuple(zero.tolist())
+        blocks = {key + (batch_key,): x[idx] for key, idx in block_pos.items()}
+        c_bs = BlockSparseTensor(template.qn + [batch_qn], template.signs + (1,), zero, blocks, x.dtype)
+
+        # a, b, d(, g), l, z
+        out = l_bs.tensordot(c_bs, axes=([2], [0]))
+        if nsite == 1:
+            # a, l, z, d, f
+            out = out.tensordot(mo_bs[0], axes=([1, 2], [0, 2]))
+            # a, z, d, l
+            out = out.tensordot(r_bs, axes=([1, 4], [2, 1]))
+            out = out.transpose([0, 2, 3, 1])
+        else:
+            # a, g, l, z, d, f
+            out = out.tensordot(mo_bs[0], axes=([1, 2], [0, 2]))
+            # a, l, z, d, g, j
+            out = out.tensordot(mo_bs[1], axes=([1, 5], [2, 0]))
+            # a, z, d, g, l
+            out = out.tensordot(r_bs, axes=([1, 5], [2, 1]))
+            out = out.transpose([0, 2, 3, 4, 1])
+
+        res = np.zeros(x.shape, dtype=np.result_type(out.dtype, x.dtype))
+        for key, block in out.blocks.items():
+            res[block_pos[key[:-1]]] = block
+        if squeeze:
+            res = res[:, 0]
+        return res
+
+    return hop
+
+
+class _ProfiledExpr:
+    # count the contractions and the FLOPs in the open profiler regions
+
+    def __init__(self, expr, flops):
+        self.expr = expr
+        self.flops = flops
 
-    return expr
\ No newline at end of file
+    def __call__(self, *args, **kwargs):
+        profiler.add(hops=1, flops=self.flops)
+        return self.expr(*args, **kwargs)
\ No newline at end of file
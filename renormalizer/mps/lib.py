@@ -1,23 +1,208 @@
 # -*- coding: utf-8 -*-
 # Author: Jiajun Ren <jiajunren0522@gmail.com>
 
+import logging
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from functools import reduce
 from collections import deque
 
 from renormalizer.mps.backend import np, backend, xp
 from renormalizer.mps.matrix import (Matrix, multi_tensor_contract, asxp,
     asnumpy, tensordot)
+from renormalizer.utils.profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryStorage:
+    r""" Store the environment tensors in memory. """
+    def __init__(self):
+        self._data = {}
+
+    def __setitem__(self, key, array):
+        self._data[key] = array
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def copy(self):
+        # the tensors are replaced rather than modified in place, so a shallow copy is safe
+        new = self.__class__()
+        new._data = self._data.copy()
+        return new
+
+    def prefetch(self, key):
+        pass
+
+    def close(self):
+        self._data.clear()
+
+
+class DiskStorage:
+    r""" Store the environment tensors as ``.npy`` files in a temporary directory
+    under ``dump_dir``. The tensors are read back by memory mapping. The directory is
+    removed when the storage is closed or garbage-collected.
+    """
+    def __init__(self, dump_dir="./"):
+        self.dump_dir = tempfile.mkdtemp(prefix="environ_", dir=dump_dir)
+        self._keys = set()
+
+    def _path(self, key):
+        domain, siteidx = key
+        return os.path.join(self.dump_dir, f"{domain}_{siteidx}.npy")
+
+    def _dump(self, key, array):
+        # write to a temporary file first so that concurrent readers never see a partial file
+        path = self._path(key)
+        tmp_path = path + ".tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+        self._keys.add(key)
+
+    def _load(self, key):
+        return np.load(self._path(key), mmap_mode="r")
+
+    def __setitem__(self, key, array):
+        self._dump(key, array)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        return self._load(key)
+
+    def __delitem__(self, key):
+        self._keys.remove(key)
+        path = self._path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def prefetch(self, key):
+        pass
+
+    def close(self):
+        if self.dump_dir is not None:
+            shutil.rmtree(self.dump_dir, ignore_errors=True)
+            self.dump_dir = None
+        self._keys = set()
+
+    def __del__(self):
+        self.close()
+
+
+class LRUDiskStorage(DiskStorage):
+    r""" Keep at most ``cache_size`` most recently used environment tensors in memory
+    and the rest in disk. Tensors are written to the disk only when evicted from the cache.
+    :meth:`prefetch` loads a tensor from the disk by a background thread
+    so that the I/O overlaps with the computation.
+    """
+    def __init__(self, dump_dir="./", cache_size=4):
+        super().__init__(dump_dir)
+        assert 0 < cache_size
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def _load_to_memory(self, key):
+        return np.array(self._load(key))
+
+    def _cache_put(self, key, array):
+        self._cache[key] = array
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            old_key, old_array = self._cache.popitem(last=False)
+            self._dump(old_key, old_array)
+
+    def __setitem__(self, key, array):
+        # prefetched value (if any) is outdated
+        self._pending.pop(key, None)
+        self._keys.add(key)
+        self._cache_put(key, array)
+
+    def __getitem__(self, key):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key not in self._keys:
+            raise KeyError(key)
+        future = self._pending.pop(key, None)
+        if future is not None:
+            array = future.result()
+        else:
+            array = self._load_to_memory(key)
+        self._cache_put(key, array)
+        return array
+
+    def __delitem__(self, key):
+        self._cache.pop(key, None)
+        future = self._pending.pop(key, None)
+        if future is not None:
+            future.result()
+        super().__delitem__(key)
+
+    def prefetch(self, key):
+        if key in self._cache or key in self._pending or key not in self._keys:
+            return
+        if not os.path.exists(self._path(key)):
+            return
+        self._pending[key] = self._executor.submit(self._load_to_memory, key)
+
+    def close(self):
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self._pending = {}
+        self._cache = OrderedDict()
+        super().close()
+
+
+def get_environ_storage(compress_config=None):
+    r""" Construct the storage of environment tensors according to ``compress_config``.
+    """
+    storage = getattr(compress_config, "environ_storage", "memory")
+    if storage == "memory":
+        return MemoryStorage()
+    dump_dir = compress_config.dump_matrix_dir
+    if storage == "disk":
+        return DiskStorage(dump_dir)
+    elif storage == "lru":
+        return LRUDiskStorage(dump_dir, compress_config.environ_cache_size)
+    else:
+        raise ValueError(f"Unknown environment storage: {storage}")
 
 
 class Environ:
-    def __init__(self, mps, mpo, domain=None, mps_conj=None):
-        # todo: real disk and other backend
+    def __init__(self, mps, mpo, domain=None, mps_conj=None, storage=None):
         # todo: contract_one_site_multi_mpo could generalize contract_one_site,
         # we could unify them in the future.
 
         # idx indicates the exact position of L or R, like
         # L(idx-1) - mpo(idx) - R(idx+1)
-        self._virtual_disk = {}
+        if storage is None:
+            storage = get_environ_storage(getattr(mps, "compress_config", None))
+        self._virtual_disk = storage
+        # the site tensors from which each environment tensor is contracted,
+        # used to find the stale tensors in ``update``
+        self._sources = {}
         if type(mpo) is list:
             ndim = len(mpo) + 2
         else:
@@ -25,16 +210,20 @@ class Environ:
         self.sentinel = xp.ones([1,]*ndim, dtype=backend.real_dtype)
         self._construct(mps, mpo, domain, mps_conj)
 
-    def _construct(self, mps, mpo, domain=None, mps_conj=None):
+    @profiler.profile("environ_construct", lambda self, mps, mpo, domain=None, *args, **kwargs: {"domain": domain})
+    def _construct(self, mps, mpo, domain=None, mps_conj=None, track=None):
 
         assert domain in ["L", "R", None]
 
+        # the sources are unknown if the bra is not the conjugation of the ket
+        if track is None:
+            track = mps_conj is None
         if mps_conj is None:
             mps_conj = mps.conj()
 
         if domain is None:
-            self._construct(mps, mpo, "L", mps_conj)
-            self._construct(mps, mpo, "R", mps_conj)
+            self._construct(mps, mpo, "L", mps_conj, track)
+            self._construct(mps, mpo, "R", mps_conj, track)
             return
         if domain == "L":
             start, end, inc = 0, len(mps) - 1, 1
@@ -51,7 +240,11 @@ class Environ:
             else:
                 # one single mpo
                 tensor = contract_one_site(tensor, mps[idx], mpo[idx], domain, ms_conj=mps_conj[idx])
-            self.write(domain, idx, tensor)
+            self.write(domain, idx, tensor, _source(mps, mpo, idx) if track else None)
+
+    @property
+    def storage(self):
+        return self._virtual_disk
 
     def write_l_sentinel(self, mps):
         self.write("L", -1, self.sentinel)
@@ -59,6 +252,8 @@ class Environ:
     def write_r_sentinel(self, mps):
         self.write("R", len(mps), self.sentinel)
 
+    @profiler.profile("environ", lambda self, domain, siteidx, mps, mpo, itensor=None, method="Scratch", *args, **kwargs:
+                      {"domain": domain, "site": siteidx, "method": method})
     def GetLR(
         self, domain, siteidx, mps, mpo, itensor=None, method="Scratch", mps_conj=None):
         """
@@ -107,15 +302,85 @@ class Environ:
             else:
                 itensor = contract_one_site(itensor, mps[siteidx], mpo[siteidx],
                         domain, mps_conj[siteidx])
-            self.write(domain, siteidx, itensor)
+            source = _source(mps, mpo, siteidx) if mps_conj[siteidx] is None else None
+            self.write(domain, siteidx, itensor, source)
 
         return itensor
 
-    def write(self, domain, siteidx, tensor):
+    def write(self, domain, siteidx, tensor, source=None):
         self._virtual_disk[(domain, siteidx)] = asnumpy(tensor)
+        self._sources[(domain, siteidx)] = source
+
+    def update(self, mps, mpo, domain):
+        """
+        Recontract the environment tensors in ``domain`` that are not consistent with ``mps`` and ``mpo``.
+        An environment tensor is up to date if the site tensors it is contracted from,
+        including those of the inner environment tensors, are the same objects as those in ``mps`` and ``mpo``.
+        The tensors written without the sources known, such as those with an explicit ``mps_conj``,
+        are always recontracted.
+
+        Returns
+        -------
+        n_updated : int
+            The number of the recontracted tensors.
+        """
+        assert domain in ["L", "R"]
+        if domain == "L":
+            sitelist = range(0, len(mps) - 1)
+            offset = -1
+        else:
+            sitelist = range(len(mps) - 1, 0, -1)
+            offset = 1
+        self.write_l_sentinel(mps)
+        self.write_r_sentinel(mps)
+        n_updated = 0
+        stale = False
+        for idx in sitelist:
+            if not stale:
+                source = self._sources.get((domain, idx))
+                stale = source is None or not _source_equal(source, _source(mps, mpo, idx))
+                if not stale:
+                    continue
+            self.GetLR(domain, idx, mps, mpo, itensor=self.read(domain, idx + offset), method="System")
+            n_updated += 1
+        return n_updated
+
+    def discard(self, domain):
+        """
+        Remove the environment tensors in ``domain`` to save memory.
+        """
+        for key in list(self._sources):
+            if key[0] == domain:
+                del self._virtual_disk[key]
+                del self._sources[key]
+
+    def copy(self):
+        """
+        Copy the environment so that the copy can be updated independently.
+        Only supported by the in-memory storage.
+        """
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__ = self.__dict__.copy()
+        new._virtual_disk = self._virtual_disk.copy()
+        new._sources = self._sources.copy()
+        return new
 
     def read(self, domain: str, siteidx: int):
-        return asxp(self._virtual_disk[(domain, siteidx)])
+        res = asxp(self._virtual_disk[(domain, siteidx)])
+        # the next tensor to be read in the sweep
+        next_idx = siteidx + 1 if domain == "R" else siteidx - 1
+        self._virtual_disk.prefetch((domain, next_idx))
+        return res
+
+
+def _source(mps, mpo, idx):
+    if type(mpo) is list:
+        return (mps[idx],) + tuple(mp[idx] for mp in mpo)
+    return mps[idx], mpo[idx]
+
+
+def _source_equal(source1, source2):
+    return len(source1) == len(source2) and all(s1 is s2 for s1, s2 in zip(source1, source2))
 
 
 def contract_one_site_multi_mpo(environ, ms, mos, domain, ms_conj=None):
@@ -4,12 +4,13 @@
 import logging
 import os
 import shutil
-from typing import List, Union
+from typing import Dict, List, Union
 
 from renormalizer.model import Model, HolsteinModel
 from renormalizer.mps.backend import np, xp
 from renormalizer.mps import svd_qn
 from renormalizer.mps.svd_qn import add_outer, get_qn_mask
+from renormalizer.mps.block_sparse import BlockSparseTensor
 from renormalizer.mps.matrix import (
     asnumpy,
     asxp,
@@ -26,7 +27,9 @@ from renormalizer.mps.lib import (
     select_basis,
     )
 from renormalizer.mps.hop_expr import hop_expr
+from renormalizer.mps.mpfile import MpFile, is_mp_file
 from renormalizer.utils import sizeof_fmt, CompressConfig, OFS, calc_vn_entropy
+from renormalizer.utils.profiler import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +38,20 @@ class MatrixProduct:
 
     @classmethod
     def load(cls, model: Model, fname: str):
+        """
+        Load the matrix product dumped by :meth:`dump`.
+        The site tensors are memory mapped and are read from the disk when they are used.
+        Files in the old ``.npz`` format are also supported.
+
+        Parameters
+        ----------
+        model : :class:`~renormalizer.model.Model`
+            The model of the matrix product.
+        fname : str
+            The path of the file.
+        """
+        if is_mp_file(fname):
+            return cls._load_mp_file(model, fname)
         npload = np.load(fname, allow_pickle=True)
         mp = cls()
         mp.model = model
@@ -51,6 +68,22 @@ class MatrixProduct:
         mp.to_right = bool(npload["to_right"])
         return mp
 
+    @classmethod
+    def _load_mp_file(cls, model: Model, fname: str):
+        mp_file = MpFile(fname)
+        mp = cls()
+        mp.model = model
+        if any(np.iscomplexobj(mt) for mt in mp_file):
+            mp.dtype = backend.complex_dtype
+        else:
+            mp.dtype = backend.real_dtype
+        for mt in mp_file:
+            mp.append(mt)
+        mp.qn = mp_file.qn
+        for attr, value in mp_file.attrs.items():
+            setattr(mp, attr, value)
+        return mp
+
     def __init__(self):
         # XXX: when modify theses codes, keep in mind to update `metacopy` method
         # set to a list of None upon metacopy. String is used when the matrix is
@@ -73,6 +106,11 @@ class MatrixProduct:
         # compress after add?
         self.compress_add: bool = False
 
+        # the singular values at each bond seen by the sweeps, with the
+        # bond index the same as ``bond_dims[1:-1]``. Cleared when any site is
+        # set other than by the gauge transformations in ``_update_ms``
+        self._bond_spectra: Dict[int, np.ndarray] = {}
+
     @property
     def site_num(self):
         return len(self._mp)
@@ -225,6 +263,9 @@ class MatrixProduct:
         r""" update mps directly after svd
 
         """
+        # the update is a gauge transformation, possibly with truncation.
+        # Keep the recorded spectra of the other bonds
+        bond_spectra = self._bond_spectra
 
         if m_trunc is None:
             m_trunc = u.shape[1]
@@ -270,6 +311,9 @@ class MatrixProduct:
             ret_mpsi = ret_mpsi.copy()
         assert ret_mpsi.any()
         self[idx] = ret_mpsi
+        self._bond_spectra = bond_spectra
+        if sigma is not None:
+            bond_spectra[idx if self.to_right else idx - 1] = asnumpy(sigma)
 
     def _switch_direction(self):
         assert self.to_right is not None
@@ -328,6 +372,40 @@ class MatrixProduct:
         qnmat = add_outer(qnbigl, qnbigr)
         return qnbigl, qnbigr, qnmat
 
+    def _get_lsys_qn(self, bond_idx: int) -> np.ndarray:
+        # the quantum number of the bond in the L-system convention
+        qn = np.array(self.qn[bond_idx])
+        if bond_idx <= self.qnidx:
+            return qn
+        return self.qntot - qn
+
+    def block_sparse(self, idx: int) -> BlockSparseTensor:
+        r""" The site tensor as a :class:`~renormalizer.mps.block_sparse.BlockSparseTensor`.
+        Only the blocks allowed by the quantum number conservation are stored.
+
+        The legs are (left bond, physical, right bond), the quantum number of the bonds is
+        in the L-system convention and the directions of the legs are ``(1, 1, -1)``.
+        For MPO and MPDM the physical legs are fused into one leg.
+
+        Parameters
+        ----------
+        idx : int
+            The site index.
+
+        Returns
+        -------
+        tensor : BlockSparseTensor
+            The block-sparse site tensor.
+        """
+        if self.qn is None:
+            raise ValueError("Quantum number is not available")
+        mt = self[idx]
+        qn_size = len(self.qntot)
+        sigmaqn = np.array(self._get_sigmaqn(idx)).reshape(-1, qn_size)
+        array = mt.array.reshape(mt.shape[0], -1, mt.shape[-1])
+        qn = [self._get_lsys_qn(idx), sigmaqn, self._get_lsys_qn(idx + 1)]
+        return BlockSparseTensor.from_dense(array, qn, [1, 1, -1], np.zeros(qn_size, dtype=int))
+
     @property
     def mp_norm(self) -> float:
         # the fast version in the comment rarely makes sense because in a lot of cases
@@ -414,6 +492,7 @@ class MatrixProduct:
             new_mps.compress()
         return new_mps
 
+    @profiler.profile("compress")
     def compress(self, temp_m_trunc=None, ret_s=False):
         """
         inp: canonicalise MPS (or MPO)
@@ -447,7 +526,7 @@ class MatrixProduct:
         system = "L" if self.to_right else "R"
 
         s_list = []
-        for idx in self.iter_idx_list(full=False):
+        for idx in profiler.sweep("compress_site", self.iter_idx_list(full=False)):
             mt: Matrix = self[idx]
             qnbigl, qnbigr, _ = self._get_big_qn([idx])
             u, sigma, qnlset, v, sigma, qnrset = svd_qn.svd_qn(
@@ -457,6 +536,7 @@ class MatrixProduct:
                 self.qntot,
                 system=system,
                 full_matrices=False,
+                nthreads=self.compress_config.svd_threads,
             )
             vt = v.T
             s_list.append(sigma)
@@ -480,6 +560,7 @@ class MatrixProduct:
             # return singular value list
             return self, s_list
 
+    @profiler.profile("variational_compress")
     def variational_compress(self, mpo=None, guess=None):
         r"""Variational compress an mps/mpdm/mpo
 
@@ -529,7 +610,7 @@ class MatrixProduct:
             logger.debug(f"mmax, percent: {mmax}, {percent}")
             logger.debug(f"mps bond dims: {mps.bond_dims}")
 
-            for imps in mps.iter_idx_list(full=True):
+            for imps in profiler.sweep("variational_compress_site", mps.iter_idx_list(full=True)):
                 if method == "2site" and \
                     ((mps.to_right and imps == mps.site_num-1)
                     or ((not mps.to_right) and imps == 0)):
@@ -649,7 +730,8 @@ class MatrixProduct:
                 # SVD method
                 # full_matrices = True here to enable increase the bond dimension
                 Uset, SUset, qnlnew, Vset, SVset, qnrnew = svd_qn.svd_qn(
-                    asnumpy(cstruct), qnbigl, qnbigr, self.qntot, system=system
+                    asnumpy(cstruct), qnbigl, qnbigr, self.qntot, system=system,
+                    nthreads=self.compress_config.svd_threads,
                 )
             else:
                 if isinstance(self.model, HolsteinModel):
@@ -658,7 +740,8 @@ class MatrixProduct:
 
                 qnbigl1, qnbigr1 = qnbigl, qnbigr
                 Uset1, SUset1, qnlnew1, Vset1, SVset1, qnrnew1 = svd_qn.svd_qn(
-                    asnumpy(cstruct), qnbigl1, qnbigr1, self.qntot, system=system
+                    asnumpy(cstruct), qnbigl1, qnbigr1, self.qntot, system=system,
+                    nthreads=self.compress_config.svd_threads,
                 )
                 qnbigl2, qnbigr2, _ = self._get_big_qn(cidx, swap=True)
                 if cstruct.ndim == 4:
@@ -671,7 +754,8 @@ class MatrixProduct:
                     cstruct2 = cstruct2.copy()
                     cstruct2[:, 1, 1, :] = -cstruct2[:, 1, 1, :]
                 Uset2, SUset2, qnlnew2, Vset2, SVset2, qnrnew2 = svd_qn.svd_qn(
-                    cstruct2, qnbigl2, qnbigr2, self.qntot, system=system
+                    cstruct2, qnbigl2, qnbigr2, self.qntot, system=system,
+                    nthreads=self.compress_config.svd_threads,
                 )
                 entropy1 = calc_vn_entropy(SUset1**2)
                 entropy2 = calc_vn_entropy(SUset2**2)
@@ -743,7 +827,8 @@ class MatrixProduct:
                     )
             ddm /= len(cstruct)
             Uset, Sset, qnnew = svd_qn.eigh_qn(
-                asnumpy(ddm), qnbigl, qnbigr, self.qntot, system=system
+                asnumpy(ddm), qnbigl, qnbigr, self.qntot, system=system,
+                nthreads=self.compress_config.svd_threads,
             )
             ms, msdim, msqn, compms = select_basis(
                 Uset, Sset, qnnew, None, Mmax, percent=percent
@@ -838,6 +923,7 @@ class MatrixProduct:
             QR=True,
             system=system,
             full_matrices=False,
+            nthreads=self.compress_config.svd_threads,
         )
         self._update_ms(
             idx, u, v.T, sigma=None, qnlset=qnlset, qnrset=qnrset
@@ -864,6 +950,7 @@ class MatrixProduct:
         new_mp = self.metacopy()
         for idx, mt in enumerate(self):
             new_mp[idx] = mt.conj()
+        new_mp._bond_spectra = self._bond_spectra.copy()
         return new_mp
 
     def dot(self, other: "MatrixProduct") -> complex:
@@ -902,8 +989,11 @@ class MatrixProduct:
             new_mp.to_complex(inplace=True)
         else:
             val = val.real
+        # the singular values are scaled as well
+        bond_spectra = {bond: sigma * abs(val) for bond, sigma in new_mp._bond_spectra.items()}
         assert new_mp[self.qnidx].array.any()
         new_mp[self.qnidx] = new_mp[self.qnidx] * val
+        new_mp._bond_spectra = bond_spectra
         return new_mp
 
     def to_complex(self, inplace=False):
@@ -912,11 +1002,13 @@ class MatrixProduct:
         else:
             new_mp = self.metacopy()
         new_mp.dtype = backend.complex_dtype
+        bond_spectra = self._bond_spectra.copy()
         for i, mt in enumerate(self):
             if mt is None:
                 # dummy mt after metacopy. Bad idea. Remove the dummy thing when feasible
                 continue
             new_mp[i] = mt.to_complex()
+        new_mp._bond_spectra = bond_spectra
         return new_mp
 
     def distance(self, other) -> float:
@@ -940,6 +1032,23 @@ class MatrixProduct:
         # use getitem/setitem to handle strings
         for i in range(self.site_num):
             new[i] = self[i].copy()
+        new._bond_spectra = self._bond_spectra.copy()
+        return new
+
+    def shallow_copy(self):
+        """
+        Copy the metadata and share the site tensors. The site tensors are replaced
+        by ``__setitem__`` rather than modified in place, so the copy works as a copy-on-write
+        snapshot that costs no memory until the sites are updated. The site tensors dumped
+        to the disk are copied because the files are removed when the sites are updated.
+        """
+        new = self.metacopy()
+        for i, mt in enumerate(self._mp):
+            if isinstance(mt, str):
+                new[i] = self[i]
+            else:
+                new._mp[i] = mt
+        new._bond_spectra = self._bond_spectra.copy()
         return new
 
     # only (shallow) copy metadata because usually after been copied the real data is overwritten
@@ -956,6 +1065,7 @@ class MatrixProduct:
         new.qntot = self.qntot
         new.to_right = self.to_right
         new.compress_add = self.compress_add
+        new._bond_spectra = {}
         return new
 
     def _array2mt(self, array, idx, allow_dump=True):
@@ -997,6 +1107,17 @@ class MatrixProduct:
         self._mp = [[None]] * num
 
     def dump(self, fname, other_attrs=None):
+        """
+        Dump the matrix product to ``fname`` in the format of :class:`~renormalizer.mps.MpFile`,
+        which can be loaded lazily by :meth:`load`.
+
+        Parameters
+        ----------
+        fname : str
+            The path of the file.
+        other_attrs : str or list of str
+            The names of the other attributes to dump.
+        """
 
         if other_attrs is None:
             other_attrs = []
@@ -1004,18 +1125,11 @@ class MatrixProduct:
             other_attrs = [other_attrs]
         assert isinstance(other_attrs, list)
 
-        data_dict = dict()
-        # version of the protocol
-        data_dict["version"] = "0.3"
-        data_dict["nsites"] = self.site_num
-        for idx, mt in enumerate(self):
-            data_dict[f"mt_{idx}"] = mt.array
-        for attr in ["qn", "qnidx", "qntot", "to_right"] + other_attrs:
-            data_dict[attr] = getattr(self, attr)
-            # qn is ragged array which will raise a VisibleDeprecationWarning
-            # and convert it to np.object
+        attrs = {attr: getattr(self, attr) for attr in ["qnidx", "qntot", "to_right"] + other_attrs}
+        # the matrices dumped to the disk are written one by one
+        sites = (np.load(mt, mmap_mode="r") if isinstance(mt, str) else mt.array for mt in self._mp)
         try:
-            np.savez(fname, **data_dict)
+            MpFile.write(fname, sites, self.qn, attrs)
         except Exception:
             logger.exception(f"Dump MP failed.")
 
@@ -1085,6 +1199,7 @@ class MatrixProduct:
                 logger.exception(f"Remove {old_mt} failed")
         new_mt = self._array2mt(array, key)
         self._mp[key] = new_mt
+        self._bond_spectra = {}
 
     def __add__(self, other: "MatrixProduct"):
         return self.add(other)
@@ -1095,6 +1210,7 @@ class MatrixProduct:
     def append(self, array):
         new_mt = self._array2mt(array, len(self))
         self._mp.append(new_mt)
+        self._bond_spectra = {}
 
     def __str__(self):
         if self.is_mps:
@@ -1109,6 +1225,22 @@ class MatrixProduct:
 
         return template_str.format(string, sizeof_fmt(self.total_bytes), self.bond_dims,)
 
+    def __getstate__(self):
+        # the matrices dumped to the disk are bound to the lifetime of the object
+        # and should be included in the pickled state
+        state = self.__dict__.copy()
+        state["_mp"] = [self[i] if isinstance(mt, str) else mt for i, mt in enumerate(self._mp)]
+        return state
+
+    def __setstate__(self, state):
+        # objects pickled before the spectra are recorded
+        state.setdefault("_bond_spectra", {})
+        self.__dict__.update(state)
+        if self.compress_config.dump_matrix_size != np.inf:
+            # dump the large matrices again
+            for i, mt in enumerate(self._mp):
+                self._mp[i] = self._array2mt(mt, i)
+
     def __del__(self):
         dir_with_id = os.path.join(self.compress_config.dump_matrix_dir, str(id(self)))
         if os.path.exists(dir_with_id):
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import struct
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"\x93RENOMP\x00"
+# the major version. Files with a different major version can not be read
+VERSION = "1.0"
+# the magic, the offset and the length of the header
+PREAMBLE = struct.Struct("<8sQQ")
+# the alignment of the site tensors in bytes
+ALIGNMENT = 64
+
+
+def _encode(obj):
+    if isinstance(obj, np.ndarray):
+        return {"__ndarray__": _encode(obj.tolist()), "dtype": obj.dtype.str}
+    if isinstance(obj, np.generic):
+        obj = obj.item()
+    if isinstance(obj, complex):
+        return {"__complex__": [obj.real, obj.imag]}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(o) for o in obj]
+    return obj
+
+
+def _decode(obj):
+    if isinstance(obj, dict):
+        if "__ndarray__" in obj:
+            return np.array(_decode(obj["__ndarray__"]), dtype=obj["dtype"])
+        if "__complex__" in obj:
+            return complex(*obj["__complex__"])
+    if isinstance(obj, list):
+        return [_decode(o) for o in obj]
+    return obj
+
+
+def is_mp_file(fname: str) -> bool:
+    """
+    Whether the file is written by :meth:`MpFile.write`.
+    """
+    try:
+        with open(fname, "rb") as fin:
+            return fin.read(len(MAGIC)) == MAGIC
+    except IsADirectoryError:
+        return False
+
+
+class MpFile:
+    r"""
+    Matrix product state or operator stored on disk.
+
+    The site tensors are stored as contiguous arrays aligned to 64 bytes and
+    the quantum numbers of all bonds are stored in a single integer table,
+    followed by a JSON header with the shapes, offsets and other attributes.
+    Opening the file only reads the header. The whole file is memory mapped in
+    the copy-on-write mode upon the first access of a site tensor and each site tensor
+    is a view of the mapped memory, so the data is read by the operating system
+    when it is actually used and is shared by all processes loading the same file.
+
+    The file should not be modified while it is mapped. :meth:`write` writes a temporary
+    file and moves it to the destination, so rewriting an opened file is safe.
+
+    Parameters
+    ----------
+    fname : str
+        The path of the file.
+    """
+    def __init__(self, fname: str):
+        self.fname = fname
+        with open(fname, "rb") as fin:
+            magic, header_offset, header_length = PREAMBLE.unpack(fin.read(PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{fname} is not a matrix product file")
+            fin.seek(header_offset)
+            self.header: Dict = json.loads(fin.read(header_length).decode())
+        major = self.header["version"].split(".")[0]
+        if major != VERSION.split(".")[0]:
+            raise ValueError(f"Unsupported matrix product file version: {self.header['version']}")
+        self._mmap: np.memmap = None
+
+    @property
+    def version(self) -> str:
+        return self.header["version"]
+
+    @property
+    def attrs(self) -> Dict:
+        """
+        The attributes of the matrix product, such as ``qnidx`` and ``coeff``.
+        """
+        return {k: _decode(v) for k, v in self.header["attrs"].items()}
+
+    def __len__(self):
+        return len(self.header["sites"])
+
+    def _view(self, offset, shape, dtype):
+        if self._mmap is None:
+            self._mmap = np.memmap(self.fname, dtype=np.uint8, mode="c")
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+        return self._mmap[offset: offset + nbytes].view(dtype).reshape(shape)
+
+    def __getitem__(self, idx: int) -> np.ndarray:
+        """
+        The site tensor at ``idx``. Writing to the tensor does not change the file.
+        """
+        site = self.header["sites"][idx]
+        return self._view(site["offset"], site["shape"], site["dtype"])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def qn(self) -> List[np.ndarray]:
+        """
+        The quantum numbers at each bond.
+        """
+        qn = self.header["qn"]
+        table = np.array(self._view(qn["offset"], qn["shape"], qn["dtype"]))
+        return np.split(table, np.cumsum(qn["bond_dims"])[:-1])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(np.prod(site["shape"])) * np.dtype(site["dtype"]).itemsize for site in self.header["sites"])
+
+    @staticmethod
+    def write(fname: str, sites: Iterable[np.ndarray], qn: List[np.ndarray], attrs: Dict = None):
+        """
+        Write the matrix product.
+
+        Parameters
+        ----------
+        fname : str
+            The path of the file.
+        sites : iterable of np.ndarray
+            The site tensors. The tensors are written one by one so the iterable could load them lazily.
+        qn : list of np.ndarray
+            The quantum numbers at each bond.
+        attrs : dict
+            The other attributes. Numbers, strings, lists and NumPy arrays are supported.
+        """
+        if attrs is None:
+            attrs = {}
+        qn = [np.asarray(q) for q in qn]
+        qn_table = np.concatenate(qn, axis=0) if qn else np.zeros((0, 1), dtype=np.int64)
+        header = {
+            "version": VERSION,
+            "sites": [],
+            "attrs": {k: _encode(v) for k, v in attrs.items()},
+        }
+        tmp_fname = f"{fname}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_fname, "wb") as fout:
+                fout.write(b"\x00" * PREAMBLE.size)
+
+                def write_array(array):
+                    array = np.ascontiguousarray(array)
+                    offset = -fout.tell() % ALIGNMENT + fout.tell()
+                    fout.write(b"\x00" * (offset - fout.tell()))
+                    fout.write(array.tobytes())
+                    return {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+
+                for site in sites:
+                    header["sites"].append(write_array(site))
+                header["qn"] = write_array(qn_table)
+                header["qn"]["bond_dims"] = [len(q) for q in qn]
+                header_bytes = json.dumps(header).encode()
+                header_offset = fout.tell()
+                fout.write(header_bytes)
+                fout.seek(0)
+                fout.write(PREAMBLE.pack(MAGIC, header_offset, len(header_bytes)))
+            os.replace(tmp_fname, fname)
+        finally:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
@@ -4,6 +4,7 @@ from copy import deepcopy
 from typing import List, Union
 
 import numpy as np
+import opt_einsum as oe
 import scipy
 import scipy.sparse
 
@@ -15,7 +16,8 @@ from renormalizer.mps.svd_qn import add_outer
 from renormalizer.mps import svd_qn
 from renormalizer.mps.lib import update_cv
 from renormalizer.mps.symbolic_mpo import construct_symbolic_mpo, _terms_to_table, symbolic_mo_to_numeric_mo, swap_site
-from renormalizer.utils import Quantity
+from renormalizer.mps.mpo_cache import mpo_cache
+from renormalizer.utils import Quantity, CompressConfig
 from renormalizer.model.op import Op
 from renormalizer.utils.elementop import (
     construct_ph_op_dict,
@@ -271,6 +273,19 @@ class Mpo(MatrixProduct):
         if len(terms) == 0:
             raise ValueError("Terms all have factor 0.")
 
+        key = None
+        if mpo_cache.enabled:
+            key = mpo_cache.key(model, terms)
+            cached = mpo_cache.get(key)
+            if cached is not None and cached._offset_patchable(self.offset):
+                logger.debug("Reuse the cached MPO")
+                offset = self.offset
+                self._copy_from(cached)
+                self.model = model
+                self._terms = terms
+                self._patch_offset(offset)
+                return
+
         table, factor = _terms_to_table(model, terms, -self.offset)
 
         self.dtype = factor.dtype
@@ -287,6 +302,114 @@ class Mpo(MatrixProduct):
             mo_mat = symbolic_mo_to_numeric_mo(model.basis[impo], mo, self.dtype)
             self.append(mo_mat)
 
+        # the terms to rebuild the MPO if the offset can not be patched
+        self._terms = terms
+        if key is not None:
+            mpo_cache.put(key, self._cache_entry())
+
+    def with_offset(self, offset: Quantity) -> "Mpo":
+        r"""
+        The MPO with a different constant offset, i.e., :math:`\hat H - \textrm{offset}`.
+
+        The offset is changed by patching a single element of the MPO that is connected to
+        both ends of the MPO by identity operators. So the cost is independent of the number of
+        the terms. The matrices other than the patched one are shared with this MPO.
+        If such an element does not exist, the MPO is constructed from scratch.
+
+        Parameters
+        ----------
+        offset : Quantity
+            The new offset.
+
+        Returns
+        -------
+        mpo : Mpo
+            The MPO with the new offset.
+        """
+        if not isinstance(offset, Quantity):
+            raise ValueError(f"offset must be Quantity object. Got {offset} of {type(offset)}.")
+        offset = offset.as_au()
+        if self._offset_patchable(offset):
+            new = self.__class__.__new__(self.__class__)
+            new._copy_from(self)
+            new._patch_offset(offset)
+            return new
+        terms = getattr(self, "_terms", None)
+        if terms is None:
+            raise ValueError("The offset of the MPO can not be patched and the terms of the MPO are unknown.")
+        logger.debug("The offset of the MPO can not be patched. Construct the MPO from scratch.")
+        return self.__class__(self.model, terms, Quantity(offset))
+
+    def _offset_patchable(self, offset: float) -> bool:
+        return offset == getattr(self, "offset", 0) or self._offset_position() is not None
+
+    def _patch_offset(self, offset: float):
+        old_offset = getattr(self, "offset", 0)
+        if offset == old_offset:
+            return
+        isite, left, right = self._offset_position()
+        mt = self[isite].array.copy()
+        mt[left, :, :, right] -= (offset - old_offset) * np.eye(mt.shape[1])
+        self[isite] = mt
+        self.offset = offset
+
+    def _offset_position(self):
+        # The position (site, left channel, right channel) of an element which is connected to the left
+        # end of the MPO by identities and connected to the right end of the MPO by identities.
+        # Adding c * I to the element adds c * I to the whole operator. None if not found
+        pos = getattr(self, "_offset_pos", None)
+        if pos is not None:
+            return pos or None
+        self._offset_pos = ()
+        if self.qntot is None or np.any(np.array(self.qntot) != 0):
+            # the identity does not conserve the quantum number of the operator
+            return None
+        bond_dims = self.bond_dims
+        left = [np.zeros(dim, dtype=bool) for dim in bond_dims]
+        right = [np.zeros(dim, dtype=bool) for dim in bond_dims]
+        left[0][0] = right[-1][0] = True
+        for isite in range(len(self)):
+            left[isite + 1] = _identity_channels(self[isite].array, left[isite])
+        for isite in reversed(range(len(self))):
+            right[isite] = _identity_channels(self[isite].array.transpose(3, 1, 2, 0), right[isite + 1])
+        for isite in range(len(self)):
+            for l in np.nonzero(left[isite])[0]:
+                for r in np.nonzero(right[isite + 1])[0]:
+                    if np.all(self.qn[isite][l] == self.qn[isite + 1][r]):
+                        self._offset_pos = (isite, l, r)
+                        return self._offset_pos
+        return None
+
+    def _copy_from(self, other: "Mpo"):
+        # share the matrices and the model with ``other``. The containers are copied
+        # so that the in-place operations such as site swapping do not affect ``other``
+        self.__dict__.update(other.__dict__)
+        self.compress_config = other.compress_config.copy()
+        self.qn = list(other.qn)
+        for attr in ["symbolic_out_ops_list", "primary_ops"]:
+            if hasattr(other, attr):
+                setattr(self, attr, list(getattr(other, attr)))
+        self._bond_spectra = {}
+        self._mp = [None] * len(other)
+        for i, mt in enumerate(other._mp):
+            if isinstance(mt, str):
+                # the dumped matrices are bound to the lifetime of ``other``
+                self[i] = other[i]
+            else:
+                self._mp[i] = mt
+
+    def _cache_entry(self) -> "Mpo":
+        # a light-weight copy for the MPO cache without the model and the terms
+        entry = self.__class__.__new__(self.__class__)
+        entry.__dict__.update(self.__dict__)
+        entry.compress_config = CompressConfig()
+        entry.qn = list(self.qn)
+        entry._mp = [self[i] for i in range(len(self))]
+        entry._bond_spectra = {}
+        entry.model = None
+        entry._terms = None
+        return entry
+
 
     def _get_sigmaqn(self, idx):
         array_up = self.model.basis[idx].sigmaqn
@@ -384,15 +507,30 @@ class Mpo(MatrixProduct):
             new_mps.canonicalise()
         return new_mps
 
-    def contract(self, mps, algo="svd"):
+    def contract(self, mps, algo=None):
         r""" an approximation of mpo @ mps/mpdm/mpo
         
         Parameters
         ----------
         mps : `Mps`, `Mpo`, `MpDm`
         algo: str, optional
-            The algorithm to compress mpo @ mps/mpdm/mpo.  It could be ``svd``
-            (default) and ``variational``. 
+            The algorithm to compress mpo @ mps/mpdm/mpo. It could be
+
+            - ``svd``: form the product by :meth:`apply` and then compress it.
+              The bond dimension of the intermediate product is the product of the bond
+              dimensions of the MPO and the MPS.
+            - ``variational``: variational compression.
+            - ``zipup``: the zip-up algorithm (Stoudenmire and White, New J. Phys. 12, 055026 (2010)).
+              The product is formed site by site and truncated by SVD on the fly with
+              twice the bond dimension allowed by the compress config,
+              followed by a compression sweep.
+            - ``density``: the density matrix algorithm. The product is formed site by site
+              and truncated by the reduced density matrix of the product.
+              The most accurate but also the most expensive one except for ``variational``.
+
+            ``zipup`` and ``density`` never form the full product, which
+            reduces the memory to that of a single site of the product.
+            Default is ``mps.compress_config.contract_algo``.
         
         Returns
         -------
@@ -408,6 +546,8 @@ class Mpo(MatrixProduct):
 
 
         """
+        if algo is None:
+            algo = mps.compress_config.contract_algo
         if algo == "svd":
             # mapply->canonicalise->compress
             new_mps = self.apply(mps)
@@ -415,11 +555,118 @@ class Mpo(MatrixProduct):
             new_mps.compress()
         elif algo == "variational":
             new_mps = mps.variational_compress(self)
+        elif algo == "zipup":
+            new_mps = self._contract_zipup(mps)
+        elif algo == "density":
+            new_mps = self._contract_density(mps)
         else:
-            assert False
+            raise ValueError(f"Unknown contract algorithm: {algo}")
 
         return new_mps
 
+    def _contract_prepare(self, mp: MatrixProduct) -> MatrixProduct:
+        # the metadata of the product
+        new_mp = self.promote_mt_type(mp.metacopy())
+        if self.is_complex or mp.is_complex:
+            new_mp.to_complex(inplace=True)
+        new_mp.qntot = mp.qntot + self.qntot
+        if new_mp.compress_config.bonddim_should_set:
+            new_mp.compress_config.set_bonddim(len(self) + 1)
+        return new_mp
+
+    def _contract_site(self, mp: MatrixProduct, idx: int, left: np.ndarray) -> np.ndarray:
+        # contract the left block with the site of the MPO and the MPS
+        # left: (new bond, MPO bond, MPS bond). The other physical indices of MPDM or MPO
+        # are merged into one index. Returns (new bond, p, other physical, MPO bond, MPS bond)
+        mo = self[idx].array
+        ms = mp[idx].array
+        ms = ms.reshape(ms.shape[0], ms.shape[1], -1, ms.shape[-1])
+        return oe.contract("cwm, wpqx, mqrn -> cprxn", left, mo, ms)
+
+    def _product_qn(self, mp: MatrixProduct, new_mp: MatrixProduct, idx: int):
+        # L-block quantum number of the new bond and the site, R-block quantum number of the product bond
+        qn_size = len(new_mp.qntot)
+        sigmaqn = np.array(new_mp._get_sigmaqn(idx)).reshape(-1, qn_size)
+        qnr = add_outer(self._get_lsys_qn(idx + 1), mp._get_lsys_qn(idx + 1)).reshape(-1, qn_size)
+        return sigmaqn, new_mp.qntot - qnr
+
+    def _contract_finish(self, new_mp: MatrixProduct, qn: List[np.ndarray]):
+        # the product is left canonicalised with all quantum number in the L-block convention
+        new_mp.qn = qn + [np.zeros((1, len(new_mp.qntot)), dtype=int)]
+        new_mp.qnidx = len(new_mp) - 1
+        new_mp.to_right = False
+
+    def _site_shape(self, mp: MatrixProduct, idx: int):
+        return [self[idx].shape[1]] + list(mp[idx].shape[2:-1])
+
+    def _contract_zipup(self, mp: MatrixProduct) -> MatrixProduct:
+        new_mp = self._contract_prepare(mp)
+        # the truncation is optimal if the MPS on the right side is orthonormal
+        mp = mp.copy().ensure_right_canonical()
+        config = new_mp.compress_config
+        qn_size = len(new_mp.qntot)
+        left = np.ones((1, 1, 1))
+        qnl = np.zeros((1, qn_size), dtype=int)
+        qn = [qnl]
+        for idx in range(len(self)):
+            site = self._contract_site(mp, idx, left)
+            site_shape = self._site_shape(mp, idx)
+            if idx == len(self) - 1:
+                new_mp[idx] = site.reshape([site.shape[0]] + site_shape + [1])
+                break
+            sigmaqn, qnbigr = self._product_qn(mp, new_mp, idx)
+            qnbigl = add_outer(qnl, sigmaqn).reshape(-1, qn_size)
+            u, sigma, qnlset, v, _, _ = svd_qn.svd_qn(
+                site, qnbigl, qnbigr, new_mp.qntot, full_matrices=False, nthreads=config.svd_threads
+            )
+            m_trunc = min(2 * config.compute_m_trunc(sigma, idx, True), len(sigma))
+            new_mp[idx] = u[:, :m_trunc].reshape([site.shape[0]] + site_shape + [m_trunc])
+            left = (sigma[:m_trunc, None] * v[:, :m_trunc].T).reshape((m_trunc,) + site.shape[-2:])
+            qnl = np.array(qnlset[:m_trunc])
+            qn.append(qnl)
+        self._contract_finish(new_mp, qn)
+        return new_mp.compress()
+
+    def _contract_density(self, mp: MatrixProduct) -> MatrixProduct:
+        new_mp = self._contract_prepare(mp)
+        config = new_mp.compress_config
+        qn_size = len(new_mp.qntot)
+        # the right environments of the product and its conjugate.
+        # (MPO bond, MPS bond, conjugated MPO bond, conjugated MPS bond)
+        environ = [None] * len(self) + [np.ones((1, 1, 1, 1))]
+        for idx in range(len(self) - 1, 0, -1):
+            mo = self[idx].array
+            ms = mp[idx].array
+            ms = ms.reshape(ms.shape[0], ms.shape[1], -1, ms.shape[-1])
+            environ[idx] = oe.contract("wpqx, mqrn, xnXN, WpQX, MQrN -> wmWM",
+                                       mo, ms, environ[idx + 1], mo.conj(), ms.conj())
+        left = np.ones((1, 1, 1))
+        qnl = np.zeros((1, qn_size), dtype=int)
+        qn = [qnl]
+        for idx in range(len(self)):
+            site = self._contract_site(mp, idx, left)
+            site_shape = self._site_shape(mp, idx)
+            if idx == len(self) - 1:
+                new_mp[idx] = site.reshape([site.shape[0]] + site_shape + [1])
+                break
+            dm = oe.contract("cprxn, xnXN, CPRXN -> cprCPR", site, environ[idx + 1], site.conj())
+            # release the environment once used
+            environ[idx + 1] = None
+            sigmaqn, qnbigr = self._product_qn(mp, new_mp, idx)
+            qnbigl = add_outer(qnl, sigmaqn).reshape(-1, qn_size)
+            # ``sigma`` is the square root of the eigenvalues, i.e. the singular values of the product
+            u, sigma, qnlset = svd_qn.eigh_qn(dm, qnbigl, qnbigr, new_mp.qntot, "L", nthreads=config.svd_threads)
+            s_order = np.argsort(sigma)[::-1]
+            m_trunc = config.compute_m_trunc(sigma[s_order], idx, True)
+            u = u[:, s_order[:m_trunc]]
+            new_mp[idx] = u.reshape([site.shape[0]] + site_shape + [m_trunc])
+            left = u.conj().T @ site.reshape(u.shape[0], -1)
+            left = left.reshape((m_trunc,) + site.shape[-2:])
+            qnl = np.array(qnlset)[s_order[:m_trunc]]
+            qn.append(qnl)
+        self._contract_finish(new_mp, qn)
+        return new_mp
+
     def try_swap_site(self, new_model: Model, swap_jw: bool):
         # in place swapping.
         # if swap_jw is set to True, then self.primary_ops is modified in place
@@ -441,6 +688,7 @@ class Mpo(MatrixProduct):
 
         self.symbolic_out_ops_list[i+1] = out_ops2
         self.symbolic_out_ops_list[i+2] = out_ops3
+        self._offset_pos = None
         self.model = new_model
         self.qn[i+1] = qn
 
@@ -483,3 +731,16 @@ class Mpo(MatrixProduct):
             mpo.append(mt)
         mpo.build_empty_qn()
         return mpo
+
+
+def _identity_channels(mt, prev_channels):
+    # the channels of the right bond of ``mt`` that are the identity operator of the
+    # ``prev_channels`` of the left bond and are zero for the other channels
+    nonzero = np.any(mt != 0, axis=(1, 2))
+    row = nonzero.argmax(axis=0)
+    candidates = np.nonzero((nonzero.sum(axis=0) == 1) & prev_channels[row])[0]
+    eye = np.eye(mt.shape[1])
+    channels = np.zeros(mt.shape[-1], dtype=bool)
+    for col in candidates:
+        channels[col] = np.allclose(mt[row[col], :, :, col], eye)
+    return channels
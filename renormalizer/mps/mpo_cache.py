@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+import os
+import hashlib
+import logging
+import pickle
+from collections import OrderedDict
+from typing import List
+
+from renormalizer.model import Model, Op
+from renormalizer.mps.backend import backend
+
+
+logger = logging.getLogger(__name__)
+
+
+CACHE_DIR_KEY = "RENO_MPO_CACHE_DIR"
+CACHE_SIZE_KEY = "RENO_MPO_CACHE_SIZE"
+
+
+class MpoCache:
+    r"""
+    Content-addressed cache of :class:`~renormalizer.mps.Mpo` constructed from a model.
+
+    The key is the hash of the basis and the operator terms. The constant offset of the MPO is not
+    a part of the key, so an MPO cached with one offset is reused with any other offset
+    (see :meth:`~renormalizer.mps.Mpo.with_offset`). The cached MPOs are kept in memory in the
+    least-recently-used manner and optionally stored in a directory, which can be shared by
+    different jobs. The global instance ``mpo_cache`` is used by :class:`~renormalizer.mps.Mpo`.
+    Its size and directory are set by the environment variables ``RENO_MPO_CACHE_SIZE`` and
+    ``RENO_MPO_CACHE_DIR``. Both are disabled by default.
+
+    Note that if the cache is enabled, the basis and all of the terms are hashed for every MPO
+    constructed, and each MPO kept in memory holds its symbolic representation, which is
+    needed for site swapping and could be larger than the MPO itself for models with a lot of terms.
+
+    Parameters
+    ----------
+    maxsize : int
+        The maximum number of MPOs kept in memory. ``0`` disables the memory cache.
+    cache_dir : str, optional
+        The directory of the on-disk store. Default is ``None`` which means no on-disk store.
+    """
+    def __init__(self, maxsize: int = 0, cache_dir: str = None):
+        self.maxsize = maxsize
+        self.cache_dir = cache_dir
+        self._mpos = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.maxsize or self.cache_dir is not None
+
+    @staticmethod
+    def key(model: Model, terms: List[Op]) -> str:
+        # the basis determines the matrices of the operators and the order of the sites
+        h = hashlib.sha1(str(backend.real_dtype).encode())
+        for b in model.basis:
+            h.update(pickle.dumps(b, protocol=4))
+        for op in terms:
+            h.update(repr(op.to_tuple()).encode())
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"mpo_{key}.pickle")
+
+    def get(self, key: str):
+        """
+        Get the cached MPO. The returned MPO shares the matrices with the cached one,
+        so it should not be modified in place.
+        Returns ``None`` if the MPO is not cached.
+        """
+        mpo = self._mpos.get(key)
+        if mpo is not None:
+            self._mpos.move_to_end(key)
+        elif self.cache_dir is not None and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as fin:
+                    mpo = pickle.load(fin)
+            except Exception:
+                logger.exception(f"Loading cached MPO {self._path(key)} failed.")
+            else:
+                self._put_memory(key, mpo)
+        if mpo is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return mpo
+
+    def put(self, key: str, mpo):
+        self._put_memory(key, mpo)
+        if self.cache_dir is None or os.path.exists(self._path(key)):
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # write to a temporary file first so that the other jobs never see incomplete files
+            tmp_path = self._path(key) + f".{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fout:
+                pickle.dump(mpo, fout, protocol=4)
+            os.replace(tmp_path, self._path(key))
+        except Exception:
+            logger.exception(f"Storing MPO to {self.cache_dir} failed.")
+
+    def _put_memory(self, key, mpo):
+        if self.maxsize <= 0:
+            return
+        self._mpos[key] = mpo
+        self._mpos.move_to_end(key)
+        while self.maxsize < len(self._mpos):
+            self._mpos.popitem(last=False)
+
+    def clear(self):
+        """
+        Clear the MPOs in memory. The on-disk store is not affected.
+        """
+        self._mpos.clear()
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._mpos)
+
+
+mpo_cache = MpoCache(int(os.environ.get(CACHE_SIZE_KEY, 0)), os.environ.get(CACHE_DIR_KEY))
@@ -1,7 +1,7 @@
 # -*- encoding: utf-8 -*-
 
 import logging
-from collections import Counter, deque
+from collections import Counter
 from functools import wraps, reduce
 from typing import Union, List, Dict
 import itertools
@@ -10,13 +10,14 @@ import itertools
 import scipy
 from scipy import stats
 
-from renormalizer.lib import solve_ivp, expm_krylov
+from renormalizer.lib import solve_ivp, expm_krylov, KrylovWorkspace
 from renormalizer.model import Model, Op, basis as ba
 from renormalizer.mps import svd_qn
 from renormalizer.mps.svd_qn import add_outer, get_qn_mask
 from renormalizer.mps.backend import backend, np, xp
 from renormalizer.mps.lib import (
     Environ,
+    MemoryStorage,
     select_basis,
     compressed_sum,
     contract_one_site,
@@ -30,6 +31,7 @@ from renormalizer.mps.matrix import (
     asnumpy,
     asxp)
 from renormalizer.mps.mp import MatrixProduct
+from renormalizer.mps.mpfile import is_mp_file
 from renormalizer.mps.hop_expr import hop_expr
 from renormalizer.mps.mpo import Mpo
 from renormalizer.utils import (
@@ -39,6 +41,7 @@ from renormalizer.utils import (
     EvolveMethod
 )
 from renormalizer.utils.utils import calc_vn_entropy
+from renormalizer.utils.profiler import profiler
 
 logger = logging.getLogger(__name__)
 
@@ -48,10 +51,10 @@ def adaptive_tdvp(fun):
     # J. Chem. Phys. 146, 174107 (2017)
 
     @wraps(fun)
-    def adaptive_fun(self: "Mps", mpo, evolve_target_t):
+    def adaptive_fun(self: "Mps", mpo, evolve_target_t, inplace=False):
 
         if not self.evolve_config.adaptive:
-            return fun(self, mpo, evolve_target_t)
+            return fun(self, mpo, evolve_target_t, inplace)
         config: EvolveConfig = self.evolve_config.copy()
         config.check_valid_dt(evolve_target_t)
 
@@ -73,9 +76,16 @@ def adaptive_tdvp(fun):
                     f"guess_dt: {config.guess_dt}, try time step size: {dt}"
             )
             
-            mps_half1 = fun(cur_mps, mpo, dt / 2)
-            mps_half2 = fun(mps_half1, mpo, dt / 2)
-            mps = fun(cur_mps, mpo, dt)
+            if inplace:
+                # `cur_mps` is kept for the full step and the restart. The snapshots share
+                # the site tensors with `cur_mps` until the sites are updated
+                mps_half1 = fun(cur_mps.shallow_copy(), mpo, dt / 2, True)
+                mps_half2 = fun(mps_half1, mpo, dt / 2, True)
+                mps = fun(cur_mps.shallow_copy(), mpo, dt, True)
+            else:
+                mps_half1 = fun(cur_mps, mpo, dt / 2)
+                mps_half2 = fun(mps_half1, mpo, dt / 2)
+                mps = fun(cur_mps, mpo, dt)
             dis = mps.distance(mps_half2)
 
             # prevent bug. save "some" memory.
@@ -337,6 +347,8 @@ class Mps(MatrixProduct):
 
     @classmethod
     def load(cls, model: Model, fname: str):
+        if is_mp_file(fname):
+            return super().load(model, fname)
         npload = np.load(fname, allow_pickle=True)
         mp = cls()
         mp.model = model
@@ -394,6 +406,8 @@ class Mps(MatrixProduct):
 
         self.optimize_config: OptimizeConfig = OptimizeConfig()
         self.evolve_config: EvolveConfig = EvolveConfig()
+        # the environments of the last tdvp_ps/tdvp_ps2 step that produced this MPS
+        self._tdvp_environ: Environ = None
 
     def conj(self) -> "Mps":
         new_mps = super().conj()
@@ -549,8 +563,22 @@ class Mps(MatrixProduct):
         new.optimize_config = self.optimize_config
         # evolve_config has its own data
         new.evolve_config = self.evolve_config.copy()
+        new._tdvp_environ = None
+        return new
+
+    def shallow_copy(self) -> "Mps":
+        new: Mps = super().shallow_copy()
+        # the environments are checked against the sites before reused
+        new._tdvp_environ = getattr(self, "_tdvp_environ", None)
         return new
 
+    def __getstate__(self):
+        state = super().__getstate__()
+        # the environments might be bound to temporary files and threads.
+        # They are constructed again in the next tdvp_ps/tdvp_ps2 step
+        state["_tdvp_environ"] = None
+        return state
+
     def normalize(self, kind):
         r''' normalize the wavefunction
 
@@ -634,17 +662,40 @@ class Mps(MatrixProduct):
                 )
                 if m_target < cumulated_m:
                     break
-                if m_target < 0.8 * (lastone.bond_dims_mean * hint_mpo.bond_dims_mean):
-                    lastone = lastone.canonicalise().compress(
-                        m_target // hint_mpo.bond_dims_mean + 1
-                    )
-                lastone = (hint_mpo @ lastone).normalize("mps_and_coeff")
+                if lastone.compress_config.contract_algo in ["zipup", "density"]:
+                    # truncated on the fly without forming the full product
+                    lastone = hint_mpo.contract(lastone).normalize("mps_and_coeff")
+                else:
+                    if m_target < 0.8 * (lastone.bond_dims_mean * hint_mpo.bond_dims_mean):
+                        lastone = lastone.canonicalise().compress(
+                            m_target // hint_mpo.bond_dims_mean + 1
+                        )
+                    lastone = (hint_mpo @ lastone).normalize("mps_and_coeff")
         logger.debug(f"expander bond dimension: {expander.bond_dims}")
         self.compress_config.bond_dim_max_value += self.bond_dims_mean
         return (self + expander.scale(coef*self.norm, inplace=True)).canonicalise().canonicalise().normalize("mps_norm_to_coeff")
 
-    def evolve(self, mpo, evolve_dt, normalize=True) -> "Mps":
+    def evolve(self, mpo, evolve_dt, normalize=True, inplace=False) -> "Mps":
+        r""" Evolve the MPS for a time step ``evolve_dt`` by the method in ``evolve_config``.
 
+        Parameters
+        ----------
+        mpo : :class:`~renormalizer.mps.Mpo`
+            The Hamiltonian. Could be a function of time for some methods.
+        evolve_dt : float or complex
+            The time step. Imaginary for imaginary time evolution.
+        normalize : bool
+            Whether normalize the evolved MPS.
+        inplace : bool
+            Whether evolve ``self`` in place rather than a copy to save memory.
+            Supported by the TDVP methods. ``self`` should not be used afterwards
+            and the returned MPS should be used instead. See :class:`~renormalizer.mps.EvolutionSession`.
+
+        Returns
+        -------
+        new_mps : :class:`Mps`
+            The evolved MPS.
+        """
         method = {
             EvolveMethod.prop_and_compress: self._evolve_prop_and_compress,
             EvolveMethod.prop_and_compress_tdrk4: self._evolve_prop_and_compress_tdrk4,
@@ -655,7 +706,12 @@ class Mps(MatrixProduct):
             EvolveMethod.tdvp_ps: self._evolve_tdvp_ps,
             EvolveMethod.tdvp_ps2: self._evolve_tdvp_ps2
         }[self.evolve_config.method]
-        new_mps = method(mpo, evolve_dt)
+        with profiler.region("evolve", method=self.evolve_config.method.name, dt=evolve_dt):
+            if self.evolve_config.is_tdvp:
+                new_mps = method(mpo, evolve_dt, inplace)
+            else:
+                # a new MPS is constructed anyway
+                new_mps = method(mpo, evolve_dt)
         if normalize:
             if np.iscomplex(evolve_dt):
                 new_mps.normalize("mps_and_coeff")
@@ -886,7 +942,7 @@ class Mps(MatrixProduct):
                 )
             return compressed_sum(termlist)
     
-    def _evolve_tdvp_mu_vmf(self, mpo, evolve_dt) -> "Mps":
+    def _evolve_tdvp_mu_vmf(self, mpo, evolve_dt, inplace=False) -> "Mps":
         """
         variable mean field
         see the difference between VMF and CMF, refer to Z. Phys. D 42, 113–129 (1997)
@@ -919,11 +975,8 @@ class Mps(MatrixProduct):
         if not (self.evolve_config.force_ovlp and not self.to_right):
             self.ensure_left_canonical()
 
-        # `self` should not be modified during the evolution
-        if imag_time:
-            mps = self.copy()
-        else:
-            mps = self.to_complex()
+        # `self` should not be modified during the evolution unless `inplace`
+        mps = self._evolve_work_mps(imag_time, inplace)
 
         # the quantum number symmetry is used
         qn_mask_list = []
@@ -982,7 +1035,7 @@ class Mps(MatrixProduct):
             # calculate hop_y: from right to left
             hop_y = xp.empty_like(y)
 
-            for imps in mps.iter_idx_list(full=True):
+            for imps in profiler.sweep("tdvp_vmf_site", mps.iter_idx_list(full=True)):
                 shape = list(mps[imps].shape)
                 ltensor = asxp(environ.read("L", imps - 1))
 
@@ -1006,7 +1059,8 @@ class Mps(MatrixProduct):
                     qnbigl, qnbigr, _ = environ_mps._get_big_qn([imps + 1])
                     u, s, qnlset, v, s, qnrset = svd_qn.svd_qn(
                             environ_mps[imps + 1].array, qnbigl, qnbigr,
-                            environ_mps.qntot, system="R", full_matrices=False)
+                            environ_mps.qntot, system="R", full_matrices=False,
+                            nthreads=environ_mps.compress_config.svd_threads)
                     vt = v.T
 
                     environ_mps[imps + 1] = vt.reshape(environ_mps[imps + 1].shape)
@@ -1096,7 +1150,7 @@ class Mps(MatrixProduct):
         return mps.canonicalise()
 
     @adaptive_tdvp
-    def _evolve_tdvp_mu_cmf(self, mpo, evolve_dt) -> "Mps":
+    def _evolve_tdvp_mu_cmf(self, mpo, evolve_dt, inplace=False) -> "Mps":
         """
         evolution scheme: TDVP + constant mean field + matrix-unfolding
         regularization
@@ -1123,13 +1177,10 @@ class Mps(MatrixProduct):
 
         self.ensure_left_canonical()
 
-        # `self` should not be modified during the evolution
+        # `self` should not be modified during the evolution unless `inplace`
         # mps: the mps to return
         # environ_mps: mps to construct environ
-        if imag_time:
-            mps = self.copy()
-        else:
-            mps = self.to_complex()
+        mps = self._evolve_work_mps(imag_time, inplace)
 
         if self.evolve_config.tdvp_cmf_midpoint:
             # mps at t/2 (1st order) as environment
@@ -1175,7 +1226,7 @@ class Mps(MatrixProduct):
                 S_L_list = [None,] * (mps.site_num+1)
                 S_L_inv_list = [None,] * (mps.site_num+1)
 
-            for imps in mps.iter_idx_list(full=True):
+            for imps in profiler.sweep("tdvp_cmf_site", mps.iter_idx_list(full=True)):
                 shape = list(mps[imps].shape)
                 ltensor = environ.read("L", imps - 1)
                 if imps == self.site_num - 1:
@@ -1209,6 +1260,7 @@ class Mps(MatrixProduct):
                     environ_mps.qntot,
                     system="R",
                     full_matrices=False,
+                    nthreads=environ_mps.compress_config.svd_threads,
                 )
                 vt = v.T
 
@@ -1254,32 +1306,67 @@ class Mps(MatrixProduct):
 
         return mps
 
+    def _expm_krylov(self, func, dt, v):
+        # the Krylov vectors are stored in the workspace shared by the time steps
+        config = self.evolve_config
+        if config.krylov_workspace is None:
+            config.krylov_workspace = KrylovWorkspace()
+        return expm_krylov(func, dt, v, max_size=config.krylov_max_size, workspace=config.krylov_workspace)
+
+    def _evolve_work_mps(self, imag_time, inplace) -> "Mps":
+        # the MPS to be evolved. `self` is not modified unless `inplace`
+        if imag_time:
+            return self if inplace else self.copy()
+        if inplace and self.is_complex:
+            return self
+        return self.to_complex(inplace=inplace)
+
+    def _get_tdvp_environ(self, mps, mpo) -> Environ:
+        # the environments for the first sweep of tdvp_ps and tdvp_ps2 starting from ``self``.
+        # ``mps`` is the working copy of ``self``
+        domain = "R" if self.to_right else "L"
+        environ = getattr(self, "_tdvp_environ", None)
+        if not self.evolve_config.reuse_environ or environ is None:
+            # the environments of the other domain are constructed during the sweep
+            return Environ(mps, mpo, domain)
+        if isinstance(environ.storage, MemoryStorage):
+            # `self` might be evolved again, such as in the adaptive time step
+            environ = environ.copy()
+        else:
+            self._tdvp_environ = None
+        n_updated = environ.update(self, mpo, domain)
+        logger.debug(f"Reuse the environments of the last step. {n_updated} recontracted")
+        return environ
+
+    def _set_tdvp_environ(self, environ: Environ):
+        if not self.evolve_config.reuse_environ:
+            return
+        # only the environments constructed in the last sweep are consistent with ``self``
+        environ.discard("L" if self.to_right else "R")
+        self._tdvp_environ = environ
+
     @adaptive_tdvp
-    def _evolve_tdvp_ps(self, mpo, evolve_dt) -> "Mps":
+    def _evolve_tdvp_ps(self, mpo, evolve_dt, inplace=False) -> "Mps":
         # PhysRevB.94.165116
         # TDVP projector splitting
         # one-site
-        if np.iscomplex(evolve_dt):
-            mps = self.copy()
-        else:
-            mps = self.to_complex()
+        mps = self._evolve_work_mps(np.iscomplex(evolve_dt), inplace)
 
         # construct the environment matrix
-        # almost half is not used. Not a big deal.
-        environ = Environ(mps, mpo)
+        environ = self._get_tdvp_environ(mps, mpo)
 
         # statistics for debug output
         local_steps = []
         # sweep for 2 rounds
         for i in range(2):
-            for imps in mps.iter_idx_list(full=True):
+            for imps in profiler.sweep("tdvp_ps_site", mps.iter_idx_list(full=True)):
                 system = "L" if mps.to_right else "R"
                 l_array = environ.read("L", imps - 1)
                 r_array = environ.read("R", imps + 1)
 
                 shape = list(mps[imps].shape)
                 hop = hop_expr(l_array, r_array, [asxp(mpo[imps].array)], shape)
-                mps_t, j = expm_krylov(
+                mps_t, j = mps._expm_krylov(
                     lambda y: hop(y.reshape(shape)).ravel(),
                     -1j * evolve_dt / 2, mps[imps].ravel().array
                 )
@@ -1295,6 +1382,7 @@ class Mps(MatrixProduct):
                     QR=True,
                     system=system,
                     full_matrices=False,
+                    nthreads=mps.compress_config.svd_threads,
                 )
                 vt = v.T
 
@@ -1310,7 +1398,7 @@ class Mps(MatrixProduct):
                     # reverse update u site
                     shape_u = u.shape
                     hop_u = hop_expr(l_array, r_array, [], shape_u)
-                    mps_t, j = expm_krylov(
+                    mps_t, j = mps._expm_krylov(
                         lambda y: hop_u(y.reshape(shape_u)).ravel(),
                         1j * evolve_dt / 2, u.ravel()
                     )
@@ -1331,7 +1419,7 @@ class Mps(MatrixProduct):
                     # reverse update svt site
                     shape_svt = vt.shape
                     hop_svt = hop_expr(l_array, r_array, [], shape_svt)
-                    mps_t, j = expm_krylov(
+                    mps_t, j = mps._expm_krylov(
                         lambda y: hop_svt(y.reshape(shape_svt)).ravel(),
                         1j * evolve_dt / 2, vt.ravel()
                     )
@@ -1347,30 +1435,27 @@ class Mps(MatrixProduct):
         steps_stat = stats.describe(local_steps)
         logger.debug(f"TDVP-PS Krylov space: {steps_stat}")
         mps.evolve_config.stat = steps_stat
+        mps._set_tdvp_environ(environ)
 
         return mps
 
     @adaptive_tdvp
-    def _evolve_tdvp_ps2(self, mpo, evolve_dt) -> "Mps":
+    def _evolve_tdvp_ps2(self, mpo, evolve_dt, inplace=False) -> "Mps":
         # PhysRevB.94.165116
         # TDVP projector splitting
         # two-site
-        if np.iscomplex(evolve_dt):
-            mps = self.copy()
-        else:
-            mps = self.to_complex()
+        mps = self._evolve_work_mps(np.iscomplex(evolve_dt), inplace)
 
         M = self.compress_config.bond_dim_max_value
 
         # construct the environment matrix
-        # almost half is not used. Not a big deal.
-        environ = Environ(mps, mpo)
+        environ = self._get_tdvp_environ(mps, mpo)
 
         # statistics for debug output
         local_steps = []
         # sweep for 2 rounds
         for i in range(2):
-            for imps in mps.iter_idx_list(full=False):
+            for imps in profiler.sweep("tdvp_ps2_site", mps.iter_idx_list(full=False)):
                 if mps.to_right:
                     lidx, cidx0, cidx1, ridx = range(imps - 1, imps + 3)
                     # the idx of the next site
@@ -1388,7 +1473,7 @@ class Mps(MatrixProduct):
                 # the two-site matrix state
                 ms2 = tensordot(mps[cidx0], mps[cidx1], axes=1)
                 hop = hop_expr(l_array, r_array, [mpo[cidx0], mpo[cidx1]], ms2.shape)
-                mps_t, j = expm_krylov(
+                mps_t, j = mps._expm_krylov(
                     lambda y: hop(y.reshape(ms2.shape)).ravel(),
                     -1j * evolve_dt / 2,
                     ms2.ravel()
@@ -1415,7 +1500,7 @@ class Mps(MatrixProduct):
                 # reverse update the next site
                 ms1 = mps[cidx2]
                 hop = hop_expr(l_array, r_array, [mpo[cidx2]], ms1.shape)
-                mps_t, j = expm_krylov(
+                mps_t, j = mps._expm_krylov(
                     lambda y: hop(y.reshape(ms1.shape)).ravel(),
                     1j * evolve_dt / 2, ms1.ravel()
                 )
@@ -1429,6 +1514,7 @@ class Mps(MatrixProduct):
         steps_stat = stats.describe(local_steps)
         logger.debug(f"TDVP-PS Krylov space: {steps_stat}")
         mps.evolve_config.stat = steps_stat
+        mps._set_tdvp_environ(environ)
 
         return mps
 
@@ -1577,28 +1663,159 @@ class Mps(MatrixProduct):
         
         """
         
-        key = "edof_reduced_density_matrix"
-        n_e = self.model.n_edofs
-        e_dofs = self.model.e_dofs
-        if key not in self.model.mpos:
-            mpos = []
-            for idx, dof1 in enumerate(e_dofs):
-                for dof2 in e_dofs[idx:]:
-                    op = Op(r"a^\dagger a", [dof1, dof2])
-                    mpo = Mpo(self.model, terms=op)
-                    mpos.append(mpo)
-            self.model.mpos[key] = mpos
+        return self.calc_two_point(r"a^\dagger", "a", self.model.e_dofs, hermitian=True)
+
+    def calc_two_point(self, op1: str, op2: str, dofs: List=None, string: str=None,
+            hermitian: bool=False, string_dofs: List=None) -> np.ndarray:
+        r"""Calculate the two-point correlation functions of every pair of DoFs
+        in a single sweep of transfer matrices. No MPO is constructed.
+
+        If DoF :math:`i` is on the left of DoF :math:`j`
+
+        :math:`C_{ij} = \langle \Psi | \hat O^{(1)}_i \hat S \cdots \hat S \hat O^{(2)}_j | \Psi \rangle`
+
+        where :math:`\hat S` is the string operator (such as the Jordan-Wigner string :math:`\sigma_z`)
+        on every DoF in ``string_dofs`` strictly between DoF :math:`i` and DoF :math:`j`.
+        The DoFs are ordered by site and then by the DoFs of the basis of the site.
+        If DoF :math:`i` is on the right of DoF :math:`j` the operators are ordered by site,
+        i.e. :math:`\hat O^{(2)}_j` is on the left. If :math:`i = j`
+        the product operator ``f"{op1} {op2}"`` is evaluated.
+
+        Parameters
+        ----------
+        op1 : str
+            The symbol of the first operator, such as ``r"a^\dagger"``.
+        op2 : str
+            The symbol of the second operator, such as ``"a"``.
+        dofs : list, optional
+            The DoFs to calculate. Default is all of the DoFs in the model.
+        string : str, optional
+            The symbol of the string operator. Default is ``None``, which means no string.
+        hermitian : bool, optional
+            If ``op2`` is the Hermitian conjugate of ``op1`` and ``string`` is Hermitian,
+            only half of the matrix is calculated and the other half is obtained by
+            :math:`C_{ji} = C_{ij}^*`. Default is ``False``.
+        string_dofs : list, optional
+            The DoFs on which the string operator acts, such as all of the fermionic DoFs.
+            Default is all of the DoFs in the model with the same type (electronic or not) as ``dofs``.
+
+        Returns
+        -------
+        correlation : np.ndarray
+            The correlation matrix :math:`C_{ij}`, with the same order as ``dofs``.
+        """
+        model = self.model
+        if dofs is None:
+            dofs = model.dofs
+        dofs = list(dofs)
+        if len(dofs) == 0:
+            return np.zeros((0, 0), dtype=backend.complex_dtype)
+
+        # site index -> [(index in ``dofs``, dof)]
+        site_dofs = [[] for _ in range(self.site_num)]
+        for idof, dof in enumerate(dofs):
+            site_dofs[model.dof_to_siteidx[dof]].append((idof, dof))
+        last_site = max(model.dof_to_siteidx[dof] for dof in dofs)
+        if string is None:
+            site_string_dofs = [[] for _ in range(self.site_num)]
         else:
-            mpos = self.model.mpos[key]
-        expectations = deque(self.expectations(mpos))
-        reduced_density_matrix = np.zeros((n_e, n_e), dtype=backend.complex_dtype)
-        for idx in range(n_e):
-            for jdx in range(idx, n_e):
-                reduced_density_matrix[idx, jdx] = expectations.popleft()
-                reduced_density_matrix[jdx, idx] = np.conj(reduced_density_matrix[idx, jdx])
-
-        return reduced_density_matrix
-    
+            site_string_dofs = _site_string_dofs(model, dofs, string_dofs)
+
+        op_cache = {}
+        def site_op(symbols: List[str], op_dofs: List):
+            # each symbol may be a product of several elementary operators on the same DoF
+            key = (tuple(symbols), tuple(op_dofs))
+            if key not in op_cache:
+                basis = model.basis[model.dof_to_siteidx[op_dofs[0]]]
+                expanded_dofs = []
+                for symbol, dof in zip(symbols, op_dofs):
+                    expanded_dofs.extend([dof] * len(symbol.split()))
+                op_cache[key] = asxp(basis.op_mat(Op(" ".join(symbols), expanded_dofs)))
+            return op_cache[key]
+
+        def ms4(ims):
+            # MPS site as (l, d, ancilla, r). Without ancilla the dimension is 1
+            ms = asxp(self[ims])
+            return ms.reshape(ms.shape[0], ms.shape[1], -1, ms.shape[-1])
+
+        #   S-a-S-d      S-d-S-a
+        #       p            p
+        #       O     or     O
+        #       q            q
+        #   S-b-S-e      S-e-S-b
+        def l_update(ltensor, ims, mat=None):
+            ms = ms4(ims)
+            if mat is None:
+                return xp.einsum("ab, apcd, bpce -> de", ltensor, ms.conj(), ms, optimize=True)
+            return xp.einsum("ab, apcd, pq, bqce -> de", ltensor, ms.conj(), mat, ms, optimize=True)
+
+        def r_update(rtensor, ims, mat=None):
+            ms = ms4(ims)
+            if mat is None:
+                return xp.einsum("de, apcd, bpce -> ab", rtensor, ms.conj(), ms, optimize=True)
+            return xp.einsum("de, apcd, pq, bqce -> ab", rtensor, ms.conj(), mat, ms, optimize=True)
+
+        def close(ltensor, ims, mat, rtensor):
+            ms = ms4(ims)
+            return complex(xp.einsum("ab, apcd, pq, bqce, de", ltensor, ms.conj(), mat, ms, rtensor, optimize=True))
+
+        # the identity environments from the right
+        r_environ = [None] * self.site_num
+        rtensor = xp.ones((1, 1), dtype=self.dtype)
+        for ims in range(self.site_num - 1, -1, -1):
+            r_environ[ims] = rtensor
+            if ims != 0:
+                rtensor = r_update(rtensor, ims)
+
+        if hermitian:
+            families = [(op1, op2, False)]
+        else:
+            families = [(op1, op2, False), (op2, op1, True)]
+
+        correlation = np.zeros((len(dofs), len(dofs)), dtype=backend.complex_dtype)
+        computed = np.zeros(correlation.shape, dtype=bool)
+        ltensor = xp.ones((1, 1), dtype=self.dtype)
+        for isite in range(self.site_num):
+            for i, (idof, dof_i) in enumerate(site_dofs[isite]):
+                # both DoFs on the same site
+                for jdof, dof_j in site_dofs[isite][i if hermitian else 0:]:
+                    strings = _string_dofs_between(model, site_string_dofs, isite, dof_i, dof_j)
+                    mat = site_op([op1, op2] + [string] * len(strings), [dof_i, dof_j] + strings)
+                    correlation[idof, jdof] = close(ltensor, isite, mat, r_environ[isite])
+                    computed[idof, jdof] = True
+                if last_site <= isite:
+                    continue
+                # the left operator at DoF i. Sweep to the right to close with the right operator
+                strings = _string_dofs_between(model, site_string_dofs, isite, dof_i, None)
+                for left_symbol, right_symbol, swap in families:
+                    mat = site_op([left_symbol] + [string] * len(strings), [dof_i] + strings)
+                    env = l_update(ltensor, isite, mat)
+                    for jsite in range(isite + 1, last_site + 1):
+                        for jdof, dof_j in site_dofs[jsite]:
+                            strings_j = _string_dofs_between(model, site_string_dofs, jsite, None, dof_j)
+                            mat = site_op([string] * len(strings_j) + [right_symbol], strings_j + [dof_j])
+                            val = close(env, jsite, mat, r_environ[jsite])
+                            if swap:
+                                correlation[jdof, idof] = val
+                                computed[jdof, idof] = True
+                            else:
+                                correlation[idof, jdof] = val
+                                computed[idof, jdof] = True
+                        if jsite == last_site:
+                            break
+                        if site_string_dofs[jsite]:
+                            strings_j = site_string_dofs[jsite]
+                            mat = site_op([string] * len(strings_j), strings_j)
+                        else:
+                            mat = None
+                        env = l_update(env, jsite, mat)
+            ltensor = l_update(ltensor, isite)
+
+        if hermitian:
+            missing = ~computed
+            correlation[missing] = correlation.T.conj()[missing]
+        return correlation
+
     def calc_entropy(self, entropy_type):
         r""" Calculate 1site, 2site, mutual and bond Von Neumann entropy
 
@@ -1682,12 +1899,48 @@ class Mps(MatrixProduct):
         
         """
         
-        # Make sure that the bond entropy is from the left to the right and not
-        # destroy the original mps
-        mps = self.copy()
-        mps.ensure_right_canonical()
-        _, s_list = mps.compress(temp_m_trunc=np.inf, ret_s=True)
-        return np.array([calc_vn_entropy(sigma ** 2) for sigma in s_list])
+        return np.array([calc_vn_entropy(sigma ** 2) for sigma in self.bond_spectrum()])
+
+    def bond_spectrum(self) -> List[np.ndarray]:
+        r"""
+        The singular values at each bond, i.e., the entanglement spectrum of the
+        bipartition at the bond, from the left to the right.
+
+        The singular values seen by the canonical sweeps, such as :meth:`compress`,
+        are recorded and the cached values are returned if no site is changed since then.
+        Note that if the sweep truncates the MPS, the values at the bonds visited before the
+        truncation are accurate up to the truncation error.
+        Otherwise, the MPS is swept with QR decomposition from both sides to obtain the
+        bond matrices and only the bond matrices are decomposed by SVD.
+        The MPS is not modified and the results are cached.
+
+        Returns
+        -------
+        spectrum : list of 1D arrays
+            The singular values at each bond, in descending order.
+        """
+        nbond = self.site_num - 1
+        if len(self._bond_spectra) == nbond:
+            return [self._bond_spectra[i] for i in range(nbond)]
+
+        # the MPS is L_1 L_2 ... L_i R_i C_{i+1} ... and ... C_i L'_i R'_{i+1} ... R'_n
+        # where L and R' are isometries. So the singular values at bond i are those of R_i L'_i
+        r_list = []
+        r = np.ones((1, 1))
+        for i in range(nbond):
+            ms = np.tensordot(r, self[i].array, axes=1)
+            _, r = scipy.linalg.qr(ms.reshape(-1, ms.shape[-1]), mode="economic")
+            r_list.append(r)
+        l_list = [None] * nbond
+        l = np.ones((1, 1))
+        for i in range(nbond, 0, -1):
+            ms = np.tensordot(self[i].array, l, axes=1)
+            _, r = scipy.linalg.qr(ms.reshape(ms.shape[0], -1).T, mode="economic")
+            l = r.T
+            l_list[i - 1] = l
+        spectrum = [scipy.linalg.svd(r @ l, compute_uv=False) for r, l in zip(r_list, l_list)]
+        self._bond_spectra = dict(enumerate(spectrum))
+        return spectrum
 
     def dump(self, fname):
         super().dump(fname, other_attrs=["coeff"])
@@ -1713,6 +1966,29 @@ class Mps(MatrixProduct):
         return super().distance(other)
 
 
+def _site_string_dofs(model: Model, dofs: List, string_dofs: List=None) -> List[List]:
+    # the DoFs with the string operator at each site in the two-point correlation functions,
+    # in the order of the DoFs of the basis of the site
+    if string_dofs is None:
+        is_electron = {model.dof_to_basis[dof].is_electron for dof in dofs}
+        if len(is_electron) != 1:
+            raise ValueError("string_dofs should be provided if dofs contains both electronic and other DoFs")
+        is_electron = is_electron.pop()
+        string_dofs = [dof for dof in model.dofs if model.dof_to_basis[dof].is_electron == is_electron]
+    string_dofs = set(string_dofs)
+    return [[dof for dof in basis.dofs if dof in string_dofs] for basis in model.basis]
+
+
+def _string_dofs_between(model: Model, site_string_dofs: List[List], isite: int, dof1, dof2) -> List:
+    # the DoFs with the string operator at site ``isite`` strictly between ``dof1`` and ``dof2``.
+    # ``None`` stands for the boundary of the site
+    basis_dofs = list(model.basis[isite].dofs)
+    bounds = [-1 if dof1 is None else basis_dofs.index(dof1),
+              len(basis_dofs) if dof2 is None else basis_dofs.index(dof2)]
+    start, end = min(bounds), max(bounds)
+    return [dof for dof in site_string_dofs[isite] if start < basis_dofs.index(dof) < end]
+
+
 def projector(
     ms: xp.ndarray, left: bool, Ovlp_inv1: xp.ndarray = None, Ovlp0: xp.ndarray = None
 ) -> xp.ndarray:
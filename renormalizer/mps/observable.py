@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Dict, List, Union
+
+from renormalizer.model import Op
+from renormalizer.mps.backend import backend, np, xp
+from renormalizer.mps.lib import contract_one_site
+from renormalizer.mps.matrix import asnumpy, asxp
+from renormalizer.mps.mpo import Mpo
+from renormalizer.mps.mps import Mps, _site_string_dofs, _string_dofs_between
+from renormalizer.utils.utils import calc_vn_entropy
+
+logger = logging.getLogger(__name__)
+
+
+class ObservablePlan:
+    r""" A collection of observables of an MPS (or MPDM) that are evaluated together
+    in a single canonicalisation sweep.
+
+    The MPS is first brought to the right-canonical form and then swept to the right
+    by QR decomposition. When the canonical center is at site :math:`i`,
+    the sites on the left are left-canonical and the sites on the right are right-canonical,
+    so the environments of the local and two-point operators are identities and are never
+    constructed explicitly. The left environments of the MPOs are built from the
+    left-canonical sites produced by the sweep, and the bond entropy is obtained from
+    :meth:`~renormalizer.mps.Mps.bond_spectrum`. Compared with calling
+    :meth:`~renormalizer.mps.Mps.expectation`, :attr:`~renormalizer.mps.Mps.e_occupations`,
+    :meth:`~renormalizer.mps.Mps.calc_edof_rdm` and :meth:`~renormalizer.mps.Mps.calc_bond_entropy`
+    one by one, the MPS is canonicalised only once and no MPO is constructed
+    for the local operators.
+
+    The plan is constructed once and evaluated at every time step::
+
+        plan = ObservablePlan()
+        plan.add_expectation("energy", h_mpo)
+        plan.add_local("e_occupations", r"a^\dagger a", model.e_dofs)
+        plan.add_two_point("rdm", r"a^\dagger", "a", model.e_dofs, hermitian=True)
+        plan.add_bond_entropy()
+        results = plan.evaluate(mps)
+
+    Note
+    ----
+    Same as :meth:`~renormalizer.mps.Mps.expectation`, ``mps.coeff`` is not included in the results.
+    The MPS is assumed to conserve the quantum number, because the components in the other
+    quantum number sectors are discarded by the canonicalisation.
+    """
+
+    def __init__(self):
+        self.mpos: Dict[str, Union[Mpo, List[Mpo]]] = {}
+        self.local_ops: Dict[str, tuple] = {}
+        self.two_points: Dict[str, tuple] = {}
+        self.bond_entropy: str = None
+        self._op_cache = {}
+
+    def __setstate__(self, state):
+        # plans pickled before ``string_dofs`` is introduced
+        state["two_points"] = {name: tuple(args) + (None,) * (6 - len(args))
+                               for name, args in state["two_points"].items()}
+        self.__dict__.update(state)
+
+    @property
+    def names(self) -> List[str]:
+        names = list(self.mpos) + list(self.local_ops) + list(self.two_points)
+        if self.bond_entropy is not None:
+            names.append(self.bond_entropy)
+        return names
+
+    def _check_name(self, name):
+        if name in self.names:
+            raise ValueError(f"Observable {name} already exists.")
+
+    def add_expectation(self, name: str, mpo: Union[Mpo, List[Mpo]]) -> "ObservablePlan":
+        r""" Add the expectation value of an MPO, or of a list of MPOs.
+        """
+        self._check_name(name)
+        self.mpos[name] = mpo
+        return self
+
+    def add_local(self, name: str, op: str, dofs: List) -> "ObservablePlan":
+        r""" Add the expectation values of the local operator ``op``,
+        such as ``r"a^\dagger a"``, at each DoF in ``dofs``.
+        """
+        self._check_name(name)
+        self.local_ops[name] = (op, list(dofs))
+        return self
+
+    def add_two_point(self, name: str, op1: str, op2: str, dofs: List, string: str = None,
+                      hermitian: bool = False, string_dofs: List = None) -> "ObservablePlan":
+        r""" Add the two-point correlation matrix of every pair of DoFs in ``dofs``.
+        The definition and the arguments are the same with :meth:`~renormalizer.mps.Mps.calc_two_point`.
+        """
+        self._check_name(name)
+        self.two_points[name] = (op1, op2, list(dofs), string, hermitian, string_dofs)
+        return self
+
+    def add_bond_entropy(self, name: str = "bond_entropy") -> "ObservablePlan":
+        r""" Add the von Neumann entropy at each bond. See :meth:`~renormalizer.mps.Mps.calc_bond_entropy`.
+        """
+        self._check_name(name)
+        self.bond_entropy = name
+        return self
+
+    def _site_op(self, model, symbols: List[str], op_dofs: List):
+        # each symbol may be a product of several elementary operators on the same DoF
+        key = (tuple(symbols), tuple(op_dofs))
+        if key not in self._op_cache:
+            basis = model.basis[model.dof_to_siteidx[op_dofs[0]]]
+            expanded_dofs = []
+            for symbol, dof in zip(symbols, op_dofs):
+                expanded_dofs.extend([dof] * len(symbol.split()))
+            self._op_cache[key] = basis.op_mat(Op(" ".join(symbols), expanded_dofs))
+        return asxp(self._op_cache[key])
+
+    def evaluate(self, mps: Mps) -> Dict:
+        r""" Evaluate all of the observables. ``mps`` is not modified.
+
+        Returns
+        -------
+        results : dict
+            Mapping from the name of the observable to the result.
+        """
+        model = mps.model
+        if self.bond_entropy is not None:
+            # usually cached by the last compression of the MPS
+            spectrum = mps.bond_spectrum()
+        # the sweep replaces the sites of the snapshot rather than modifying them
+        mps = mps.shallow_copy()
+        mps.ensure_right_canonical()
+        assert mps.to_right and mps.qnidx == 0
+        site_num = mps.site_num
+
+        def ms4(ims):
+            # MPS site as (l, d, ancilla, r). Without ancilla the dimension is 1
+            ms = asxp(mps[ims])
+            return ms.reshape(ms.shape[0], ms.shape[1], -1, ms.shape[-1])
+
+        # the right-canonical sites are not changed by the sweep until the center moves onto them
+        ms_cache = {}
+
+        def ms4_pair(ims):
+            if ims not in ms_cache:
+                ms = ms4(ims)
+                ms_cache[ims] = ms, ms.conj()
+            return ms_cache[ims]
+
+        # with identity environments on both sides
+        #   a-S-d
+        #     p
+        #     O
+        #     q
+        #   a-S-d
+        def local(ms, mat):
+            opms = xp.tensordot(mat, ms, axes=(1, 1))
+            return complex(xp.tensordot(ms.conj(), opms, axes=([0, 1, 2, 3], [1, 0, 2, 3])))
+
+        # the transfer matrix of a right-canonical site, with the operator (if any) in the middle.
+        # ``close`` additionally contracts the right identity environment
+        def transfer(env, ms, ms_conj, mat=None, close=False):
+            envms = xp.tensordot(env, ms, axes=(1, 0))
+            if mat is None:
+                axes = [0, 1, 2]
+            else:
+                envms = xp.tensordot(mat, envms, axes=(1, 1))
+                axes = [1, 0, 2]
+            if close:
+                return complex(xp.tensordot(ms_conj, envms, axes=([0, 1, 2, 3], axes + [3])))
+            return xp.tensordot(ms_conj, envms, axes=([0, 1, 2], axes))
+
+        # the local operators at each site
+        local_results = {}
+        local_at_site = [[] for _ in range(site_num)]
+        for name, (op, dofs) in self.local_ops.items():
+            local_results[name] = np.zeros(len(dofs), dtype=backend.complex_dtype)
+            for idof, dof in enumerate(dofs):
+                local_at_site[model.dof_to_siteidx[dof]].append((name, idof, dof))
+
+        # the two-point correlations
+        two_point_results = {}
+        two_point_computed = {}
+        two_point_site_dofs = {}
+        two_point_string_dofs = {}
+        for name, (op1, op2, dofs, string, hermitian, string_dofs) in self.two_points.items():
+            two_point_results[name] = np.zeros((len(dofs), len(dofs)), dtype=backend.complex_dtype)
+            two_point_computed[name] = np.zeros((len(dofs), len(dofs)), dtype=bool)
+            site_dofs = [[] for _ in range(site_num)]
+            for idof, dof in enumerate(dofs):
+                site_dofs[model.dof_to_siteidx[dof]].append((idof, dof))
+            two_point_site_dofs[name] = site_dofs
+            if string is None:
+                two_point_string_dofs[name] = [[] for _ in range(site_num)]
+            else:
+                two_point_string_dofs[name] = _site_string_dofs(model, dofs, string_dofs)
+
+        # the left environments of the MPOs
+        mpo_lists = {name: mpo if isinstance(mpo, list) else [mpo] for name, mpo in self.mpos.items()}
+        mpo_environs = {name: [xp.ones((1, 1, 1), dtype=mps.dtype)] * len(mpo_list)
+                        for name, mpo_list in mpo_lists.items()}
+
+        for isite in range(site_num):
+            # the canonical center is at ``isite``
+            center = ms4(isite)
+            for name, idof, dof in local_at_site[isite]:
+                op = self.local_ops[name][0]
+                local_results[name][idof] = local(center, self._site_op(model, [op], [dof]))
+
+            for name, (op1, op2, dofs, string, hermitian, _) in self.two_points.items():
+                site_dofs = two_point_site_dofs[name]
+                site_string_dofs = two_point_string_dofs[name]
+                correlation = two_point_results[name]
+                computed = two_point_computed[name]
+                last_site = max((model.dof_to_siteidx[dof] for dof in dofs), default=-1)
+                if hermitian:
+                    families = [(op1, op2, False)]
+                else:
+                    families = [(op1, op2, False), (op2, op1, True)]
+                for i, (idof, dof_i) in enumerate(site_dofs[isite]):
+                    # both DoFs on the same site
+                    for jdof, dof_j in site_dofs[isite][i if hermitian else 0:]:
+                        strings = _string_dofs_between(model, site_string_dofs, isite, dof_i, dof_j)
+                        mat = self._site_op(model, [op1, op2] + [string] * len(strings), [dof_i, dof_j] + strings)
+                        correlation[idof, jdof] = local(center, mat)
+                        computed[idof, jdof] = True
+                    # the right operator on the right-canonical sites
+                    strings = _string_dofs_between(model, site_string_dofs, isite, dof_i, None)
+                    for left_symbol, right_symbol, swap in families:
+                        mat = self._site_op(model, [left_symbol] + [string] * len(strings), [dof_i] + strings)
+                        env = xp.tensordot(center.conj(), xp.tensordot(mat, center, axes=(1, 1)),
+                                           axes=([0, 1, 2], [1, 0, 2]))
+                        for jsite in range(isite + 1, last_site + 1):
+                            ms, ms_conj = ms4_pair(jsite)
+                            for jdof, dof_j in site_dofs[jsite]:
+                                strings_j = _string_dofs_between(model, site_string_dofs, jsite, None, dof_j)
+                                mat = self._site_op(model, [string] * len(strings_j) + [right_symbol],
+                                                    strings_j + [dof_j])
+                                val = transfer(env, ms, ms_conj, mat, close=True)
+                                if swap:
+                                    correlation[jdof, idof] = val
+                                    computed[jdof, idof] = True
+                                else:
+                                    correlation[idof, jdof] = val
+                                    computed[idof, jdof] = True
+                            if jsite == last_site:
+                                break
+                            if site_string_dofs[jsite]:
+                                strings_j = site_string_dofs[jsite]
+                                mat = self._site_op(model, [string] * len(strings_j), strings_j)
+                                env = transfer(env, ms, ms_conj, mat)
+                            else:
+                                env = transfer(env, ms, ms_conj)
+
+            # move the canonical center to the right. The next site is changed as well
+            ms_cache.pop(isite + 1, None)
+            if isite != site_num - 1:
+                mps._push_cano(isite)
+
+            # the site is now left-canonical (or the canonical center for the last site)
+            for name, mpo_list in mpo_lists.items():
+                environs = mpo_environs[name]
+                for i, mpo in enumerate(mpo_list):
+                    environs[i] = contract_one_site(environs[i], mps[isite], mpo[isite], "L")
+
+        results = {}
+        for name, mpo in self.mpos.items():
+            vals = np.array([complex(asnumpy(environ).ravel()[0]) for environ in mpo_environs[name]])
+            if np.allclose(vals.imag, 0):
+                vals = vals.real
+            if isinstance(mpo, list):
+                results[name] = vals
+            else:
+                results[name] = vals[0].item()
+        for name, vals in local_results.items():
+            if np.allclose(vals.imag, 0):
+                vals = vals.real
+            results[name] = vals
+        for name, correlation in two_point_results.items():
+            if self.two_points[name][4]:
+                missing = ~two_point_computed[name]
+                correlation[missing] = correlation.T.conj()[missing]
+            results[name] = correlation
+        if self.bond_entropy is not None:
+            results[self.bond_entropy] = np.array([calc_vn_entropy(sigma ** 2) for sigma in spectrum])
+        return results
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from typing import Dict, List, Union
+
+from renormalizer.mps.mpo import Mpo
+from renormalizer.mps.mps import Mps
+from renormalizer.mps.observable import ObservablePlan
+
+logger = logging.getLogger(__name__)
+
+
+class EvolutionSession:
+    r""" Time evolution of a single MPS (or MPDM) that is updated in place.
+
+    :meth:`Mps.evolve <renormalizer.mps.Mps.evolve>` copies the MPS at every time step,
+    so the old and the new MPS, and in the adaptive time step scheme several intermediate MPSs,
+    are kept at the same time. The session owns one MPS and evolves it with ``inplace=True``,
+    which is supported by the TDVP methods. For the other methods a new MPS is constructed anyway
+    and the old one is released right after the step. In the adaptive time step scheme
+    only the MPS at the beginning of the step is kept for the error estimation and the restart.
+
+    The snapshots, such as the MPS passed to the constructor and those returned by :meth:`snapshot`,
+    share the site tensors with the evolving MPS. Because the site tensors are replaced rather than
+    modified in place, the snapshots are not changed by the evolution and cost no memory until
+    the sites are updated.
+
+    The session is used as::
+
+        session = EvolutionSession(mps, h_mpo, plan)
+        session.evolve(evolve_dt, nsteps)
+        e_occupations = [res["e_occupations"] for res in session.results]
+
+    Parameters
+    ----------
+    mps : :class:`~renormalizer.mps.Mps`
+        The initial state. Not modified by the session.
+    mpo : :class:`~renormalizer.mps.Mpo`
+        The Hamiltonian.
+    plan : :class:`~renormalizer.mps.ObservablePlan`, optional
+        The observables evaluated after each time step and stored in ``results``.
+    """
+
+    def __init__(self, mps: Mps, mpo: Mpo, plan: ObservablePlan = None):
+        self.mps: Mps = mps.shallow_copy()
+        self.mpo = mpo
+        self.plan: ObservablePlan = plan
+        self.evolve_times: List[Union[float, complex]] = [0]
+        self.results: List[Dict] = []
+        if plan is not None:
+            self.results.append(plan.evaluate(self.mps))
+
+    @property
+    def latest_evolve_time(self):
+        return self.evolve_times[-1]
+
+    def step(self, evolve_dt, mpo: Mpo = None) -> Mps:
+        r""" Evolve the MPS for a single time step.
+
+        Parameters
+        ----------
+        evolve_dt : float or complex
+            The time step.
+        mpo : :class:`~renormalizer.mps.Mpo`, optional
+            The Hamiltonian of this step. Default is the one passed to the constructor.
+
+        Returns
+        -------
+        mps : :class:`~renormalizer.mps.Mps`
+            The evolved MPS, which is modified by the next step. Use :meth:`snapshot` to keep it.
+        """
+        if mpo is None:
+            mpo = self.mpo
+        self.mps = self.mps.evolve(mpo, evolve_dt, inplace=True)
+        self.evolve_times.append(self.latest_evolve_time + evolve_dt)
+        if self.plan is not None:
+            self.results.append(self.plan.evaluate(self.mps))
+        logger.debug(f"step {len(self.evolve_times) - 1} complete. time: {self.latest_evolve_time}")
+        return self.mps
+
+    def evolve(self, evolve_dt, nsteps: int) -> Mps:
+        r""" Evolve the MPS for ``nsteps`` time steps with step size ``evolve_dt``.
+        """
+        for i in range(nsteps):
+            self.step(evolve_dt)
+        return self.mps
+
+    def snapshot(self) -> Mps:
+        r""" A copy-on-write snapshot of the current MPS, which is not changed by the subsequent steps.
+        """
+        return self.mps.shallow_copy()
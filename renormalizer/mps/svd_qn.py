@@ -1,13 +1,25 @@
 # -*- coding: utf-8 -*-
 # Author: Jiajun Ren <jiajunren0522@gmail.com>
 import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import scipy.linalg
 
 from renormalizer.mps.backend import np, backend
+from renormalizer.utils.profiler import profiler
+
+try:
+    import threadpoolctl
+except ImportError:
+    threadpoolctl = None
 
 logger = logging.getLogger(__name__)
 
+# thread pools shared by all of the decompositions. Keyed by the number of threads
+_executors = {}
+
 
 def optimized_svd(a, full_matrices, opt_full_matrices):
     # optimize performance when ``full_matrices = opt_full_matrices = True``
@@ -63,29 +75,6 @@ def add_orthonormal_basis(u):
     return res
 
 
-def blockappend(
-        block_v_list,
-        block_v_list0,
-        qn_list,
-        qn_list0,
-        sv_list0,
-        v,
-        n,
-        dim,
-        indice,
-        shape,
-        full_matrices=True,
-):
-    block_v_list.append(blockrecover(indice, v[:, :dim], shape))
-    qn_list += [n] * dim
-    if full_matrices:
-        block_v_list0.append(blockrecover(indice, v[:, dim:], shape))
-        qn_list0 += [n] * (v.shape[1] - dim)
-        sv_list0.append(np.zeros(v.shape[1] - dim))
-
-    return block_v_list, block_v_list0, qn_list, qn_list0, sv_list0
-
-
 def blockrecover(indices, U, dim):
     """
     recover the block element to its original position
@@ -96,6 +85,8 @@ def blockrecover(indices, U, dim):
     return resortU
 
 
+@profiler.profile("svd_qn", lambda coef_array, qnbigl, qnbigr, qntot, QR=False, *args, **kwargs:
+                  {"shape": coef_array.shape, "QR": QR})
 def svd_qn(
         coef_array: np.ndarray,
         qnbigl: np.ndarray,
@@ -104,7 +95,8 @@ def svd_qn(
         QR: bool=False,
         system: str=None,
         full_matrices: bool=True,
-        opt_full_matrices: bool=True
+        opt_full_matrices: bool=True,
+        nthreads: int=1,
 ):
     r""" Block decompose the coefficient array (l, sigmal, sigmar, r) or (l,sigma,r) by SVD/QR according to
     the quantum number.
@@ -137,6 +129,9 @@ def svd_qn(
         The optimized version does not calculate full matrices but adds a limited amount of
         additional orthonormal basis (in contrast to all of the basis when ``full_matrices=True``)
         to the decomposition.
+    nthreads: int
+        Number of threads to decompose the quantum number blocks concurrently. Default is 1.
+        See ``renormalizer.utils.configs.CompressConfig.svd_threads``.
 
     Returns
     -------
@@ -160,73 +155,48 @@ def svd_qn(
     localqnl = qnbigl.reshape(-1, qn_size)
     localqnr = qnbigr.reshape(-1, qn_size)
 
-    block_u_list = []  # corresponds to nonzero svd value
-    block_u_list0 = []  # corresponds to zero svd value
-    block_v_list = []   # the same hereinafter
-    block_v_list0 = []
-    block_s_list = []
-    block_su_list0 = []
-    block_sv_list0 = []
-    qnl_list = []
-    qnl_list0 = []
-    qnr_list = []
-    qnr_list0 = []
-
-    # loop through each set of valid quantum numbers
-    for nl in set([tuple(t) for t in localqnl]):
-        nr = qntot - nl
-        rset = np.where(get_qn_mask(localqnr, nr))[0]
-        if len(rset) == 0:
-            continue
-        lset = np.where(get_qn_mask(localqnl, nl))[0]
-        block = coef_matrix.ravel().take(
-            (lset * coef_matrix.shape[1]).reshape(-1, 1) + rset
-        )
-        dim = min(block.shape)
-        if SVD:
-            block_u, block_s, block_vt = optimized_svd(
-                block,
-                full_matrices=full_matrices,
-                opt_full_matrices=opt_full_matrices
-            )
-            block_s_list.append(block_s)
-        else:
-            if full_matrices:
-                mode = "full"
-            else:
-                mode = "economic"
-            if system == "R":
-                block_u, block_vt = scipy.linalg.rq(block, mode=mode)
-            elif system == "L":
-                block_u, block_vt = scipy.linalg.qr(block, mode=mode)
-            else:
-                assert False
-
-        blockappend(
-            block_u_list, block_u_list0, qnl_list, qnl_list0, block_su_list0,
-            block_u, nl, dim, lset, coef_matrix.shape[0], full_matrices=full_matrices,
-        )
-        blockappend(
-            block_v_list, block_v_list0, qnr_list, qnr_list0, block_sv_list0,
-            block_vt.T, nr, dim, rset, coef_matrix.shape[1], full_matrices=full_matrices,
-        )
-
-    # sanity check
-    if not full_matrices:
-        for l in [block_u_list0, block_v_list0, block_su_list0, block_sv_list0, qnl_list0, qnr_list0]:
-            assert len(l) == 0
-    if len(block_u_list) + len(block_u_list0) == 0 or len(block_v_list) + len(block_v_list0) == 0:
+    # pair the sectors of the L-block and R-block with the quantum number to be preserved
+    lsets, rsets, qnl_keys, qnr_keys = [], [], [], []
+    for nl, lset, nr, rset in match_sectors(localqnl, localqnr, qntot):
+        lsets.append(lset)
+        rsets.append(rset)
+        qnl_keys.append(nl)
+        qnr_keys.append(nr)
+    if len(lsets) == 0:
         raise ValueError("Invalid quantum number")
-    # concatenate the blocks and return them
-    u = np.concatenate(block_u_list + block_u_list0, axis=1)
-    v = np.concatenate(block_v_list + block_v_list0, axis=1)
-    new_qnl = qnl_list + qnl_list0
-    new_qnr = qnr_list + qnr_list0
+
+    blocks = [coef_matrix[np.ix_(lset, rset)] for lset, rset in zip(lsets, rsets)]
+    if SVD:
+        decomposed = batched_svd(blocks, full_matrices, opt_full_matrices, nthreads)
+        block_u_list = [res[0] for res in decomposed]
+        block_s_list = [res[1] for res in decomposed]
+        block_v_list = [res[2].T for res in decomposed]
+    else:
+        if full_matrices:
+            mode = "full"
+        else:
+            mode = "economic"
+        if system == "R":
+            func = lambda a: scipy.linalg.rq(a, mode=mode)
+        elif system == "L":
+            func = lambda a: scipy.linalg.qr(a, mode=mode)
+        else:
+            assert False
+        decomposed = parallel_map(func, blocks, nthreads)
+        block_u_list = [res[0] for res in decomposed]
+        block_v_list = [res[1].T for res in decomposed]
+        block_s_list = None
+    dims = [min(block.shape) for block in blocks]
+
+    u, new_qnl, su = assemble_blocks(
+        block_u_list, block_s_list, dims, lsets, qnl_keys, coef_matrix.shape[0], full_matrices
+    )
+    v, new_qnr, sv = assemble_blocks(
+        block_v_list, block_s_list, dims, rsets, qnr_keys, coef_matrix.shape[1], full_matrices
+    )
     if QR:
-        return u, new_qnl, v, new_qnr
+        return u, list(new_qnl), v, list(new_qnr)
 
-    su = np.concatenate(block_s_list + block_su_list0)
-    sv = np.concatenate(block_s_list + block_sv_list0)
     if not full_matrices:
         # sort the singular values
         assert np.allclose(su, sv)
@@ -234,12 +204,13 @@ def svd_qn(
         u = u[:, s_order]
         v = v[:, s_order]
         su = sv = su[s_order]
-        new_qnl = np.array(new_qnl)[s_order].tolist()
-        new_qnr = np.array(new_qnr)[s_order].tolist()
-    return u, su, new_qnl, v, sv, new_qnr
+        new_qnl = new_qnl[s_order]
+        new_qnr = new_qnr[s_order]
+    return u, su, list(new_qnl), v, sv, list(new_qnr)
 
 
-def eigh_qn(dm, qnbigl, qnbigr, qntot, system):
+@profiler.profile("eigh_qn", lambda dm, *args, **kwargs: {"shape": dm.shape})
+def eigh_qn(dm, qnbigl, qnbigr, qntot, system, nthreads=1):
     r""" Diagonalization of the reduced density matrix for multistate algorithms.
 
     Parameters
@@ -254,6 +225,8 @@ def eigh_qn(dm, qnbigl, qnbigr, qntot, system):
         The quantum number to be preserved.
     system: str
         The side of the system. Possible values are ``"L"`` and ``"R"``.
+    nthreads: int
+        Number of threads to decompose the quantum number blocks concurrently. Default is 1.
 
     Returns
     -------
@@ -273,32 +246,186 @@ def eigh_qn(dm, qnbigl, qnbigr, qntot, system):
     del qnbigl, qnbigr
     qn_size = len(qntot)
     localqn = qnbig.reshape(-1, qn_size)
+    comp_localqn = comp_qnbig.reshape(-1, qn_size)
 
-    block_u_list = []
+    sets, keys = [], []
+    for nl, lset, _, _ in match_sectors(localqn, comp_localqn, qntot):
+        sets.append(lset)
+        keys.append(nl)
+
+    dm = dm.reshape(len(localqn), len(localqn))
+    blocks = [dm[np.ix_(lset, lset)] for lset in sets]
     block_s_list = []
-    new_qn = []
+    block_u_list = []
+    for block_s2, block_u in batched_decompose(scipy.linalg.eigh, np.linalg.eigh, blocks, nthreads):
+        # numerical error for eigenvalue < 0
+        block_s2[block_s2 < 0] = 0
+        block_s_list.append(np.sqrt(block_s2))
+        block_u_list.append(block_u)
+
+    dims = [len(lset) for lset in sets]
+    u, new_qn, s = assemble_blocks(
+        block_u_list, block_s_list, dims, sets, keys, len(localqn), full_matrices=False
+    )
+    return u, s, list(new_qn)
+
+
+def qn_sector_index(qn: np.ndarray):
+    r""" Group the indices of a leg by quantum number with a single stable sort.
+
+    Parameters
+    ----------
+    qn : np.ndarray
+        Quantum number of each index of the leg, with shape ``(dim, qn_size)``.
 
-    for nl in set([tuple(t) for t in localqn]):
+    Returns
+    -------
+    keys : np.ndarray
+        The distinct quantum numbers in ascending order, with shape ``(nsector, qn_size)``.
+    order : np.ndarray
+        The indices of the leg sorted by quantum number.
+    bounds : np.ndarray
+        The indices carrying ``keys[i]`` are ``order[bounds[i]:bounds[i+1]]``, in ascending order.
+    """
+    qn = np.asarray(qn).reshape(len(qn), -1)
+    keys, inverse = np.unique(qn, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="stable")
+    bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+    return keys, order, bounds
+
+
+def match_sectors(qnl: np.ndarray, qnr: np.ndarray, qntot):
+    r""" Iterate through the pairs of sectors of the left and right indices
+    whose quantum numbers add up to ``qntot``.
+
+    Yields
+    ------
+    nl, lset, nr, rset:
+        The quantum numbers and the indices of the left and right sectors.
+    """
+    qntot = np.asarray(qntot)
+    l_keys, l_order, l_bounds = qn_sector_index(qnl)
+    r_keys, r_order, r_bounds = qn_sector_index(qnr)
+    r_lookup = {tuple(key): i for i, key in enumerate(r_keys.tolist())}
+    for i, nl in enumerate(l_keys):
         nr = qntot - nl
-        if np.sum(get_qn_mask(comp_qnbig, nr)) == 0:
+        j = r_lookup.get(tuple(nr.tolist()))
+        if j is None:
             continue
-        lset = rset = np.where(get_qn_mask(localqn, nl))[0]
-        block = dm.ravel().take(
-            (lset * len(localqn)).reshape(-1, 1) + rset
-        )
-        block_s2, block_u = scipy.linalg.eigh(block)
-        # numerical error for eigenvalue < 0
-        block_s2[block_s2 < 0] = 0
-        block_s = np.sqrt(block_s2)
-        block_s_list.append(block_s)
-        blockappend(
-            block_u_list, [], new_qn, [], [],
-            block_u, nl, len(lset), lset, len(localqn), full_matrices=False,
-        )
+        lset = l_order[l_bounds[i]:l_bounds[i+1]]
+        rset = r_order[r_bounds[j]:r_bounds[j+1]]
+        yield nl, lset, nr, rset
+
+
+def get_executor(nthreads: int) -> ThreadPoolExecutor:
+    if nthreads not in _executors:
+        _executors[nthreads] = ThreadPoolExecutor(nthreads, thread_name_prefix="svd_qn")
+    return _executors[nthreads]
+
+
+@contextmanager
+def blas_threads_limit(nthreads: int):
+    r""" Partition the BLAS/LAPACK threads among ``nthreads`` concurrent decompositions
+    to avoid oversubscription. Requires ``threadpoolctl``; otherwise it is a no-op
+    and the BLAS threads should be set via environment variables such as ``OMP_NUM_THREADS``.
+    """
+    if threadpoolctl is None:
+        yield
+        return
+    ncores = os.cpu_count() or 1
+    with threadpoolctl.threadpool_limits(limits=max(1, ncores // nthreads), user_api="blas"):
+        yield
+
 
-    u = np.concatenate(block_u_list, axis=1)
-    s = np.concatenate(block_s_list)
-    return u, s, new_qn
+def parallel_map(func, items, nthreads: int = 1):
+    r""" ``[func(item) for item in items]``, evaluated by ``nthreads`` threads if ``nthreads > 1``.
+    The LAPACK routines release the GIL so the blocks are decomposed concurrently.
+    """
+    items = list(items)
+    if nthreads <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with blas_threads_limit(nthreads):
+        return list(get_executor(nthreads).map(func, items))
+
+
+def batched_decompose(func, batched_func, blocks, nthreads=1):
+    r""" Decompose a list of matrices. Matrices of the same shape are stacked and decomposed
+    by ``batched_func`` in one call, which loops over the matrices in compiled code.
+    ``func`` is used for the unique shapes and as a fallback if the batched version fails.
+    If ``nthreads > 1``, the stacks are further split into chunks that are decomposed concurrently.
+    """
+    shape_groups = {}
+    for i, block in enumerate(blocks):
+        shape_groups.setdefault(block.shape, []).append(i)
+    tasks = []
+    for group in shape_groups.values():
+        nchunks = min(len(group), max(nthreads, 1))
+        tasks.extend(chunk.tolist() for chunk in np.array_split(group, nchunks))
+
+    def decompose(task):
+        if 1 < len(task):
+            try:
+                stacked = batched_func(np.stack([blocks[i] for i in task]))
+            except np.linalg.LinAlgError:
+                pass
+            else:
+                return [tuple(r[j] for r in stacked) for j in range(len(task))]
+        return [func(blocks[i]) for i in task]
+
+    res = [None] * len(blocks)
+    for task, task_res in zip(tasks, parallel_map(decompose, tasks, nthreads)):
+        for i, r in zip(task, task_res):
+            res[i] = r
+    return res
+
+
+def batched_svd(blocks, full_matrices, opt_full_matrices, nthreads=1):
+    func = lambda a: optimized_svd(a, full_matrices, opt_full_matrices)
+    if full_matrices:
+        # the shape of the output depends on ``optimized_svd``
+        return parallel_map(func, blocks, nthreads)
+    batched_func = lambda a: np.linalg.svd(a, full_matrices=False)
+    return batched_decompose(func, batched_func, blocks, nthreads)
+
+
+def assemble_blocks(block_list, block_s_list, dims, sets, keys, nrows, full_matrices):
+    r""" Recover the decomposed blocks to their original positions in a pre-allocated matrix.
+    The first ``dims[i]`` columns of each block come first, followed by the remaining
+    columns (with zero singular values) of each block if ``full_matrices=True``.
+
+    Returns
+    -------
+    mat : np.ndarray
+        The assembled matrix.
+    qn : np.ndarray
+        The quantum number of each column.
+    s : np.ndarray
+        The singular value of each column. ``None`` if ``block_s_list`` is ``None``.
+    """
+    ncols = sum(dims)
+    if full_matrices:
+        ncols_extra = sum(block.shape[1] - dim for block, dim in zip(block_list, dims))
+    else:
+        ncols_extra = 0
+    dtype = np.result_type(*block_list)
+    mat = np.zeros((nrows, ncols + ncols_extra), dtype=dtype)
+    qn = np.empty((ncols + ncols_extra, len(keys[0])), dtype=np.asarray(keys[0]).dtype)
+    s = None if block_s_list is None else np.zeros(ncols + ncols_extra)
+
+    offset, offset_extra = 0, ncols
+    for i, (block, dim, idx, key) in enumerate(zip(block_list, dims, sets, keys)):
+        mat[idx, offset:offset+dim] = block[:, :dim]
+        qn[offset:offset+dim] = key
+        if s is not None:
+            s[offset:offset+dim] = block_s_list[i][:dim]
+        offset += dim
+        if full_matrices:
+            n_extra = block.shape[1] - dim
+            mat[idx, offset_extra:offset_extra+n_extra] = block[:, dim:]
+            qn[offset_extra:offset_extra+n_extra] = key
+            offset_extra += n_extra
+    return mat, qn, s
 
 
 def add_outer(a:np.ndarray, b:np.ndarray):
@@ -2,7 +2,7 @@
 import logging
 import itertools
 from collections import namedtuple
-from typing import List, Set, Tuple, Dict
+from typing import List, Tuple, Dict
 
 import numpy as np
 import scipy
@@ -10,7 +10,7 @@ import scipy.sparse
 
 from renormalizer.model import Model
 from renormalizer.model.op import Op
-from renormalizer.lib import bipartite_vertex_cover
+from renormalizer.lib import bipartite_vertex_cover, bipartite_vertex_cover_sparse
 
 logger = logging.getLogger(__name__)
 
@@ -127,58 +127,54 @@ def construct_symbolic_mpo(table, factor, algo="Hopcroft-Karp"):
         # the last two terms are not set for fast construction of the operators
         return mpo, mpoqn, qntot, qnidx, out_ops_list, primary_ops
 
-    # use np.uint32, np.uint16 to save memory
+    # use np.uint32 to save memory
     max_uint32 = np.iinfo(np.uint32).max
-    max_uint16 = np.iinfo(np.uint16).max
 
     logger.debug(f"symbolic mpo algorithm: {algo}")
     logger.debug(f"Input operator terms: {len(table)}")
 
     # translate the symbolic operator table to an easy to manipulate numpy array
-    table = np.array(table)
+    nterm, nsite = len(table), len(table[0])
+    # most of the entries are the same objects (such as the identity operator),
+    # so the objects are firstly distinguished by their ids and only the distinct objects are hashed
+    op_ids = np.fromiter(map(id, itertools.chain.from_iterable(table)), dtype=np.int64, count=nterm*nsite)
+    _, id_index, id_inverse = np.unique(op_ids, return_index=True, return_inverse=True)
+    del op_ids
+
     # unique operators with DoF names taken into consideration
     # The inclusion of DoF names is necessary for multi-dof basis.
-    unique_op: Set[Op] = set(table.ravel())
-
-    # check the index of different operators could be represented with np.uint16
-    assert len(unique_op) < max_uint16
-
-    # Construct mapping from easy-to-manipulate integer to actual Op
-    primary_ops = list(unique_op)
-
-    op2idx = dict(zip(unique_op, range(len(unique_op))))
-    new_table = np.vectorize(op2idx.get)(table).astype(np.uint16)
-
-    del unique_op
-
-    if __debug__:
-        qn_table = np.array([[x.qn for x in ta] for ta in table])
-        factor_table = np.array([[x.factor for x in ta] for ta in table])
-        for idx in range(len(primary_ops)):
-            coord = np.nonzero(new_table == idx)
-            # check that op with the same symbol has the same factor and qn
-            for j in range(qn_size):
-                assert np.unique(qn_table[:, :, j][coord]).size == 1
-            assert np.all(factor_table[coord] == factor_table[coord][0])
-
-        del factor_table, qn_table
+    # Construct mapping from easy-to-manipulate integer to actual Op.
+    # Note that operators are equal only if the factors and qns are equal
+    op2idx: Dict[Op, int] = {}
+    id2idx = np.empty(len(id_index), dtype=np.uint32)
+    # in the order of first occurrence rather than the (random) order of ids
+    for i in np.argsort(id_index):
+        flat_idx = id_index[i]
+        op = table[flat_idx // nsite][flat_idx % nsite]
+        id2idx[i] = op2idx.setdefault(op, len(op2idx))
+    primary_ops = list(op2idx.keys())
+    # check the index of different operators could be represented with np.uint32
+    assert len(primary_ops) < max_uint32
+    new_table = id2idx[id_inverse.ravel()].reshape(nterm, nsite)
+
+    del op2idx, id2idx, id_index, id_inverse
 
     # combine the same terms but with different factors(add them together)
     unique_term, unique_inverse = np.unique(new_table, axis=0, return_inverse=True)
+    unique_inverse = unique_inverse.ravel()
     # it is efficient to vectorize the operation that moves the rows and cols
     # and sum them together
-    coord = np.array([[newidx, oldidx] for oldidx, newidx in enumerate(unique_inverse)])
-    mask = scipy.sparse.csr_matrix((np.ones(len(coord)), (coord[:, 0], coord[:, 1])))
+    mask = scipy.sparse.csr_matrix((np.ones(nterm), (unique_inverse, np.arange(nterm))))
     factor = mask.dot(factor)
 
     # add the first and last column for convenience
-    ta = np.zeros((unique_term.shape[0], 1), dtype=np.uint16)
+    ta = np.zeros((unique_term.shape[0], 1), dtype=np.uint32)
     table = np.concatenate((ta, unique_term, ta), axis=1)
     logger.debug(f"After combination of the same terms: {table.shape[0]}")
     # check the index of interaction could be represented with np.uint32
     assert table.shape[0] < max_uint32
 
-    del unique_term, unique_inverse
+    del unique_term, unique_inverse, mask
 
     # 0 represents the identity symbol. Identity might not present
     # in `primary_ops` but the algorithm still works.
@@ -205,115 +201,120 @@ def construct_symbolic_mpo(table, factor, algo="Hopcroft-Karp"):
     return mpo, mpoqn, qntot, qnidx, out_ops_list, primary_ops
 
 
+def _unique_rows(table):
+    # the unique rows of the table in the order of first occurrence and the inverse indices.
+    # Each row is hashed as a whole by viewing it as a single byte string
+    table = np.ascontiguousarray(table)
+    row_bytes = table.view(np.dtype((np.void, table.dtype.itemsize * table.shape[1]))).ravel()
+    _, index, inverse = np.unique(row_bytes, return_index=True, return_inverse=True)
+    # sort by the first occurrence
+    order = np.argsort(index)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return table[index[order]], rank[inverse.ravel()]
+
+
 def _construct_symbolic_mpo(table, in_ops, factor, primary_ops, algo="Hopcroft-Karp"):
 
     nsite = table.shape[1] - 2
+    qn_size = len(in_ops[0][0].qn)
+    primary_ops_qn = np.array([op.qn for op in primary_ops]).reshape(-1, qn_size)
 
     out_ops_list = [in_ops]
 
     for isite in range(nsite):
         # split table into the row and col part
-        term_row, row_unique_inverse = np.unique(table[:, :2], axis=0, return_inverse=True)
-
-        # faster version of the following code
-        # term_col, col_unique_inverse = np.unique(table[:, 2:], axis=0, return_inverse=True)
-        term_col = {}
-        col_unique_inverse = []
-        for row in table[:, 2:]:
-            row_bytes = row.tobytes()
-            i_and_row = term_col.get(row_bytes)
-            if i_and_row is None:
-                i_and_row = (len(term_col), row)
-                term_col[row_bytes] = i_and_row
-            col_unique_inverse.append(i_and_row[0])
-        term_col = [v[1] for v in term_col.values()]
+        # the rows are sorted and the cols are in the order of first occurrence
+        ncode = int(table[:, 1].max()) + 1
+        row_code = table[:, 0].astype(np.int64) * ncode + table[:, 1]
+        _, row_index, row_unique_inverse = np.unique(row_code, return_index=True, return_inverse=True)
+        term_row = table[row_index, :2]
+        term_col, col_unique_inverse = _unique_rows(table[:, 2:])
+        del row_code, row_index
+        in_ops_qn = np.array([in_op[0].qn for in_op in in_ops]).reshape(-1, qn_size)
+        term_row_qn = in_ops_qn[term_row[:, 0]] + primary_ops_qn[term_row[:, 1]]
 
         # get the non_redudant ops
         # the +1 trick is to use the csr sparse matrix format
-        non_red = scipy.sparse.diags(np.arange(1, table.shape[0] + 1), format="csr", dtype=np.uint32)
-        coord = np.array([[newidx, oldidx] for oldidx, newidx in enumerate(row_unique_inverse)])
-        mask = scipy.sparse.csr_matrix((np.ones(len(coord), dtype=np.uint32), (coord[:, 0], coord[:, 1])))
-        non_red = mask.dot(non_red)
-        coord = np.array([[oldidx, newidx] for oldidx, newidx in enumerate(col_unique_inverse)])
-        mask = scipy.sparse.csr_matrix((np.ones(len(coord), dtype=np.uint32), (coord[:, 0], coord[:, 1])))
-        non_red = non_red.dot(mask)
         # use sparse matrix to represent non_red will be inefficient a little
         # bit compared to dense matrix, but saves a lot of memory when the
         # number of terms is huge
+        non_red = scipy.sparse.csr_matrix(
+            (np.arange(1, table.shape[0] + 1, dtype=np.uint32), (row_unique_inverse, col_unique_inverse)),
+            shape=(len(term_row), len(term_col))
+        )
+        non_red.sort_indices()
+        del row_unique_inverse, col_unique_inverse
         # logger.info(f"isite: {isite}, bipartite graph size: {non_red.shape}")
 
         # the usual case
-
-        bigraph = []
-        if non_red.shape[0] < non_red.shape[1]:
-            for i in range(non_red.shape[0]):
-                bigraph.append(non_red.indices[non_red.indptr[i]:non_red.indptr[i + 1]])
-            rowbool, colbool = bipartite_vertex_cover(bigraph, algo=algo)
+        if algo == "Hopcroft-Karp":
+            if non_red.shape[0] < non_red.shape[1]:
+                rowbool, colbool = bipartite_vertex_cover_sparse(non_red)
+            else:
+                colbool, rowbool = bipartite_vertex_cover_sparse(non_red.T.tocsr())
         else:
-            non_red_csc = non_red.tocsc()
-            for i in range(non_red.shape[1]):
-                bigraph.append(non_red_csc.indices[non_red_csc.indptr[i]:non_red_csc.indptr[i + 1]])
-            colbool, rowbool = bipartite_vertex_cover(bigraph, algo=algo)
+            bigraph = []
+            if non_red.shape[0] < non_red.shape[1]:
+                for i in range(non_red.shape[0]):
+                    bigraph.append(non_red.indices[non_red.indptr[i]:non_red.indptr[i + 1]])
+                rowbool, colbool = bipartite_vertex_cover(bigraph, algo=algo)
+            else:
+                non_red_csc = non_red.tocsc()
+                for i in range(non_red.shape[1]):
+                    bigraph.append(non_red_csc.indices[non_red_csc.indptr[i]:non_red_csc.indptr[i + 1]])
+                colbool, rowbool = bipartite_vertex_cover(bigraph, algo=algo)
+            rowbool, colbool = np.array(rowbool, dtype=bool), np.array(colbool, dtype=bool)
 
+        row_degree = np.diff(non_red.indptr)
         row_select = np.nonzero(rowbool)[0]
         # largest cover first
-        row_select = sorted(row_select, key=lambda i: non_red.indptr[i + 1] - non_red.indptr[i], reverse=True)
+        row_select = row_select[np.argsort(-row_degree[row_select], kind="stable")]
         col_select = np.nonzero(colbool)[0]
 
-
-        if len(row_select) > 0:
-            assert np.amax(row_select) < non_red.shape[0]
-        if len(col_select) > 0:
-            assert np.amax(col_select) < non_red.shape[1]
-
         # select the reserved ops
-        out_ops: List[List[OpTuple]] = []
-        new_table = []
-        new_factor = []
-
-        for row_idx in row_select:
-            # construct out_op
-            # dealing with row (left side of the table). One row corresponds to multiple cols.
-            # Produce one out operator and multiple new_table entries
-            symbol = term_row[row_idx]
-            qn = in_ops[symbol[0]][0].qn + primary_ops[symbol[1]].qn
-            out_op = OpTuple(symbol, qn, factor=1.0)
-            out_ops.append([out_op])
-
-            col_link = non_red.indices[non_red.indptr[row_idx]:non_red.indptr[row_idx + 1]]
-            stack = np.array([len(out_ops) - 1] * len(col_link), dtype=np.uint16).reshape(-1, 1)
-            new_table.append(np.hstack((stack, [term_col[i] for i in col_link])))
-            new_factor.append(factor[non_red[row_idx, col_link].toarray() - 1])
-            non_red.data[non_red.indptr[row_idx]:non_red.indptr[row_idx + 1]] = 0
-
-        non_red.eliminate_zeros()
-
-        nonzero_row_idx, nonzero_col_idx = non_red.nonzero()
-        for col_idx in col_select:
-
-            out_ops.append([])
-            # complementary operator
-            # dealing with column (right side of the table). One col correspond to multiple rows.
-            # Produce multiple out operators and one new_table entry
-            non_red_one_col = non_red[:, col_idx].toarray().flatten()
-            for i in nonzero_row_idx[np.nonzero(nonzero_col_idx == col_idx)[0]]:
-                symbol = term_row[i]
-                qn = in_ops[symbol[0]][0].qn + primary_ops[symbol[1]].qn
-                out_op = OpTuple(symbol, qn, factor=factor[non_red_one_col[i] - 1])
-                out_ops[-1].append(out_op)
-
-            new_table.append(np.array([len(out_ops) - 1] + list(term_col[col_idx]), dtype=np.uint16).reshape(1, -1))
-            new_factor.append(1.0)
-
-            # it is not necessary to remove the column nonzero elements
-            # non_red[:, col_idx] = 0
-            # non_red.eliminate_zeros()
+        # dealing with row (left side of the table). One row corresponds to multiple cols.
+        # Produce one out operator and multiple new_table entries
+        out_ops: List[List[OpTuple]] = [[OpTuple(term_row[i], term_row_qn[i], factor=1.0)] for i in row_select]
+        # the positions of the nonzero elements of the selected rows in `non_red.indices`
+        count = row_degree[row_select]
+        offset = non_red.indptr[row_select] - (np.cumsum(count) - count)
+        pos = np.arange(count.sum()) + np.repeat(offset, count)
+        stack = np.repeat(np.arange(len(row_select), dtype=np.uint32), count).reshape(-1, 1)
+        row_table = np.hstack((stack, term_col[non_red.indices[pos]]))
+        row_factor = factor[non_red.data[pos] - 1]
+        del count, offset, pos, stack
+
+        # complementary operator
+        # dealing with column (right side of the table). One col correspond to multiple rows.
+        # Produce multiple out operators and one new_table entry.
+        # The remaining nonzero elements are covered by the selected columns
+        nonzero_row_idx = np.repeat(np.arange(non_red.shape[0]), row_degree)
+        remain = ~rowbool[nonzero_row_idx]
+        nonzero_row_idx = nonzero_row_idx[remain]
+        nonzero_col_idx = non_red.indices[remain]
+        nonzero_data = non_red.data[remain]
+        assert np.all(colbool[nonzero_col_idx])
+        order = np.argsort(nonzero_col_idx, kind="stable")
+        nonzero_row_idx, nonzero_col_idx, nonzero_data = \
+            nonzero_row_idx[order], nonzero_col_idx[order], nonzero_data[order]
+        bounds = np.searchsorted(nonzero_col_idx, col_select, side="right")
+        col_factor = factor[nonzero_data - 1]
+        start = 0
+        for end in bounds:
+            out_ops.append([OpTuple(term_row[i], term_row_qn[i], factor=f)
+                            for i, f in zip(nonzero_row_idx[start:end], col_factor[start:end])])
+            assert end > start
+            start = end
+        stack = np.arange(len(row_select), len(out_ops), dtype=np.uint32).reshape(-1, 1)
+        col_table = np.hstack((stack, term_col[col_select]))
+        del nonzero_row_idx, nonzero_col_idx, nonzero_data, col_factor, non_red
 
         # reconstruct the table in new operator
-        table = np.concatenate(new_table)
-        # check the number of incoming operators could be represent as np.uint16
-        assert len(out_ops) <= np.iinfo(np.uint16).max
-        factor = np.concatenate(new_factor, axis=None)
+        table = np.concatenate([row_table, col_table]).astype(np.uint32)
+        # check the number of incoming operators could be represent as np.uint32
+        assert len(out_ops) < np.iinfo(np.uint32).max
+        factor = np.concatenate([row_factor, np.ones(len(col_select), dtype=row_factor.dtype)])
 
         assert len(table) == len(factor)
 
@@ -323,7 +324,6 @@ def _construct_symbolic_mpo(table, in_ops, factor, primary_ops, algo="Hopcroft-K
         # logger.debug(f"new_factor: {new_factor}")
 
         in_ops = out_ops
-        # in_ops_full_symbol = out_ops_full_symbol
         out_ops_list.append(out_ops)
 
     return out_ops_list
@@ -392,9 +392,27 @@ def symbolic_mo_to_numeric_mo(basis, mo, dtype):
     nrow, ncol = len(mo), len(mo[0])
     mo_mat = np.zeros((nrow, pdim, pdim, ncol), dtype=dtype)
 
-    for irow, icol in itertools.product(range(nrow), range(ncol)):
-        for term in mo[irow][icol]:
-            mo_mat[irow, :, :, icol] += basis.op_mat(term)
+    # the distinct operators of the site and the (cell, operator, factor) triplets
+    op_idx = {}
+    cells, ops, factors = [], [], []
+    for irow, row in enumerate(mo):
+        for icol, terms in enumerate(row):
+            for term in terms:
+                key = basis.op_key(term)
+                if key not in op_idx:
+                    op_idx[key] = (len(op_idx), term)
+                cells.append(irow * ncol + icol)
+                ops.append(op_idx[key][0])
+                factors.append(term.factor)
+    if not cells:
+        return mo_mat
+
+    # the matrix of each distinct operator is calculated once.
+    # The cells are then assembled by one sparse-dense product
+    op_mats = np.array([basis.cached_op_mat(term) for _, term in op_idx.values()])
+    coef = scipy.sparse.csr_matrix((factors, (cells, ops)), shape=(nrow * ncol, len(op_idx)))
+    cell_mats = coef @ op_mats.reshape(len(op_idx), -1)
+    mo_mat += cell_mats.reshape(nrow, ncol, pdim, pdim).transpose(0, 2, 3, 1)
     return mo_mat
 
 
@@ -7,7 +7,7 @@ import numpy as np
 import scipy
 import opt_einsum as oe
 
-from renormalizer.mps.matrix import tensordot, multi_tensor_contract, asnumpy, asxp
+from renormalizer.mps.matrix import tensordot, asnumpy, asxp
 from renormalizer.mps.backend import xp, USE_GPU, primme, IMPORT_PRIMME_EXCEPTION
 from renormalizer.mps import Mps
 from renormalizer.mps.lib import Environ, compressed_sum
@@ -186,66 +186,104 @@ class TDA(object):
             assert offset == xsize
             return tda_coeff
             
+        # the environments of the reference state, independent of x
+        # bra and ket are both left-canonical (right-canonical) in the left (right) environment
+        environ_l = Environ(mps_l_cano, mpo, "L")
+        environ_r = Environ(mps_r_cano, mpo, "R")
+        l_ref = [environ_l.GetLR("L", ims-1, mps_l_cano, mpo, method="Enviro") for ims in range(site_num)]
+        r_ref = [environ_r.GetLR("R", ims+1, mps_r_cano, mpo, method="Enviro") for ims in range(site_num)]
+        del environ_l, environ_r
+        ms_l = [asxp(ms) for ms in mps_l_cano]
+        ms_r = [asxp(ms) for ms in mps_r_cano]
+        ms_l_conj = [ms.conj() for ms in ms_l]
+        ms_r_conj = [ms.conj() for ms in ms_r]
+        mo = [asxp(m) for m in mpo]
+        tangent_u_xp = [asxp(u) if u is not None else None for u in tangent_u]
+
         def hop(x):
-            # H*X
+            # H*X. The tangent vectors are summed over sites through the environments
+            # with one tangent site inserted in the ket, so the cost is O(N).
+            # Multiple vectors (the columns of x) are treated at once
             nonlocal count
-            count += 1
-            
-            assert len(x) == xsize
-            tda_coeff = reshape_x(x)
-    
-            res = [np.zeros_like(coeff) if coeff is not None else None for coeff in tda_coeff]
-            
-            # fix ket and sweep bra and accumulate into res
+            squeeze = x.ndim == 1
+            if squeeze:
+                x = x.reshape(-1, 1)
+            assert x.shape[0] == xsize
+            nvec = x.shape[1]
+            count += nvec
+
+            # the tangent site tensors with the vector index as the last index
+            tangent = []
+            offset = 0
+            for ims, shape in enumerate(xshape):
+                if shape == (0,0):
+                    tangent.append(None)
+                    continue
+                size = np.prod(shape)
+                coeff = asxp(x[offset:size+offset].reshape(shape + (nvec,)))
+                tangent.append(xp.tensordot(tangent_u_xp[ims], coeff, axes=1))
+                offset += size
+            assert offset == xsize
+
+            # left environments. sites < ims: bra is left-canonical and the ket has one
+            # tangent site with left(right)-canonical sites on its left(right)
+            #   S-a-S-f
+            #       d
+            #   O-b-O-g
+            #       e
+            #   S-c-S-h
+            #       z
+            l_tangent = [None]
+            for ims in range(site_num-1):
+                new = None
+                if l_tangent[ims] is not None:
+                    new = oe.contract("abcz, adf, bdeg, ceh -> fghz",
+                            l_tangent[ims], ms_l_conj[ims], mo[ims], ms_r[ims], backend=oe_backend)
+                if tangent[ims] is not None:
+                    tmp = oe.contract("abc, adf, bdeg, cehz -> fghz",
+                            l_ref[ims], ms_l_conj[ims], mo[ims], tangent[ims], backend=oe_backend)
+                    new = tmp if new is None else new + tmp
+                l_tangent.append(new)
+
+            # right environments. sites > ims: bra is right-canonical
+            r_tangent = [None]
+            for ims in range(site_num-1, 0, -1):
+                new = None
+                if r_tangent[0] is not None:
+                    new = oe.contract("fghz, adf, bdeg, ceh -> abcz",
+                            r_tangent[0], ms_r_conj[ims], mo[ims], ms_l[ims], backend=oe_backend)
+                if tangent[ims] is not None:
+                    tmp = oe.contract("fgh, adf, bdeg, cehz -> abcz",
+                            r_ref[ims], ms_r_conj[ims], mo[ims], tangent[ims], backend=oe_backend)
+                    new = tmp if new is None else new + tmp
+                r_tangent.insert(0, new)
+
+            res = []
             for ims in range(site_num):
-                if tda_coeff[ims] is None:
-                    assert tangent_u[ims] is None
+                if tangent_u[ims] is None:
                     continue
-                
-                # mix-canonical mps
-                mps_tangent = merge(mps_l_cano, mps_r_cano, ims+1)
-                mps_tangent[ims] = tensordot(tangent_u[ims], tda_coeff[ims], (-1, 0))
-                
-                mps_tangent_conj = mps_r_cano.copy()
-                environ = Environ(mps_tangent, mpo, "R", mps_conj=mps_tangent_conj)
-                
-                for ims_conj in range(site_num):
-                    ltensor = environ.GetLR(
-                        "L", ims_conj-1, mps_tangent, mpo, itensor=None,
-                        mps_conj=mps_tangent_conj,
-                        method="System"
-                    )
-                    rtensor = environ.GetLR(
-                        "R", ims_conj+1, mps_tangent, mpo, itensor=None,
-                        mps_conj=mps_tangent_conj,
-                        method="Enviro"
-                    )
-                    if tda_coeff[ims_conj] is not None:
-                        # S-a   l-S
-                        #     d
-                        # O-b-O-f-O
-                        #     e
-                        # S-c   k-S
-    
-                        path = [
-                            ([0, 1], "abc, cek -> abek"),
-                            ([2, 0], "abek, bdef -> akdf"),
-                            ([1, 0], "akdf, lfk -> adl"),
-                        ]
-                        out = multi_tensor_contract(
-                            path, ltensor, asxp(mps_tangent[ims_conj]),
-                            asxp(mpo[ims_conj]), rtensor
-                        )
-                        res[ims_conj] += asnumpy(tensordot(tangent_u[ims_conj], out,
-                            ([0,1], [0,1])))
-                    
-                    # mps_conj combine 
-                    mps_tangent_conj[ims_conj] = mps_l_cano[ims_conj]    
-            
-            res = [mat for mat in res if mat is not None]
-    
-            return np.concatenate(res, axis=None)
-        
+                # S-a   l-S
+                #     d
+                # O-b-O-f-O
+                #     e
+                # S-c   k-S
+                # the tangent site is on the left, the same site or the right
+                out = oe.contract("abc, bdef, cekz, lfk -> adlz",
+                        l_ref[ims], mo[ims], tangent[ims], r_ref[ims], backend=oe_backend)
+                if l_tangent[ims] is not None:
+                    out += oe.contract("abcz, bdef, cek, lfk -> adlz",
+                        l_tangent[ims], mo[ims], ms_r[ims], r_ref[ims], backend=oe_backend)
+                if r_tangent[ims] is not None:
+                    out += oe.contract("abc, bdef, cek, lfkz -> adlz",
+                        l_ref[ims], mo[ims], ms_l[ims], r_tangent[ims], backend=oe_backend)
+                out = xp.tensordot(tangent_u_xp[ims].conj(), out, ([0,1], [0,1]))
+                res.append(asnumpy(out).reshape(-1, nvec))
+
+            res = np.concatenate(res, axis=0)
+            if squeeze:
+                res = res[:, 0]
+            return res
+
         if algo == "davidson":
             if restart:
                 cguess = [cguess[:,i] for i in range(cguess.shape[1])]
@@ -255,7 +293,7 @@ class TDA(object):
             
             e, c = davidson(
                 hop, cguess, precond, max_cycle=100,
-                nroots=nroots, max_memory=64000
+                nroots=nroots, max_memory=64000, batch=True
             )
             if nroots == 1:
                 c = [c]
@@ -269,14 +307,6 @@ class TDA(object):
             if not restart:
                 cguess = None
 
-            def multi_hop(x):
-                if x.ndim == 1:
-                    return hop(x)
-                elif x.ndim == 2:
-                    return np.stack([hop(x[:,i]) for i in range(x.shape[1])],axis=1)
-                else:
-                    assert False
-    
             def precond(x): 
                 if x.ndim == 1:
                     return np.einsum("i, i -> i", 1/(hdiag+1e-4), x)
@@ -285,7 +315,7 @@ class TDA(object):
                 else:
                     assert False
             A = scipy.sparse.linalg.LinearOperator((xsize,xsize),
-                    matvec=multi_hop, matmat=multi_hop)
+                    matvec=hop, matmat=hop)
             M = scipy.sparse.linalg.LinearOperator((xsize,xsize),
                     matvec=precond, matmat=precond)
             e, c = primme.eigsh(A, k=min(nroots,xsize), which="SA", 
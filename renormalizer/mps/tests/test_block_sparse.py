@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.mps import Mps, Mpo
+from renormalizer.mps.block_sparse import BlockSparseTensor
+from renormalizer.mps.hop_expr import hop_expr, hop_block_sparse, environ_block_sparse, mpo_site_block_sparse
+from renormalizer.mps.lib import Environ
+from renormalizer.mps.matrix import asnumpy
+from renormalizer.mps.svd_qn import get_qn_mask
+from renormalizer.tests import parameter
+
+
+@pytest.mark.parametrize("nexciton", (1, 2))
+def test_mps_site(nexciton):
+    mps = Mps.random(parameter.holstein_model, nexciton, 20).canonicalise()
+    for idx in range(mps.site_num):
+        bs = mps.block_sparse(idx)
+        assert np.allclose(bs.to_dense(), mps[idx].array)
+        assert bs.density <= 1
+        assert np.allclose(bs.norm(), mps[idx].norm())
+    # the multi-exciton tensors are mostly symmetry-forbidden
+    assert min(mps.block_sparse(idx).density for idx in range(1, mps.site_num-1)) < 0.5
+
+
+def test_tensordot():
+    mps = Mps.random(parameter.holstein_model, 2, 20).canonicalise()
+    mps2 = Mps.random(parameter.holstein_model, 2, 20).canonicalise()
+    for idx in range(mps.site_num - 1):
+        a = mps.block_sparse(idx)
+        b = mps.block_sparse(idx + 1)
+        res = a.tensordot(b, axes=(2, 0))
+        assert np.allclose(res.to_dense(), np.tensordot(mps[idx].array, mps[idx+1].array, axes=(2, 0)))
+
+    # transfer matrices from the left. The norm/overlap of the MPS
+    for other in [mps, mps2]:
+        env = None
+        for idx in range(mps.site_num):
+            ket = mps.block_sparse(idx)
+            bra = other.block_sparse(idx).conj()
+            if env is None:
+                env = bra.tensordot(ket, axes=([0, 1], [0, 1]))
+            else:
+                env = env.tensordot(bra, axes=(0, 0)).tensordot(ket, axes=([0, 1], [0, 1]))
+        assert env.shape == (1, 1)
+        assert np.allclose(env.to_dense()[0, 0], other.conj().dot(mps))
+
+
+def test_mpo_site():
+    mpo = Mpo(parameter.holstein_model)
+    for idx in range(mpo.site_num):
+        bs = mpo.block_sparse(idx)
+        mt = mpo[idx]
+        assert np.allclose(bs.to_dense(), mt.array.reshape(mt.shape[0], -1, mt.shape[-1]))
+
+
+@pytest.mark.parametrize("cidx", ([3], [3, 4]))
+def test_hop(cidx):
+    mps = Mps.random(parameter.holstein_model, 2, 20).canonicalise()
+    mpo = Mpo(parameter.holstein_model)
+    mps.move_qnidx(cidx[0])
+    l_environ = Environ(mps, mpo, "L")
+    r_environ = Environ(mps, mpo, "R")
+    ltensor = l_environ.read("L", cidx[0] - 1)
+    rtensor = r_environ.read("R", cidx[-1] + 1)
+    cmo = [mpo[idx].array for idx in cidx]
+    qnmat = mps._get_big_qn(cidx)[2]
+    qn_mask = get_qn_mask(qnmat, mps.qntot)
+
+    l_bs = environ_block_sparse(ltensor, mps._get_lsys_qn(cidx[0]), mpo._get_lsys_qn(cidx[0]), "L")
+    r_bs = environ_block_sparse(rtensor, mps._get_lsys_qn(cidx[-1] + 1), mpo._get_lsys_qn(cidx[-1] + 1), "R")
+    mo_bs = [
+        mpo_site_block_sparse(mpo[idx], mpo._get_lsys_qn(idx),
+                              np.array(mps._get_sigmaqn(idx)).reshape(-1, 1), mpo._get_lsys_qn(idx + 1))
+        for idx in cidx
+    ]
+    assert np.allclose(l_bs.to_dense(), ltensor)
+    assert np.allclose(r_bs.to_dense(), rtensor)
+    for bs, mo in zip(mo_bs, cmo):
+        assert np.allclose(bs.to_dense(), mo)
+    hop = hop_block_sparse(l_bs, r_bs, mo_bs, qn_mask)
+
+    nvec = 3
+    x = np.random.rand(np.sum(qn_mask), nvec)
+    cstruct = np.zeros(qn_mask.shape + (nvec,))
+    cstruct[qn_mask] = x
+    expr = hop_expr(ltensor, rtensor, cmo, qn_mask.shape, batch=nvec)
+    std = asnumpy(expr(cstruct))
+    # the dense result is also symmetry-allowed
+    assert np.allclose(std[~qn_mask], 0)
+    assert np.allclose(hop(x), std[qn_mask])
+    assert np.allclose(hop(x[:, 0]), std[qn_mask][:, 0])
+
+
+def test_forbidden_leg():
+    qn = np.array([[0], [1]])
+    a = BlockSparseTensor.zeros([qn, qn], [1, -1], [0])
+    with pytest.raises(ValueError):
+        a.tensordot(a, axes=(1, 1))
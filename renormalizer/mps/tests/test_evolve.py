@@ -121,12 +121,35 @@ def test_tdvp_cmf(init_state,tdvp_cmf_c_trapz):
         [init_mps, mpo],
         [init_mpdm, mpo],
 ))
-def test_tdvp_ps(init_state, mpo):
+@pytest.mark.parametrize("krylov_max_size", (100, 4))
+def test_tdvp_ps(init_state, mpo, krylov_max_size):
     mps = init_state.copy()
     mps.evolve_config  = EvolveConfig(EvolveMethod.tdvp_ps)
+    # small subspace to test restarting the Lanczos iteration
+    mps.evolve_config.krylov_max_size = krylov_max_size
     check_result(mps, mpo, 0.4, 5)
 
 
+@pytest.mark.parametrize("init_state", (init_mps, init_mpdm))
+@pytest.mark.parametrize("method", (EvolveMethod.tdvp_ps, EvolveMethod.tdvp_ps2))
+@pytest.mark.parametrize("adaptive", (True, False))
+def test_tdvp_reuse_environ(init_state, method, adaptive):
+    results = []
+    for reuse_environ in [True, False]:
+        mps = init_state.copy()
+        mps.evolve_config = EvolveConfig(method, adaptive=adaptive, guess_dt=0.2)
+        mps.evolve_config.reuse_environ = reuse_environ
+        mps.compress_config = CompressConfig(max_bonddim=5)
+        for i in range(4):
+            mps = mps.evolve(mpo, 0.4)
+        results.append(mps)
+    environ = results[0]._tdvp_environ
+    # at most the environment next to the coefficient site is stale
+    assert environ.update(results[0], mpo, "R" if results[0].to_right else "L") <= 1
+    assert results[1]._tdvp_environ is None
+    assert results[0].distance(results[1]) < 1e-10
+
+
 @pytest.mark.parametrize("init_state, mpo", (
         [init_mps, mpo],
         [init_mpdm, mpo],
@@ -8,7 +8,7 @@ import pytest
 
 from renormalizer.model import Model, h_qc
 from renormalizer.mps.backend import primme
-from renormalizer.mps.gs import construct_mps_mpo, optimize_mps
+from renormalizer.mps.gs import construct_mps_mpo, optimize_mps, DMRG
 from renormalizer.mps import Mpo, Mps
 from renormalizer.tests.parameter import holstein_model
 from renormalizer.utils.configs import OFS
@@ -60,6 +60,27 @@ def test_multistate(method, algo):
     assert np.allclose(expectation, energy_std)
 
 
+@pytest.mark.parametrize("method", (
+        "1site",
+        "2site",
+))
+@pytest.mark.parametrize("nroots", (
+        1,
+        4,
+))
+def test_block_sparse(method, nroots):
+    mps, mpo = construct_mps_mpo(holstein_model, procedure[0][0], nexciton)
+    mps.optimize_config.procedure = procedure
+    mps.optimize_config.nroots = nroots
+    mps.optimize_config.method = method
+    mps.optimize_config.e_atol = 1e-6
+    mps.optimize_config.e_rtol = 1e-6
+    mps.optimize_config.block_sparse = True
+    energy, mps = optimize_mps(mps, mpo)
+    energy_std = np.array([0.08401412, 0.08449771, 0.08449801, 0.08449945]) + holstein_model.gs_zpe
+    assert np.allclose(energy[-1], energy_std[:nroots])
+
+
 @pytest.mark.parametrize("method", (
         "1site",
         "2site",
@@ -136,3 +157,41 @@ def test_qc(with_ofs):
     print(mpo)
     gs_e = min(energies)
     assert np.allclose(gs_e, fci_e, atol=5e-3)
+
+
+@pytest.mark.parametrize("method", (
+        "1site",
+        "2site",
+))
+@pytest.mark.parametrize("nroots", (
+        1,
+        2,
+))
+def test_dmrg_restart(method, nroots):
+    mps, mpo = construct_mps_mpo(holstein_model, procedure[0][0], nexciton)
+    mps.optimize_config.procedure = procedure
+    mps.optimize_config.method = method
+    mps.optimize_config.nroots = nroots
+    dmrg = DMRG(mps, mpo)
+    energies, _ = dmrg.kernel()
+    assert np.min(energies[-1]) == pytest.approx(GS_E, rel=1e-5)
+
+    # scaling the MPO only changes one site
+    changed_sites = dmrg.update_mpo(mpo.scale(2))
+    assert len(changed_sites) == 1
+    # the warm-started sweeps converge immediately
+    energies, mps_opt = dmrg.kernel([[40, 0], [40, 0]])
+    assert np.allclose(energies[0], energies[-1], rtol=1e-5)
+    assert np.min(energies[-1]) == pytest.approx(2 * GS_E, rel=1e-5)
+    if nroots == 1:
+        assert mps_opt.expectation(mpo) == pytest.approx(GS_E, rel=1e-5)
+
+
+def test_svd_threads():
+    mps, mpo = construct_mps_mpo(holstein_model, procedure[0][0], 2)
+    mps.optimize_config.procedure = procedure
+    mps.compress_config.svd_threads = 4
+    energies, mps_opt = optimize_mps(mps.copy(), mpo)
+    mps.compress_config.svd_threads = 1
+    std_energies, _ = optimize_mps(mps.copy(), mpo)
+    assert energies[-1] == pytest.approx(std_energies[-1], rel=1e-5)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+import pytest
+
+from renormalizer.mps.gs import construct_mps_mpo, optimize_mps
+from renormalizer.mps.lib import Environ, LRUDiskStorage, DiskStorage, MemoryStorage
+from renormalizer.tests.parameter import holstein_model
+
+
+def test_lru_storage(tmp_path):
+    storage = LRUDiskStorage(str(tmp_path), cache_size=2)
+    arrays = {("L", i): np.random.rand(3, 4, 3) for i in range(5)}
+    for key, array in arrays.items():
+        storage[key] = array
+    # only the most recent tensors are kept in memory
+    assert len(storage._cache) == 2
+    storage.prefetch(("L", 0))
+    for key, array in arrays.items():
+        assert np.allclose(storage[key], array)
+    # overwrite a tensor that is being prefetched
+    storage.prefetch(("L", 1))
+    storage[("L", 1)] = arrays[("L", 1)] * 2
+    assert np.allclose(storage[("L", 1)], arrays[("L", 1)] * 2)
+    dump_dir = storage.dump_dir
+    storage.close()
+    assert not os.path.exists(dump_dir)
+
+
+@pytest.mark.parametrize("environ_storage", ("disk", "lru"))
+def test_environ_storage(environ_storage, tmp_path):
+    mps, mpo = construct_mps_mpo(holstein_model, 10, 1)
+    mps.optimize_config.procedure = [[10, 0.4], [20, 0.2], [20, 0]]
+    std_energies, _ = optimize_mps(mps.copy(), mpo)
+
+    mps.compress_config.environ_storage = environ_storage
+    mps.compress_config.environ_cache_size = 2
+    mps.compress_config.dump_matrix_dir = str(tmp_path)
+    environ = Environ(mps, mpo)
+    assert isinstance(environ._virtual_disk, DiskStorage)
+    for idx in range(len(mps) - 1):
+        assert np.allclose(environ.read("L", idx), environ.GetLR("L", idx, mps, mpo))
+    energies, _ = optimize_mps(mps.copy(), mpo)
+    assert np.allclose(energies, std_energies)
+
+
+@pytest.mark.parametrize("environ_storage", ("memory", "disk", "lru"))
+def test_environ_update(environ_storage, tmp_path):
+    mps, mpo = construct_mps_mpo(holstein_model, 10, 1)
+    mps.compress_config.environ_storage = environ_storage
+    mps.compress_config.environ_cache_size = 2
+    mps.compress_config.dump_matrix_dir = str(tmp_path)
+    environ = Environ(mps, mpo, "L")
+    assert environ.update(mps, mpo, "L") == 0
+    # the tensors at and after the changed site are stale
+    mps[3] = mps[3].array * 2
+    assert environ.update(mps, mpo, "L") == len(mps) - 1 - 3
+    assert environ.update(mps, mpo, "L") == 0
+    for idx in range(len(mps) - 1):
+        assert np.allclose(environ.read("L", idx), environ.GetLR("L", idx, mps, mpo))
+    assert environ.update(mps, mpo, "R") == len(mps) - 1
+    if isinstance(environ.storage, MemoryStorage):
+        # the copy is independent
+        new_environ = environ.copy()
+        mps[0] = mps[0].array * 2
+        assert new_environ.update(mps, mpo, "L") == len(mps) - 1
+        assert environ.update(mps, mpo, "L") == len(mps) - 1
+    environ.discard("R")
+    assert ("R", 1) not in environ.storage
@@ -5,7 +5,7 @@ import os
 import numpy as np
 import pytest
 
-from renormalizer.mps import Mps, Mpo, MpDm
+from renormalizer.mps import Mps, Mpo, MpDm, MpFile
 from renormalizer.mps.matrix import tensordot, asnumpy
 from renormalizer.mps.lib import Environ
 from renormalizer.tests.parameter import custom_model, holstein_model
@@ -27,6 +27,49 @@ def test_save_load():
     os.remove(fname)
 
 
+def test_mp_file(tmpdir):
+    model = holstein_model
+    mpdm = MpDm.max_entangled_ex(model).expand_bond_dimension(Mpo(model), include_ex=False)
+    mpdm.scale(1j, inplace=True)
+    fname = os.path.join(str(tmpdir), "mpdm.npz")
+    mpdm.dump(fname)
+
+    # lazy access without loading the MPDM
+    mp_file = MpFile(fname)
+    assert len(mp_file) == len(mpdm)
+    assert mp_file.attrs["qnidx"] == mpdm.qnidx
+    for mt1, mt2, qn1, qn2 in zip(mp_file, mpdm, mp_file.qn, mpdm.qn):
+        assert np.array_equal(mt1, mt2.array)
+        assert np.array_equal(qn1, qn2)
+
+    mpdm2 = MpDm.load(model, fname)
+    assert mpdm2.is_complex and mpdm2.coeff == mpdm.coeff
+    assert np.array_equal(mpdm2.qntot, mpdm.qntot)
+    for mt1, mt2 in zip(mpdm2, mpdm):
+        # memory mapped
+        assert not mt1.array.flags.owndata
+        assert np.array_equal(mt1.array, mt2.array)
+    # copy on write
+    mpdm2[0].array[:] = 0
+    assert np.array_equal(MpFile(fname)[0], mpdm[0].array)
+    # rewrite the file in use
+    mpdm.scale(2, inplace=True)
+    mpdm.dump(fname)
+    assert np.array_equal(mpdm2[1].array, mp_file[1])
+    assert np.array_equal(MpDm.load(model, fname)[1].array, mpdm[1].array)
+
+    # the old format
+    mpo = Mpo(model)
+    data_dict = {"version": "0.3", "nsites": len(mpo), "qnidx": mpo.qnidx, "qntot": mpo.qntot, "to_right": False}
+    for i, mt in enumerate(mpo):
+        data_dict[f"mt_{i}"] = mt.array
+    data_dict["qn"] = np.empty(len(mpo.qn), dtype=object)
+    data_dict["qn"][:] = mpo.qn
+    fname = os.path.join(str(tmpdir), "mpo.npz")
+    np.savez(fname, **data_dict)
+    assert Mpo.load(model, fname) == mpo
+
+
 def check_distance(a: Mps, b: Mps):
     d1 = (a - b).mp_norm
     d2 = a.distance(b)
@@ -83,7 +126,9 @@ def test_environ_multi_mpo(mpdm):
         "mpdm",
         "mpo",
 ))
-def test_svd_compress(comp, mp):
+@pytest.mark.parametrize("algo", ("svd", "zipup", "density"))
+@pytest.mark.parametrize("criteria", (CompressCriteria.fixed, CompressCriteria.threshold))
+def test_svd_compress(comp, mp, algo, criteria):
     
     if mp == "mpo":
         mps = Mpo(holstein_model)
@@ -105,13 +150,23 @@ def test_svd_compress(comp, mp):
     
     std_mps = mpo.apply(mps, canonicalise=True).canonicalise()
     print(f"std_mps: {std_mps}")
-    mps.compress_config.bond_dim_max_value = M
-    mps.compress_config.criteria = CompressCriteria.fixed
-    svd_mps = mpo.contract(mps)
+    mps.compress_config.criteria = criteria
+    if criteria is CompressCriteria.fixed:
+        mps.compress_config.bond_dim_max_value = M
+        atol = 1e-3
+    else:
+        mps.compress_config.threshold = 1e-3
+        atol = 1e-2
+    svd_mps = mpo.contract(mps, algo)
     dis = svd_mps.distance(std_mps)/std_mps.mp_norm
     print(f"svd_mps: {svd_mps}, dis: {dis}")
-    assert np.allclose(dis, 0.0, atol=1e-3)
-    assert np.allclose(svd_mps.mp_norm, std_mps.mp_norm, atol=1e-4)
+    assert np.allclose(dis, 0.0, atol=atol)
+    assert np.allclose(svd_mps.mp_norm, std_mps.mp_norm, rtol=atol)
+    if criteria is CompressCriteria.threshold and algo == "density":
+        # the threshold is applied to the singular values rather than the eigenvalues of the density matrix
+        # and the bond dimensions are comparable with the svd algorithm
+        ref_dims = mpo.contract(mps, "svd").bond_dims
+        assert sum(svd_mps.bond_dims) <= 1.2 * sum(ref_dims)
     
     
 @pytest.mark.parametrize("comp", (True, False))
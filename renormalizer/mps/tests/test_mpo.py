@@ -10,7 +10,7 @@ import pytest
 
 from renormalizer.model import Mol, Phonon, HolsteinModel, Model, Op
 from renormalizer.model.basis import BasisHalfSpin
-from renormalizer.mps import Mpo, Mps
+from renormalizer.mps import Mpo, Mps, MpoCache
 from renormalizer.mps.tests import cur_dir
 from renormalizer.tests.parameter import holstein_model
 from renormalizer.utils import Quantity
@@ -95,6 +95,48 @@ def test_offset(scheme):
     assert np.allclose(evals1 - offset.as_au(), evals2)
 
 
+def test_with_offset():
+    h_mpo = Mpo(holstein_model)
+    offset = Quantity(0.123)
+    mpo1 = h_mpo.with_offset(offset)
+    assert mpo1.offset == offset.as_au()
+    # the original MPO is not changed
+    assert h_mpo.offset == 0
+    mpo2 = mpo1.with_offset(Quantity(-0.5))
+    mps = Mps.random(holstein_model, qntot=1, m_max=10)
+    e = mps.expectation(h_mpo)
+    assert mps.expectation(mpo1) == pytest.approx(e - 0.123)
+    assert mps.expectation(mpo2) == pytest.approx(e + 0.5)
+    assert mps.expectation(mpo2.with_offset(Quantity(0))) == pytest.approx(e)
+    assert h_mpo.bond_dims == mpo1.bond_dims
+
+
+def test_mpo_cache(tmpdir, monkeypatch):
+    cache = MpoCache(maxsize=1, cache_dir=str(tmpdir))
+    monkeypatch.setattr("renormalizer.mps.mpo.mpo_cache", cache)
+    mpo1 = Mpo(holstein_model)
+    assert cache.misses == 1 and len(os.listdir(str(tmpdir))) == 1
+    # the memory cache
+    mpo2 = Mpo(holstein_model, offset=Quantity(0.1))
+    assert cache.hits == 1
+    # the disk cache
+    cache.clear()
+    mpo3 = Mpo(holstein_model, offset=Quantity(0.1))
+    assert cache.hits == 1
+    monkeypatch.setattr("renormalizer.mps.mpo.mpo_cache", MpoCache(maxsize=0))
+    mpo4 = Mpo(holstein_model, offset=Quantity(0.1))
+    mps = Mps.random(holstein_model, qntot=1, m_max=10)
+    e = mps.expectation(mpo4)
+    assert mps.expectation(mpo1) - 0.1 == pytest.approx(e)
+    assert mps.expectation(mpo2) == pytest.approx(e)
+    assert mps.expectation(mpo3) == pytest.approx(e)
+    # different terms
+    cache.clear()
+    monkeypatch.setattr("renormalizer.mps.mpo.mpo_cache", cache)
+    Mpo(holstein_model, holstein_model.ham_terms[:-1])
+    assert cache.misses == 1 and cache.hits == 0
+
+
 def test_identity():
     identity = Mpo.identity(holstein_model)
     mps = Mps.random(holstein_model, qntot=1, m_max=5)
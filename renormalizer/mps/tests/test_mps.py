@@ -4,7 +4,8 @@ import numpy as np
 import pytest
 
 from renormalizer.model import Model
-from renormalizer.model.basis import BasisSHO, BasisMultiElectronVac, BasisMultiElectron, BasisSimpleElectron
+from renormalizer.model.basis import BasisSHO, BasisMultiElectronVac, BasisMultiElectron, BasisSimpleElectron, \
+    BasisHalfSpin
 from renormalizer.model.op import Op
 from renormalizer.mps import Mps, Mpo
 from renormalizer.tests import parameter
@@ -71,6 +72,43 @@ def test_reduced_density_matrix():
     check_reduced_density_matrix(basis)
 
 
+@pytest.mark.parametrize("hermitian", (True, False))
+def test_two_point(hermitian):
+    model = parameter.holstein_model
+    mps = Mps.random(model, 1, 20).normalize("mps_and_coeff")
+    e_dofs = model.e_dofs
+    corr = mps.calc_two_point(r"a^\dagger", "a", e_dofs, hermitian=hermitian)
+    for i, dof1 in enumerate(e_dofs):
+        for j, dof2 in enumerate(e_dofs):
+            mpo = Mpo(model, Op(r"a^\dagger a", [dof1, dof2]))
+            assert corr[i, j] == pytest.approx(mps.expectation(mpo))
+
+    # string operator and DoFs not ordered by site
+    v_dofs = model.v_dofs[::-1]
+    corr = mps.calc_two_point("x", "x", v_dofs, string=r"b^\dagger b")
+    i, j = 0, len(v_dofs) - 1
+    symbol = " ".join(["x"] + [r"b^\dagger b"] * (len(v_dofs) - 2) + ["x"])
+    op_dofs = [v_dofs[-1]] + [dof for dof in v_dofs[-2:0:-1] for _ in range(2)] + [v_dofs[0]]
+    mpo = Mpo(model, Op(symbol, op_dofs))
+    assert corr[i, j] == pytest.approx(mps.expectation(mpo))
+
+
+@pytest.mark.parametrize("hermitian", (True, False))
+def test_two_point_string(hermitian):
+    # the Jordan-Wigner string also acts on the DoFs not in ``dofs``
+    nsites = 6
+    model = Model([BasisHalfSpin(i) for i in range(nsites)], [Op("sigma_z", i) for i in range(nsites)])
+    mps = Mps.random(model, 0, 10).normalize("mps_and_coeff")
+    dofs = [4, 0, 2, 3]
+    corr = mps.calc_two_point("sigma_+", "sigma_-", dofs, string="sigma_z", hermitian=hermitian)
+    for i, dof1 in enumerate(dofs):
+        for j, dof2 in enumerate(dofs):
+            between = list(range(min(dof1, dof2) + 1, max(dof1, dof2)))
+            symbol = " ".join(["sigma_+", "sigma_-"] + ["sigma_z"] * len(between))
+            mpo = Mpo(model, Op(symbol, [dof1, dof2] + between))
+            assert corr[i, j] == pytest.approx(mps.expectation(mpo))
+
+
 def test_site_entropy():
     mps = Mps.random(parameter.holstein_model, 1, 20)
     mps.canonicalise().normalize("mps_only")
@@ -86,6 +124,41 @@ def test_site_entropy():
             (entropy_1site[0]+entropy_1site[1]-entropy_2site[(0,1)])/2)
 
 
+def test_bond_spectrum():
+    mps = Mps.random(parameter.holstein_model, 1, 20).canonicalise()
+    # the spectrum from a full SVD sweep
+    _, std_s_list = mps.copy().ensure_right_canonical().compress(temp_m_trunc=np.inf, ret_s=True)
+
+    def check(s_list):
+        assert len(s_list) == len(std_s_list)
+        for s, std_s in zip(s_list, std_s_list):
+            s, std_s = np.sort(s)[::-1], np.sort(std_s)[::-1]
+            n = min(len(s), len(std_s))
+            assert np.allclose(s[:n], std_s[:n])
+            assert np.allclose(s[n:], 0) and np.allclose(std_s[n:], 0)
+
+    # computed by QR sweeps and then cached
+    check(mps.bond_spectrum())
+    assert len(mps._bond_spectra) == mps.site_num - 1
+    # recorded by the compression without truncation
+    mps._bond_spectra = {}
+    mps.ensure_left_canonical().compress(temp_m_trunc=np.inf)
+    assert len(mps._bond_spectra) == mps.site_num - 1
+    check(mps.bond_spectrum())
+    # gauge transformations and scaling keep the spectrum
+    mps.canonicalise()
+    assert len(mps._bond_spectra) == mps.site_num - 1
+    check(mps.bond_spectrum())
+    scaled = mps.scale(2)
+    assert len(scaled._bond_spectra) == mps.site_num - 1
+    assert np.allclose(scaled.bond_spectrum()[0], 2 * mps.bond_spectrum()[0])
+    # modifying a site clears the spectrum
+    entropy = mps.calc_bond_entropy()
+    mps[0] = mps[0].array * 2
+    assert not mps._bond_spectra
+    assert np.allclose(mps.calc_bond_entropy(), entropy)
+
+
 def test_load_from_dense_wfn():
     model = Model(basis=[BasisSimpleElectron(i) for i in range(5)], ham_terms=[])
     ref_mps = Mps.random(model, 1, 20)
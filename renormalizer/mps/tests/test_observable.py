@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.mps import Mps, Mpo, MpDm
+from renormalizer.mps.observable import ObservablePlan
+from renormalizer.tests import parameter
+
+
+@pytest.mark.parametrize("scheme", (3, 4))
+@pytest.mark.parametrize("mpdm", (False, True))
+def test_observable_plan(scheme, mpdm):
+    model = parameter.holstein_model.switch_scheme(scheme)
+    mpo = Mpo(model)
+    if mpdm:
+        mps = MpDm.max_entangled_gs(model)
+        mps = mps.evolve(mpo, -0.5j)
+    else:
+        mps = Mps.random(model, 1, 20).canonicalise().normalize("mps_and_coeff")
+    plan = ObservablePlan()
+    plan.add_expectation("energy", mpo)
+    plan.add_local("e_occupations", r"a^\dagger a", model.e_dofs)
+    plan.add_local("ph_occupations", "n", model.v_dofs)
+    plan.add_two_point("rdm", r"a^\dagger", "a", model.e_dofs, hermitian=True)
+    plan.add_two_point("xx", "x", "x", model.v_dofs[::-1], string=r"b^\dagger b")
+    plan.add_two_point("xx_subset", "x", "x", model.v_dofs[::2], string=r"b^\dagger b")
+    plan.add_bond_entropy()
+    with pytest.raises(ValueError):
+        plan.add_bond_entropy()
+
+    bond_dims = mps.bond_dims
+    res = plan.evaluate(mps)
+    # the mps is not changed
+    assert mps.bond_dims == bond_dims
+    assert res["energy"] == pytest.approx(mps.expectation(mpo))
+    assert np.allclose(res["e_occupations"], mps.e_occupations)
+    assert np.allclose(res["ph_occupations"], mps.ph_occupations)
+    assert np.allclose(res["rdm"], mps.calc_edof_rdm())
+    assert np.allclose(res["xx"], mps.calc_two_point("x", "x", model.v_dofs[::-1], string=r"b^\dagger b"))
+    assert np.allclose(res["xx_subset"], mps.calc_two_point("x", "x", model.v_dofs[::2], string=r"b^\dagger b"))
+    assert np.allclose(res["bond_entropy"], mps.calc_bond_entropy())
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.mps import Mps, Mpo, MpDm, EvolutionSession, ObservablePlan
+from renormalizer.tests.parameter import holstein_model
+from renormalizer.utils import EvolveConfig, EvolveMethod, CompressConfig
+
+
+@pytest.mark.parametrize("method, adaptive", (
+        [EvolveMethod.tdvp_ps, False],
+        [EvolveMethod.tdvp_ps, True],
+        [EvolveMethod.tdvp_ps2, False],
+        [EvolveMethod.tdvp_mu_vmf, False],
+        [EvolveMethod.prop_and_compress, False],
+))
+@pytest.mark.parametrize("mpdm", (False, True))
+def test_session(method, adaptive, mpdm):
+    mpo = Mpo(holstein_model)
+    mps = Mps.random(holstein_model, 1, 10).canonicalise().normalize("mps_and_coeff")
+    if mpdm:
+        mps = MpDm.from_mps(mps)
+    mps.evolve_config = EvolveConfig(method, adaptive=adaptive, guess_dt=10)
+    mps.compress_config = CompressConfig(max_bonddim=10)
+    init_sites = [ms.array.copy() for ms in mps]
+
+    plan = ObservablePlan().add_expectation("e", mpo).add_local("occ", r"a^\dagger a", holstein_model.e_dofs)
+    session = EvolutionSession(mps, mpo, plan)
+    # the VMF method canonicalises the MPS in place
+    std_mps = mps.copy()
+    for i in range(3):
+        std_mps = std_mps.evolve(mpo, 20)
+        new_mps = session.step(20)
+        if i == 0:
+            snapshot = session.snapshot()
+            snapshot_sites = [ms.array.copy() for ms in snapshot]
+        assert new_mps.distance(std_mps) < 1e-6
+        assert np.allclose(session.results[-1]["occ"], std_mps.e_occupations)
+        assert np.allclose(session.results[-1]["e"], std_mps.expectation(mpo))
+    assert session.evolve_times == [0, 20, 40, 60]
+    assert len(session.results) == 4
+
+    # the snapshots are not changed by the evolution
+    for ms, ms_ref in zip(mps, init_sites):
+        assert np.array_equal(ms.array, ms_ref)
+    for ms, ms_ref in zip(snapshot, snapshot_sites):
+        assert np.array_equal(ms.array, ms_ref)
+
+
+def test_inplace_evolve():
+    mpo = Mpo(holstein_model)
+    mps = Mps.random(holstein_model, 1, 10).canonicalise().normalize("mps_and_coeff").to_complex()
+    mps.evolve_config = EvolveConfig(EvolveMethod.tdvp_ps)
+    new_mps = mps.copy().evolve(mpo, 20)
+    evolved = mps.evolve(mpo, 20, inplace=True)
+    assert evolved is mps
+    assert evolved.distance(new_mps) < 1e-6
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.mps.svd_qn import svd_qn, eigh_qn, get_qn_mask, add_outer
+
+
+def random_qn_problem(dim_l, dim_r, qntot):
+    # two-component quantum numbers as in the quantum chemistry models
+    qnl = np.random.randint(0, 3, size=(dim_l, 2))
+    qnr = np.random.randint(0, 3, size=(dim_r, 2))
+    qnmat = add_outer(qnl, qnr)
+    a = np.random.rand(dim_l, dim_r)
+    a[~get_qn_mask(qnmat, qntot)] = 0
+    return a, qnl, qnr
+
+
+@pytest.mark.parametrize("nthreads", (1, 4))
+@pytest.mark.parametrize("full_matrices", (True, False))
+def test_svd_qn(full_matrices, nthreads):
+    qntot = np.array([2, 2])
+    a, qnl, qnr = random_qn_problem(40, 30, qntot)
+    u, su, new_qnl, v, sv, new_qnr = svd_qn(a, qnl, qnr, qntot, full_matrices=full_matrices, nthreads=nthreads)
+    assert np.allclose(u.T @ u, np.eye(u.shape[1]))
+    assert np.allclose(v.T @ v, np.eye(v.shape[1]))
+    # the singular vectors with nonzero singular values come first
+    dim = np.count_nonzero(su)
+    assert np.allclose(su[:dim], sv[:dim])
+    assert np.all(su[dim:] == 0) and np.all(sv[dim:] == 0)
+    if not full_matrices:
+        assert np.all(np.diff(su) <= 0)
+    assert np.allclose(u[:, :dim] @ np.diag(su[:dim]) @ v[:, :dim].T, a)
+    # the singular vectors respect the quantum number
+    for vec, qn in zip(u.T, new_qnl):
+        assert np.all(vec[~get_qn_mask(qnl, qn)] == 0)
+    for vec, qn in zip(v.T, new_qnr):
+        assert np.all(vec[~get_qn_mask(qnr, qn)] == 0)
+    assert np.allclose(np.array(new_qnl)[:dim] + np.array(new_qnr)[:dim], qntot)
+
+    u, new_qnl, v, new_qnr = svd_qn(a, qnl, qnr, qntot, QR=True, system="L", full_matrices=False, nthreads=nthreads)
+    assert np.allclose(u @ v.T, a)
+
+
+@pytest.mark.parametrize("nthreads", (1, 4))
+def test_eigh_qn(nthreads):
+    qntot = np.array([2, 2])
+    a, qnl, qnr = random_qn_problem(40, 30, qntot)
+    dm = a @ a.T
+    u, s, new_qn = eigh_qn(dm, qnl, qnr, qntot, "L", nthreads=nthreads)
+    assert np.allclose(u @ np.diag(s**2) @ u.T, dm)
+    assert np.allclose(np.sort(s)[::-1][:30], np.linalg.svd(a, compute_uv=False), atol=1e-6)
@@ -113,4 +113,43 @@ def test_tda():
     assert np.allclose(e*au2cm, std[1:4], atol=3)
 
 
+def test_tda_dense():
+    # compare with the Hamiltonian projected on the tangent space explicitly
+    nsites = 6
+    ham_terms = []
+    for i in range(nsites - 1):
+        ham_terms.append(Op("sigma_+ sigma_-", [i, i+1], 0.5))
+        ham_terms.append(Op("sigma_- sigma_+", [i, i+1], 0.5))
+        ham_terms.append(Op("sigma_z sigma_z", [i, i+1], 0.175))
+    for i in range(nsites):
+        ham_terms.append(Op("sigma_z", i, 0.1 * i))
+    model = Model([ba.BasisHalfSpin(i) for i in range(nsites)], ham_terms)
+    mpo = Mpo(model)
 
+    M = 4
+    mps = Mps.random(model, 0, M, percent=1.0)
+    mps.optimize_config.procedure = [[M, 0.4], [M, 0.2]] + [[M, 0]] * 20
+    mps.optimize_config.method = "2site"
+    energies, mps = gs.optimize_mps(mps, mpo)
+
+    tda = TDA(model, mpo, mps, nroots=3)
+    e = tda.kernel(include_psi0=False)
+
+    mps_l_cano, mps_r_cano, tangent_u, _ = tda.wfn
+    basis_vecs = []
+    for ims, u in enumerate(tangent_u):
+        if u is None:
+            continue
+        rdim = 1 if ims == nsites - 1 else mps_r_cano[ims+1].shape[0]
+        for i in range(u.shape[-1] * rdim):
+            coeff = np.zeros(u.shape[-1] * rdim)
+            coeff[i] = 1
+            mps_tangent = mps_r_cano.copy()
+            for jms in range(ims):
+                mps_tangent[jms] = mps_l_cano[jms]
+            mps_tangent[ims] = np.tensordot(u, coeff.reshape(u.shape[-1], rdim), axes=1)
+            basis_vecs.append(mps_tangent.todense())
+    basis_vecs = np.stack(basis_vecs, axis=1)
+    assert np.allclose(basis_vecs.conj().T @ basis_vecs, np.eye(basis_vecs.shape[1]))
+    h = basis_vecs.conj().T @ mpo.todense() @ basis_vecs
+    assert np.allclose(e, np.linalg.eigvalsh(h)[:3])
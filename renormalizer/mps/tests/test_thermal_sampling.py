@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.model import Phonon, Mol, HolsteinModel
+from renormalizer.mps import MpDm, Mpo, ThermalProp, ThermalPropEnsemble, random_phase_state
+from renormalizer.mps.thermal_sampling import weighted_mean
+from renormalizer.utils import Quantity, CompressConfig, CompressCriteria
+
+
+def get_model():
+    ph = Phonon.simple_phonon(Quantity(1), Quantity(1), 2)
+    mol = Mol(Quantity(0), [ph])
+    return HolsteinModel([mol] * 3, Quantity(1), 3)
+
+
+def test_random_phase_state():
+    model = get_model()
+    rng = np.random.default_rng(0)
+    mps = random_phase_state(model, rng)
+    assert mps.norm == pytest.approx(1)
+    # one exciton with uniform population
+    assert np.allclose(mps.e_occupations, 1 / model.n_edofs)
+    # the average of |r><r| is proportional to identity in the one exciton space
+    dense = [random_phase_state(model, rng).todense().ravel() for _ in range(2000)]
+    rho = np.mean([np.outer(v, v.conj()) for v in dense], axis=0)
+    ref = MpDm.max_entangled_ex(model).todense()
+    ref = ref.reshape(rho.shape) / np.trace(ref.reshape(rho.shape))
+    # the diagonal is exact and the off-diagonal elements vanish on average
+    assert np.allclose(np.diag(rho), np.diag(ref))
+    assert np.allclose(rho, ref, atol=0.005)
+
+
+def test_weighted_mean():
+    values = np.array([[1, 2j], [3, 4j]])
+    mean, err = weighted_mean(values, np.log([1, 3]))
+    assert np.allclose(mean, [2.5, 3.5j])
+    assert np.allclose(err, [0.75, 0.75j])
+    mean, err = weighted_mean(values[:1], [0])
+    assert np.allclose(mean, values[0]) and np.all(np.isnan(err))
+
+
+@pytest.mark.parametrize("nprocs", (1, 2))
+def test_thermal_prop_ensemble(nprocs):
+    model = get_model()
+    beta = 1
+    nsteps = 2
+    mpdm = MpDm.max_entangled_ex(model)
+    mpdm.compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=16)
+    tp = ThermalProp(mpdm)
+    tp.evolve(None, nsteps, beta / 2j)
+
+    ensemble = ThermalPropEnsemble(model, 8, nprocs=nprocs, seed=2020)
+    ensemble.evolve(None, nsteps, beta / 2j)
+    assert len(ensemble.samples) == 8
+    assert np.allclose(ensemble.evolve_times, tp.evolve_times)
+    assert np.all(np.abs(ensemble.energies - tp.energies) < 4 * ensemble.energies_err)
+    diff = np.abs(ensemble.e_occupations_array - tp.e_occupations_array)
+    assert np.all(diff < 4 * ensemble.e_occupations_err + 1e-8)
+    # the total electron number is exact for every sample
+    assert np.allclose(ensemble.e_occupations_array.sum(axis=1), 1)
+
+    # the weight of each sample is consistent with the exact propagation
+    sample = ensemble.samples[0]
+    h = Mpo(model).todense()
+    w, v = np.linalg.eigh(h)
+    rng = np.random.default_rng(np.random.SeedSequence(2020).spawn(1)[0])
+    r = random_phase_state(model, rng).todense().ravel()
+    r = v.conj().T @ r
+    assert sample["log_weights"][-1] == pytest.approx(np.log(np.sum(np.abs(r) ** 2 * np.exp(-beta * w))), rel=1e-3)
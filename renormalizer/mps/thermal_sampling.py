@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+r"""
+Finite temperature properties from an ensemble of random phase thermal pure states.
+
+The identity in the one exciton space is sampled by random phase states :math:`|r\rangle`
+(see :func:`random_phase_state`) with :math:`\mathbb{E}[|r\rangle \langle r|] \propto \hat I`. Then
+
+    .. math::
+        \frac{\textrm{Tr}\{e^{-\beta \hat H} \hat A\}}{\textrm{Tr}\{e^{-\beta \hat H}\}}
+        \approx \frac{\sum_r Z_r \langle \psi_r | \hat A | \psi_r \rangle}{\sum_r Z_r}
+
+where :math:`|\psi_r\rangle = e^{-\beta \hat H / 2} |r\rangle / \sqrt{Z_r}` and
+:math:`Z_r = \langle r | e^{-\beta \hat H} | r \rangle`.
+Each sample is an independent :class:`~renormalizer.mps.Mps` trajectory, so the samples are evolved
+in a process pool and the statistical error is estimated from the spread of the samples.
+"""
+
+import importlib.util
+import logging
+import multiprocessing
+import os
+from multiprocessing import Pool
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from renormalizer.model import Model, Op
+from renormalizer.mps import Mps, Mpo
+from renormalizer.mps.svd_qn import blas_threads_limit
+from renormalizer.mps.thermalprop import ThermalProp
+from renormalizer.utils import Quantity, EvolveConfig, CompressConfig
+
+logger = logging.getLogger(__name__)
+
+
+def random_phase_state(model: Model, rng: np.random.Generator = None) -> Mps:
+    r"""
+    Construct a normalized random phase state in the one exciton space
+
+        .. math::
+            |r\rangle \propto \sum_m e^{i \theta_m} a^\dagger_m \prod_n \sum_{v_n} e^{i \phi_{n v_n}} |v_n\rangle
+
+    where the phases are uniformly distributed. The average of :math:`|r\rangle \langle r|` is the
+    (normalized) infinite temperature state :meth:`MpDm.max_entangled_ex <renormalizer.mps.MpDm.max_entangled_ex>`.
+    The state is a product state apart from the electronic part, whose bond dimension is 2.
+
+    Args:
+        model (:class:`~renormalizer.model.Model`): system information.
+        rng (:class:`np.random.Generator`): the random number generator. Default is ``np.random.default_rng()``.
+
+    Returns:
+        The random phase state (:class:`~renormalizer.mps.Mps`).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    mps = Mps.ground_state(model, max_entangled=True).to_complex()
+    for isite in range(mps.site_num):
+        ms = mps[isite].array
+        phase = np.exp(2j * np.pi * rng.random(ms.shape[1]))
+        mps[isite] = ms * phase.reshape(1, -1, 1)
+    if model.n_edofs != 0:
+        phase = np.exp(2j * np.pi * rng.random(model.n_edofs))
+        ex_mpo = Mpo(model, [Op(r"a^\dagger", dof, factor) for dof, factor in zip(model.e_dofs, phase)])
+        mps = ex_mpo @ mps
+    return mps.normalize("mps_and_coeff")
+
+
+def weighted_mean(values: np.ndarray, log_weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    r"""
+    The weighted average of the samples and its standard error.
+
+    Args:
+        values (np.ndarray): the samples. The first axis is the sample axis.
+        log_weights (np.ndarray): the logarithm of the weights. The shape should be the same with
+            the leading axes of ``values`` and the weights are broadcast to the trailing axes.
+
+    Returns:
+        The average and the standard error estimated by the delta method for ratio estimators.
+        For complex values the errors of the real and imaginary parts are returned as the real and imaginary
+        parts of the error. The error is ``nan`` if there is only one sample.
+    """
+    values = np.asarray(values)
+    log_weights = np.asarray(log_weights, dtype=float)
+    log_weights = log_weights.reshape(log_weights.shape + (1,) * (values.ndim - log_weights.ndim))
+    weights = np.exp(log_weights - log_weights.max(axis=0))
+    weights = weights / weights.sum(axis=0)
+    mean = (weights * values).sum(axis=0)
+    nsamples = len(values)
+    if nsamples < 2:
+        return mean, np.full(mean.shape, np.nan)
+    dev = values - mean
+    factor = nsamples / (nsamples - 1)
+    err = np.sqrt(factor * (weights ** 2 * dev.real ** 2).sum(axis=0))
+    if np.iscomplexobj(values):
+        err = err + 1j * np.sqrt(factor * (weights ** 2 * dev.imag ** 2).sum(axis=0))
+    return mean, err
+
+
+class ThermalPureStateProp(ThermalProp):
+    r"""
+    Propagate a pure state :math:`|\psi\rangle` in imaginary time. The state is normalized at every step
+    and the logarithm of the weight :math:`\langle \psi | e^{-2 \tau \hat H} | \psi \rangle` at the
+    imaginary time :math:`\tau` is recorded in ``log_weights``.
+
+    Args:
+        init_mps (:class:`~renormalizer.mps.Mps`): the initial state. Usually from :func:`random_phase_state`.
+        h_mpo_model (:class:`~renormalizer.model.Model`): Model for the system Hamiltonian.
+            Default is the same with ``init_mps.model``.
+        evolve_config (:class:`~renormalizer.utils.EvolveConfig`): config when evolving the Mps in imaginary time.
+        dump_dir (str): the directory for logging and numerical result output.
+        job_name (str): the name of the calculation job which determines the file name of the logging and numerical result output.
+        auto_expand (bool): whether expand the bond dimension of the initial state for TDVP based methods.
+    """
+    def __init__(
+        self,
+        init_mps: Mps,
+        h_mpo_model: Model = None,
+        evolve_config: EvolveConfig = None,
+        dump_dir: str = None,
+        job_name: str = None,
+        auto_expand: bool = True,
+    ):
+        # the weight of the latest state
+        self._log_weight = 2 * np.log(init_mps.norm)
+        self.log_weights = []
+        init_mps = init_mps.copy().normalize("mps_and_coeff")
+        super().__init__(init_mps, h_mpo_model, evolve_config=evolve_config, dump_dir=dump_dir,
+                job_name=job_name, auto_expand=auto_expand)
+
+    def process_mps(self, mps):
+        super().process_mps(mps)
+        self.log_weights.append(self._log_weight)
+
+    def evolve_prop(self, old_mps, evolve_dt):
+        shift = self.energies[-1]
+        h_mpo = self.h_mpo.with_offset(Quantity(shift))
+        new_mps = old_mps.evolve(h_mpo, evolve_dt, normalize=False)
+        # e^{-\tau H} = e^{-\tau (H - shift)} e^{-\tau shift} and evolve_dt = -i\tau
+        self._log_weight += 2 * (np.log(new_mps.norm) + evolve_dt.imag * shift)
+        return new_mps.normalize("mps_and_coeff")
+
+    def get_dump_dict(self):
+        dump_dict = super().get_dump_dict()
+        dump_dict["log weights"] = self.log_weights
+        return dump_dict
+
+
+# the ensemble shared by all the trajectories run in a worker process
+_worker_ensemble = None
+
+
+def _init_worker(ensemble):
+    global _worker_ensemble
+    _worker_ensemble = ensemble
+
+
+def _worker_run_task(task):
+    # the BLAS threads are divided among the processes
+    with blas_threads_limit(_worker_ensemble.nprocs):
+        return _worker_ensemble.run_task(task)
+
+
+class ThermalStateEnsemble:
+    r"""
+    Base class of the ensembles of thermal pure state trajectories.
+    Subclasses implement :meth:`run_trajectory` to calculate the properties of a single trajectory
+    and :meth:`update_statistics` to average the properties of the samples collected.
+
+    Args:
+        model (:class:`~renormalizer.model.Model`): system information.
+        nsamples (int): the number of trajectories run in every call of :meth:`evolve`.
+        nprocs (int): the number of processes to run the trajectories.
+        seed (int): the seed of the random phases. The trajectories are reproducible regardless of ``nprocs``.
+        dump_dir (str): the directory for numerical result output.
+        job_name (str): the name of the calculation job which determines the file name of the numerical result output.
+    """
+    def __init__(self, model: Model, nsamples: int, nprocs: int = 1, seed: int = None,
+                 dump_dir: str = None, job_name: str = None):
+        if nsamples < 1:
+            raise ValueError(f"nsamples should be positive. Got {nsamples}")
+        self.model = model
+        self.nsamples = nsamples
+        self.nprocs = nprocs
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.dump_dir = dump_dir
+        self.job_name = job_name
+        self.evolve_times = None
+        self.samples: List[Dict] = []
+
+    def run_trajectory(self, rng: np.random.Generator, evolve_dt, nsteps, evolve_time) -> Dict:
+        """
+        Run a single trajectory.
+
+        :return: the properties of the trajectory. ``"evolve_times"`` is required.
+        """
+        raise NotImplementedError
+
+    def update_statistics(self):
+        """
+        Average the properties in ``self.samples``.
+        """
+        raise NotImplementedError
+
+    def get_dump_dict(self):
+        raise NotImplementedError
+
+    def run_task(self, task):
+        index, seed, evolve_dt, nsteps, evolve_time = task
+        sample = self.run_trajectory(np.random.default_rng(seed), evolve_dt, nsteps, evolve_time)
+        sample["index"] = index
+        return sample
+
+    def evolve(self, evolve_dt=None, nsteps=None, evolve_time=None):
+        """
+        Run ``nsamples`` trajectories and add them to the samples collected. The arguments are the same with
+        :meth:`TdMpsJob.evolve <renormalizer.utils.tdmps.TdMpsJob.evolve>`. The statistics are
+        updated (and dumped) every time a trajectory is finished.
+        """
+        start = len(self.samples)
+        seeds = self.seed_sequence.spawn(self.nsamples)
+        tasks = [(start + i, seed, evolve_dt, nsteps, evolve_time) for i, seed in enumerate(seeds)]
+        if self.nprocs > 1:
+            if importlib.util.find_spec("cupy"):
+                multiprocessing.set_start_method('forkserver', force=True)
+            nprocs = min(self.nprocs, len(tasks))
+            pool = Pool(processes=nprocs, initializer=_init_worker, initargs=(self,))
+            logger.info(f"{nprocs} multiprocess parallelization activated")
+            for sample in pool.imap_unordered(_worker_run_task, tasks):
+                self.add_sample(sample)
+            pool.close()
+            pool.join()
+        else:
+            for task in tasks:
+                self.add_sample(self.run_task(task))
+        return self
+
+    def add_sample(self, sample: Dict):
+        evolve_times = sample.pop("evolve_times")
+        if self.evolve_times is None:
+            self.evolve_times = evolve_times
+        elif len(evolve_times) != len(self.evolve_times) or not np.allclose(evolve_times, self.evolve_times):
+            raise ValueError("The time steps of the trajectories are not the same.")
+        self.samples.append(sample)
+        # keep the order so that the result does not depend on the scheduling of the processes
+        self.samples.sort(key=lambda s: s["index"])
+        self.update_statistics()
+        logger.info(f"{len(self.samples)} samples collected")
+        if self._defined_output_path:
+            try:
+                self.dump_dict()
+            except IOError:  # never quit calculation because of IOError
+                logger.exception("dumping dict failed with IOError")
+
+    def dump_dict(self):
+        if not self._defined_output_path:
+            raise ValueError("Dump dir or job name not set")
+        os.makedirs(self.dump_dir, exist_ok=True)
+        file_path = os.path.join(self.dump_dir, self.job_name + ".npz")
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, "wb") as fout:
+            np.savez(fout, **self.get_dump_dict())
+        os.replace(tmp_path, file_path)
+
+    @property
+    def evolve_times_array(self):
+        return np.array(self.evolve_times)
+
+    @property
+    def _defined_output_path(self):
+        return self.dump_dir is not None and self.job_name is not None
+
+
+class ThermalPropEnsemble(ThermalStateEnsemble):
+    r"""
+    Imaginary time propagation of random phase states by :class:`ThermalPureStateProp`.
+    The counterpart of :class:`~renormalizer.mps.ThermalProp` starting from
+    :meth:`MpDm.max_entangled_ex <renormalizer.mps.MpDm.max_entangled_ex>`.
+    The properties at the imaginary time :math:`\tau` are at the temperature :math:`\beta = 2\tau`.
+
+    Args:
+        model (:class:`~renormalizer.model.Model`): system information.
+        nsamples (int): the number of trajectories run in every call of :meth:`evolve`.
+        evolve_config (:class:`~renormalizer.utils.EvolveConfig`): config when evolving the states in imaginary time.
+        compress_config (:class:`~renormalizer.utils.CompressConfig`): config when compressing the states.
+        nprocs (int): the number of processes to run the trajectories.
+        seed (int): the seed of the random phases.
+        dump_dir (str): the directory for numerical result output.
+        job_name (str): the name of the calculation job which determines the file name of the numerical result output.
+    """
+    def __init__(self, model: Model, nsamples: int, evolve_config: EvolveConfig = None,
+                 compress_config: CompressConfig = None, nprocs: int = 1, seed: int = None,
+                 dump_dir: str = None, job_name: str = None):
+        super().__init__(model, nsamples, nprocs=nprocs, seed=seed, dump_dir=dump_dir, job_name=job_name)
+        self.evolve_config = evolve_config
+        self.compress_config = compress_config
+        self.energies = self.energies_err = None
+        self.e_occupations_array = self.e_occupations_err = None
+        self.ph_occupations_array = self.ph_occupations_err = None
+
+    def run_trajectory(self, rng, evolve_dt, nsteps, evolve_time):
+        mps = random_phase_state(self.model, rng)
+        if self.compress_config is not None:
+            mps.compress_config = self.compress_config.copy()
+        evolve_config = None if self.evolve_config is None else self.evolve_config.copy()
+        tp = ThermalPureStateProp(mps, evolve_config=evolve_config)
+        tp.evolve(evolve_dt, nsteps, evolve_time)
+        return {
+            "evolve_times": tp.evolve_times,
+            "log_weights": tp.log_weights,
+            "energies": tp.energies,
+            "e_occupations": tp.e_occupations_array,
+            "ph_occupations": tp.ph_occupations_array,
+        }
+
+    def update_statistics(self):
+        log_weights = np.array([sample["log_weights"] for sample in self.samples])
+
+        def average(key):
+            return weighted_mean(np.array([sample[key] for sample in self.samples]), log_weights)
+
+        self.energies, self.energies_err = average("energies")
+        self.e_occupations_array, self.e_occupations_err = average("e_occupations")
+        self.ph_occupations_array, self.ph_occupations_err = average("ph_occupations")
+        logger.info(f"Energy: {self.energies[-1]} +/- {self.energies_err[-1]}")
+
+    def get_dump_dict(self):
+        dump_dict = dict()
+        dump_dict["samples"] = len(self.samples)
+        dump_dict["time series"] = [-t.imag for t in self.evolve_times]
+        dump_dict["energies"] = self.energies
+        dump_dict["energies error"] = self.energies_err
+        dump_dict["electron occupations array"] = self.e_occupations_array
+        dump_dict["electron occupations error"] = self.e_occupations_err
+        dump_dict["phonon occupations array"] = self.ph_occupations_array
+        dump_dict["phonon occupations error"] = self.ph_occupations_err
+        return dump_dict
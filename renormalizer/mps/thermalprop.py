@@ -4,6 +4,7 @@ import numpy as np
 
 from renormalizer.model import Model
 from renormalizer.mps import MpDm, Mpo
+from renormalizer.mps.observable import ObservablePlan
 from renormalizer.utils import TdMpsJob, Quantity, EvolveConfig
 from renormalizer.property import Property
 
@@ -60,6 +61,13 @@ class ThermalProp(TdMpsJob):
         self._vn_entropy_array = []
         self.properties = properties
         self.auto_expand = auto_expand
+        # the observables calculated at every step in one sweep
+        model = self.init_mpdm.model
+        self.observable_plan = ObservablePlan() \
+            .add_expectation("energy", self.h_mpo) \
+            .add_local("e_occupations", r"a^\dagger a", model.e_dofs) \
+            .add_local("ph_occupations", "n", model.v_dofs) \
+            .add_bond_entropy("vn_entropy")
 
         super().__init__(evolve_config=evolve_config, dump_mps=dump_mps, dump_dir=dump_dir,
                 job_name=job_name)
@@ -71,17 +79,19 @@ class ThermalProp(TdMpsJob):
         return self.init_mpdm
 
     def process_mps(self, mps):
-        new_energy = mps.expectation(self.h_mpo)
-        self.energies.append(new_energy)
         if self.exact:
             # skip the fuss for efficiency
+            self.energies.append(mps.expectation(self.h_mpo))
             return
+        results = self.observable_plan.evaluate(mps)
+        new_energy = results["energy"]
+        self.energies.append(new_energy)
         for attr_str in ["e_occupations", "ph_occupations"]:
-            attr = getattr(mps, attr_str)
+            attr = results[attr_str]
             logger.info(f"{attr_str}: {attr}")
             self_array = getattr(self, f"_{attr_str}_array")
             self_array.append(attr)
-        vn_entropy = mps.calc_bond_entropy()
+        vn_entropy = results["vn_entropy"]
         self._vn_entropy_array.append(vn_entropy)
         logger.info(f"vn entropy: {vn_entropy}")
         logger.info(
@@ -103,7 +113,7 @@ class ThermalProp(TdMpsJob):
         return new_mpdm
 
     def evolve_prop(self, old_mpdm, evolve_dt):
-        h_mpo = Mpo(self.h_mpo.model, offset=Quantity(self.energies[-1]))
+        h_mpo = self.h_mpo.with_offset(Quantity(self.energies[-1]))
         return old_mpdm.evolve(h_mpo, evolve_dt)
 
     def evolve_single_step(self, evolve_dt):
@@ -154,7 +164,8 @@ def load_thermal_state(model, path: str):
 
     Args:
         model (:class:`MolList`): system information
-        path (str): the path to load thermal state from. Should be an numpy ``.npz`` file.
+        path (str): the path to load thermal state from. Should be dumped by :meth:`MpDm.dump`.
+            The site tensors are memory mapped so the file can be shared by many jobs.
     Returns: Loaded MpDm
     """
     try:
@@ -4,3 +4,4 @@
 from renormalizer.spectra.exact import SpectraExact
 from renormalizer.spectra.finitet import SpectraFiniteT
 from renormalizer.spectra.zerot import SpectraOneWayPropZeroT, SpectraTwoWayPropZeroT
+from renormalizer.spectra.chebyshev import SpectraChebyshev
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import logging
+import os
+
+import numpy as np
+
+from renormalizer.mps import Mpo, Mps, gs
+from renormalizer.utils import CompressConfig, CompressCriteria, OptimizeConfig
+
+logger = logging.getLogger(__name__)
+
+
+def chebyshev_kernel(n_moments: int, kernel: str = "jackson", lorentz_lambda: float = 4.0) -> np.ndarray:
+    r"""
+    The damping factors :math:`g_n` of the truncated Chebyshev expansion
+    that suppress the Gibbs oscillations.
+
+    Parameters
+    ----------
+    n_moments : int
+        The number of moments :math:`N`.
+    kernel : str
+        ``jackson``, ``lorentz`` or ``dirichlet`` (no damping). The Jackson kernel
+        gives a nearly Gaussian broadening with the width :math:`\pi a / N` where :math:`a` is
+        the half width of the spectrum. The Lorentz kernel gives a Lorentzian broadening with the
+        width :math:`\lambda a / N`, which is comparable with the correction vector method.
+    lorentz_lambda : float
+        The parameter :math:`\lambda` of the Lorentz kernel.
+
+    Returns
+    -------
+    g : np.ndarray
+        The damping factors.
+    """
+    n = np.arange(n_moments)
+    if kernel == "jackson":
+        q = np.pi / (n_moments + 1)
+        return ((n_moments - n + 1) * np.cos(q * n) + np.sin(q * n) / np.tan(q)) / (n_moments + 1)
+    elif kernel == "lorentz":
+        return np.sinh(lorentz_lambda * (1 - n / n_moments)) / np.sinh(lorentz_lambda)
+    elif kernel == "dirichlet":
+        return np.ones(n_moments)
+    else:
+        raise ValueError(f"Unknown kernel: {kernel}")
+
+
+def _overlap(mps1: Mps, mps2: Mps):
+    # <mps1|mps2>
+    return mps1.conj().dot(mps2) * np.conj(mps1.coeff) * mps2.coeff
+
+
+class SpectraChebyshev:
+    r"""
+    Calculate the zero temperature spectrum by the Chebyshev expansion of the spectral function
+    (the kernel polynomial method, or Chebyshev matrix product states, see Holzner et al.,
+    Phys. Rev. B 83, 195115 (2011))
+
+    .. math::
+        I(\omega) = \langle b | \delta(\omega - \hat H + e_0) | b \rangle
+
+    :math:`\hat H` is rescaled into :math:`\hat H' = (\hat H - c) / a` whose spectrum
+    is within [-1, 1], and the moments :math:`\mu_n = \langle b | T_n(\hat H') | b \rangle`
+    are obtained by the Chebyshev recursion :math:`|t_{n+1}\rangle = 2 \hat H' |t_n\rangle - |t_{n-1}\rangle`
+    with compression. Two moments are obtained from each new vector by
+    :math:`\mu_{2n} = 2\langle t_n | t_n \rangle - \mu_0` and
+    :math:`\mu_{2n+1} = 2\langle t_{n+1} | t_n \rangle - \mu_1`.
+    The spectrum at any frequency is reconstructed from the moments, so a single run replaces
+    the correction vector calculations at all frequencies. The resolution is determined by the number of moments.
+
+    With the Lorentz kernel, the result is comparable with
+    :class:`~renormalizer.cv.zerot.SpectraZtCV` with :math:`\eta = \lambda a / N`.
+
+    Args:
+        model (:class:`~renormalizer.model.Model`): system information.
+        spectratype (str): "abs" or "emi". Used to construct ``b_mps``.
+        m_max (int): maximal bond dimension of the Chebyshev vectors.
+        h_mpo (:class:`~renormalizer.mps.Mpo`): system Hamiltonian. Default is ``Mpo(model)``.
+        b_mps (:class:`~renormalizer.mps.Mps`): the vector :math:`|b\rangle`.
+            Default is the dipole operator applied on the ground state (Holstein model).
+        e0 (float): the energy of the initial state. The frequency is relative to ``e0``.
+            If ``b_mps`` is not provided, the ground state energy is used.
+        e_range (tuple): the lower and upper bounds of the eigenvalues of ``h_mpo``
+            in the quantum number sector of ``b_mps``. If not provided, calculated by DMRG.
+        epsilon (float): the safety margin of the rescaled spectrum, default: 0.025.
+        compress_config (:class:`~renormalizer.utils.CompressConfig`): the compression of the Chebyshev vectors.
+            Default is the fixed bond dimension ``m_max``.
+        procedure_gs (list): the procedure of the DMRG calculations for the ground state
+            and the spectral bounds. Default: [[10, 0.4], [20, 0.2], [30, 0.1], [40, 0], [40, 0]].
+        dump_dir (str): the directory to dump the moments and the last two Chebyshev vectors.
+        job_name (str): the name of the dumped files. If both ``dump_dir`` and ``job_name`` are provided,
+            the calculation is restarted from the dumped files.
+        dump_interval (int): the number of recursion steps between the dumps.
+
+    Example::
+        spectra = SpectraChebyshev(model, "abs", 20)
+        spectra.run(1000)
+        intensity = spectra.spectra(freq_reg)
+
+    """
+    def __init__(
+        self,
+        model,
+        spectratype,
+        m_max,
+        h_mpo=None,
+        b_mps=None,
+        e0=None,
+        e_range=None,
+        epsilon=0.025,
+        compress_config=None,
+        procedure_gs=None,
+        dump_dir=None,
+        job_name=None,
+        dump_interval=10,
+    ):
+        self.model = model
+        assert spectratype in ["abs", "emi", None]
+        self.spectratype = spectratype
+        self.m_max = m_max
+        if h_mpo is None:
+            h_mpo = Mpo(model)
+        self.h_mpo = h_mpo
+        if compress_config is None:
+            compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=m_max)
+        self.compress_config = compress_config
+        if procedure_gs is None:
+            procedure_gs = [[10, 0.4], [20, 0.2], [30, 0.1], [40, 0], [40, 0]]
+        self.procedure_gs = procedure_gs
+        self.dump_dir = dump_dir
+        self.job_name = job_name
+        self.dump_interval = dump_interval
+
+        # the moments
+        self._moments = []
+        # the last two Chebyshev vectors
+        self.t_prev: Mps = None
+        self.t_cur: Mps = None
+        # the index of t_cur
+        self.n_vectors = 0
+        self._dumped_files = []
+
+        if self._defined_output_path and os.path.exists(self._moments_path):
+            self.load()
+            return
+
+        if b_mps is None:
+            b_mps, e0 = self.init_b_mps()
+        elif e0 is None:
+            e0 = 0
+        self.e0 = e0
+        b_mps = b_mps.copy()
+        if b_mps.coeff != 1:
+            b_mps.scale(b_mps.coeff, inplace=True)
+            b_mps.coeff = 1
+        b_mps.compress_config = self.compress_config
+        self.b_mps = b_mps
+
+        if e_range is None:
+            e_range = self.energy_range()
+        e_min, e_max = e_range
+        assert e_min < e_max
+        self.e_center = (e_max + e_min) / 2
+        self.half_width = (e_max - e_min) / (2 - epsilon)
+        logger.info(f"Spectral range: [{e_min}, {e_max}], e0: {e0}")
+
+    def init_b_mps(self):
+        # b = dipole * \psi_0. Only support Holstein model 0/1 exciton manifold
+        if self.spectratype == "abs":
+            nexciton = 0
+            dipoletype = r"a^\dagger"
+        elif self.spectratype == "emi":
+            nexciton = 1
+            dipoletype = "a"
+        else:
+            assert False
+        energy, mps = self._optimize(self.h_mpo, nexciton)
+        dipole_mpo = Mpo.onsite(self.model, dipoletype, dipole=True)
+        return dipole_mpo.apply(mps, canonicalise=True), energy
+
+    def energy_range(self):
+        # the lowest and highest eigenvalues in the sector of b_mps
+        e_min, _ = self._optimize(self.h_mpo, self.b_mps.qntot)
+        e_max, _ = self._optimize(self.h_mpo.scale(-1), self.b_mps.qntot)
+        return e_min, -e_max
+
+    def _optimize(self, mpo, qntot):
+        mps = Mps.random(self.model, qntot, self.procedure_gs[0][0], percent=1.0)
+        mps.optimize_config = OptimizeConfig(procedure=self.procedure_gs)
+        mps.optimize_config.method = "2site"
+        energies, mps = gs.optimize_mps(mps, mpo)
+        return min(energies), mps
+
+    @property
+    def h_scaled(self) -> Mpo:
+        # (H - c) / a
+        if getattr(self, "_h_scaled", None) is None:
+            identity = Mpo.identity(self.model).scale(-self.e_center)
+            self._h_scaled = self.h_mpo.add(identity).scale(1 / self.half_width)
+        return self._h_scaled
+
+    @property
+    def moments(self) -> np.ndarray:
+        return np.array(self._moments)
+
+    def _apply_h(self, mps):
+        new_mps = self.h_scaled.contract(mps)
+        new_mps.compress_config = self.compress_config
+        return new_mps
+
+    def run(self, n_moments: int) -> np.ndarray:
+        r"""
+        Calculate the moments until there are at least ``n_moments`` moments.
+        Calling the function again with a larger ``n_moments`` continues the recursion.
+
+        Parameters
+        ----------
+        n_moments : int
+            The number of moments.
+
+        Returns
+        -------
+        moments : np.ndarray
+            All moments calculated.
+        """
+        if self.t_cur is None:
+            self.t_cur = self.b_mps
+            self._moments.append(_overlap(self.b_mps, self.b_mps).real)
+        nsteps = 0
+        while len(self._moments) < n_moments:
+            mu0 = self._moments[0]
+            if self.n_vectors == 0:
+                new_mps = self._apply_h(self.t_cur)
+                self._moments.append(_overlap(self.b_mps, new_mps).real)
+            else:
+                new_mps = self._apply_h(self.t_cur).scale(2).add(self.t_prev.scale(-1))
+                new_mps.canonicalise()
+                new_mps.compress()
+                mu1 = self._moments[1]
+                self._moments.append(2 * _overlap(new_mps, self.t_cur).real - mu1)
+            self.t_prev, self.t_cur = self.t_cur, new_mps
+            self.n_vectors += 1
+            self._moments.append(2 * _overlap(new_mps, new_mps).real - mu0)
+            nsteps += 1
+            logger.debug(f"Chebyshev vector {self.n_vectors}, bond dims: {new_mps.bond_dims}")
+            if nsteps % self.dump_interval == 0:
+                self.dump()
+            if np.abs(self._moments[-1]) > 10 * mu0:
+                raise ValueError("Chebyshev moments diverged. The spectral range is too narrow.")
+        logger.info(f"{len(self._moments)} Chebyshev moments calculated")
+        if nsteps != 0:
+            self.dump()
+        return self.moments
+
+    def spectra(self, freq, kernel: str = "jackson", lorentz_lambda: float = 4.0, n_moments: int = None):
+        r"""
+        Reconstruct the spectrum
+
+        .. math::
+            I(\omega) = \frac{1}{\pi a \sqrt{1 - x^2}} \left[g_0 \mu_0 + 2 \sum_{n=1}^{N-1} g_n \mu_n T_n(x) \right]
+
+        where :math:`x = (\omega + e_0 - c) / a`.
+
+        Parameters
+        ----------
+        freq : array_like
+            The frequencies relative to ``e0``.
+        kernel : str
+            See :func:`chebyshev_kernel`.
+        lorentz_lambda : float
+            The parameter of the Lorentz kernel.
+        n_moments : int, optional
+            The number of moments used. Default is all calculated moments.
+
+        Returns
+        -------
+        intensity : np.ndarray
+            The intensity at each frequency. The integral over the frequency is :math:`\langle b | b \rangle`.
+        """
+        moments = self.moments[:n_moments]
+        if len(moments) == 0:
+            raise ValueError("No moment calculated. Call `run` first.")
+        freq = np.asarray(freq, dtype=float)
+        x = (freq + self.e0 - self.e_center) / self.half_width
+        inside = np.abs(x) < 1
+        xin = x[inside]
+        coeff = moments * chebyshev_kernel(len(moments), kernel, lorentz_lambda)
+        coeff[1:] *= 2
+        # T_n(x) = cos(n arccos(x))
+        tn = np.cos(np.outer(np.arange(len(moments)), np.arccos(xin)))
+        intensity = np.zeros_like(x)
+        intensity[inside] = coeff @ tn / (np.pi * self.half_width * np.sqrt(1 - xin ** 2))
+        return intensity
+
+    @property
+    def _defined_output_path(self):
+        return self.dump_dir is not None and self.job_name is not None
+
+    @property
+    def _moments_path(self):
+        return os.path.join(self.dump_dir, self.job_name + "_chebyshev.npz")
+
+    def _vector_path(self, n):
+        return os.path.join(self.dump_dir, f"{self.job_name}_chebyshev_{n}.mps")
+
+    def dump(self):
+        # The vectors are dumped first with their indices in the file names
+        # and the moments file refers to them, so the files are always consistent
+        if not self._defined_output_path:
+            return
+        vector_files = []
+        for n, mps in [(self.n_vectors - 1, self.t_prev), (self.n_vectors, self.t_cur)]:
+            if mps is None:
+                continue
+            fname = self._vector_path(n)
+            if fname not in self._dumped_files:
+                mps.dump(fname)
+            vector_files.append(fname)
+        tmp_path = self._moments_path + ".tmp.npz"
+        np.savez(tmp_path, moments=self.moments, n_vectors=self.n_vectors, e0=self.e0,
+                 e_center=self.e_center, half_width=self.half_width)
+        os.replace(tmp_path, self._moments_path)
+        for fname in glob.glob(self._vector_path("*")):
+            if fname not in vector_files:
+                os.remove(fname)
+        self._dumped_files = vector_files
+
+    def load(self):
+        logger.info(f"Restart from {self._moments_path}")
+        with np.load(self._moments_path) as f:
+            self._moments = f["moments"].tolist()
+            self.n_vectors = int(f["n_vectors"])
+            self.e0 = float(f["e0"])
+            self.e_center = float(f["e_center"])
+            self.half_width = float(f["half_width"])
+        self.t_cur = Mps.load(self.model, self._vector_path(self.n_vectors))
+        # b_mps is only required to calculate the first moment
+        self.b_mps = self.t_cur if self.n_vectors == 0 else None
+        if 0 < self.n_vectors:
+            self.t_prev = Mps.load(self.model, self._vector_path(self.n_vectors - 1))
+        for mps in [self.t_prev, self.t_cur]:
+            if mps is not None:
+                mps.compress_config = self.compress_config
+        self._dumped_files = [self._vector_path(n) for n in [self.n_vectors - 1, self.n_vectors] if 0 <= n]
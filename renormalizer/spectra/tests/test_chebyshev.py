@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+
+from renormalizer.mps import Mpo
+from renormalizer.spectra.chebyshev import SpectraChebyshev, chebyshev_kernel
+from renormalizer.tests.parameter import custom_model
+
+model = custom_model(np.array([[0, -0.1], [-0.1, 0]]) / 27.2, [3, 3], nmols=2)
+
+
+def exact_moments(spectra, n_moments):
+    e, v = np.linalg.eigh(Mpo(model).todense())
+    weights = np.abs(v.T @ spectra.b_mps.todense()) ** 2
+    x = np.clip((e - spectra.e_center) / spectra.half_width, -1, 1)
+    return np.array([weights @ np.cos(n * np.arccos(x)) for n in range(n_moments)])
+
+
+@pytest.mark.parametrize("spectratype", ["abs", "emi"])
+def test_moments(spectratype):
+    spectra = SpectraChebyshev(model, spectratype, 64)
+    moments = spectra.run(40)
+    assert len(moments) >= 40
+    assert np.allclose(moments, exact_moments(spectra, len(moments)))
+
+    # Gauss-Chebyshev quadrature. The kernels conserve the total intensity
+    npoints = 1000
+    x = np.cos(np.pi * (np.arange(npoints) + 0.5) / npoints)
+    freq = x * spectra.half_width + spectra.e_center - spectra.e0
+    for kernel in ["jackson", "lorentz"]:
+        intensity = spectra.spectra(freq, kernel)
+        integral = np.sum(intensity * np.sqrt(1 - x ** 2)) * np.pi / npoints * spectra.half_width
+        assert integral == pytest.approx(moments[0])
+        assert np.all(intensity > -1e-8 * np.max(intensity))
+    # the center of the spectrum
+    sign = 1 if spectratype == "abs" else -1
+    assert sign * freq[np.argmax(spectra.spectra(freq))] > 0
+
+
+def test_restart(tmp_path):
+    spectra = SpectraChebyshev(model, "abs", 64)
+    std = spectra.run(30)
+
+    kwargs = dict(b_mps=spectra.b_mps, e0=spectra.e0, dump_dir=str(tmp_path), job_name="abs", dump_interval=3,
+                  e_range=(spectra.e_center - spectra.half_width, spectra.e_center + spectra.half_width), epsilon=0)
+    spectra1 = SpectraChebyshev(model, "abs", 64, **kwargs)
+    spectra1.run(11)
+    # restarted from the dumped files
+    spectra2 = SpectraChebyshev(model, "abs", 64, **kwargs)
+    assert np.allclose(spectra2.moments, spectra1.moments)
+    assert np.allclose(spectra2.run(30), std)
+    # only the last two vectors are kept
+    assert len(list(tmp_path.glob("*.mps"))) == 2
+
+
+def test_kernel():
+    for kernel in ["jackson", "lorentz", "dirichlet"]:
+        g = chebyshev_kernel(100, kernel)
+        assert g[0] == pytest.approx(1)
+        assert np.all(np.diff(g) <= 1e-12)
+    with pytest.raises(ValueError):
+        chebyshev_kernel(100, "foo")
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
 # Author: Jiajun Ren <jiajunren0522@gmail.com>
 
-from renormalizer.transport.kubo import TransportKubo
+from renormalizer.transport.kubo import TransportKubo, TransportKuboEnsemble
 from renormalizer.transport.dynamics import ChargeDiffusionDynamics, InitElectron, EDGE_THRESHOLD
@@ -10,7 +10,7 @@ from functools import partial
 
 from scipy.linalg import logm
 
-from renormalizer.mps import Mpo, Mps, MpDm, ThermalProp, load_thermal_state
+from renormalizer.mps import Mpo, Mps, MpDm, ThermalProp, load_thermal_state, ObservablePlan
 from renormalizer.model import HolsteinModel
 from renormalizer.utils import TdMpsJob, Quantity, CompressConfig, EvolveConfig
 
@@ -116,6 +116,9 @@ class ChargeDiffusionDynamics(TdMpsJob):
         # entropy at each bond
         self.bond_vn_entropy_array = []
         self.coherent_length_array = []
+        # the observables calculated at every step in one sweep.
+        # Constructed after the Hamiltonian MPO is available
+        self.observable_plan: ObservablePlan = None
 
         if dump_dir is not None and job_name is not None:
             self.thermal_dump_path = os.path.join(dump_dir, job_name + '_impdm.npz')
@@ -198,15 +201,26 @@ class ChargeDiffusionDynamics(TdMpsJob):
         init_mp.canonicalise()
         return init_mp
 
+    def _construct_observable_plan(self):
+        plan = ObservablePlan().add_expectation("energy", self.mpo)
+        if self.reduced_density_matrices is not None:
+            plan.add_two_point("rdm", r"a^\dagger", "a", self.model.e_dofs, hermitian=True)
+        else:
+            plan.add_local("e_occupations", r"a^\dagger a", self.model.e_dofs)
+        plan.add_local("ph_occupations", "n", self.model.v_dofs)
+        plan.add_bond_entropy()
+        return plan
+
     def process_mps(self, mps):
-        new_energy = mps.expectation(self.mpo)
+        if self.observable_plan is None:
+            self.observable_plan = self._construct_observable_plan()
+        results = self.observable_plan.evaluate(mps)
+        new_energy = results["energy"]
         self.energies.append(new_energy)
         logger.debug(f"Energy: {new_energy}")
 
         if self.reduced_density_matrices is not None:
-            logger.debug("Calculating reduced density matrix")
-            rdm = mps.calc_edof_rdm()
-            logger.debug("Calculate reduced density matrix finished")
+            rdm = results["rdm"]
             self.reduced_density_matrices.append(rdm)
 
             # k_space transform matrix
@@ -228,13 +242,13 @@ class ChargeDiffusionDynamics(TdMpsJob):
         if rdm is not None:
             e_occupations = np.diag(rdm).real
         else:
-            e_occupations = mps.e_occupations
+            e_occupations = results["e_occupations"]
         self.e_occupations_array.append(e_occupations)
         self.r_square_array.append(calc_r_square(e_occupations))
-        self.ph_occupations_array.append(mps.ph_occupations)
+        self.ph_occupations_array.append(results["ph_occupations"])
         logger.info(f"e occupations: {self.e_occupations_array[-1]}")
 
-        bond_vn_entropy = mps.calc_bond_entropy()
+        bond_vn_entropy = results["bond_entropy"]
         logger.info(f"bond entropy: {bond_vn_entropy}")
         self.bond_vn_entropy_array.append(bond_vn_entropy)
 
@@ -7,6 +7,8 @@ import scipy.integrate
 
 from renormalizer.mps import MpDm, Mpo, BraKetPair, ThermalProp, load_thermal_state
 from renormalizer.mps.backend import np
+from renormalizer.mps.thermal_sampling import ThermalPureStateProp, ThermalStateEnsemble, random_phase_state, \
+    weighted_mean
 from renormalizer.utils.constant import mobility2au
 from renormalizer.utils import TdMpsJob, Quantity, EvolveConfig, CompressConfig
 from renormalizer.model import Model
@@ -215,7 +217,11 @@ class TransportKubo(TdMpsJob):
         else:
             self.j_oper2 = None
 
-    def init_mps(self):
+    def init_thermal_state(self):
+        r"""
+        Obtain :math:`e^{-\beta \hat H / 2}`, either loaded from ``thermal_dump_path``
+        or by imaginary time propagation.
+        """
         # first try to load
         if self.thermal_dump_path is not None:
             mpdm = load_thermal_state(self.model, self.thermal_dump_path)
@@ -235,9 +241,13 @@ class TransportKubo(TdMpsJob):
             mpdm = tp.latest_mps
             if self.thermal_dump_path is not None:
                 mpdm.dump(self.thermal_dump_path)
+        return mpdm
+
+    def init_mps(self):
+        mpdm = self.init_thermal_state()
         mpdm.compress_config = self.compress_config
         e = mpdm.expectation(self.h_mpo)
-        self.h_mpo = Mpo(self.model, offset=Quantity(e))
+        self.h_mpo = self.h_mpo.with_offset(Quantity(e))
         mpdm.evolve_config = self.evolve_config
         logger.debug("Applying current operator")
         ket_mpdm = self.j_oper.contract(mpdm).normalize("mps_norm_to_coeff")
@@ -363,3 +373,112 @@ class TransportKubo(TdMpsJob):
         mobility_in_au = inte / self.temperature.as_au()
         mobility = mobility_in_au / mobility2au
         return mobility_in_au, mobility
+
+
+class _KuboTrajectory(TransportKubo):
+    # TransportKubo starting from a random phase state rather than the maximally entangled MpDm
+    def __init__(self, rng, *args, **kwargs):
+        self.rng = rng
+        # the weight of the thermal pure state
+        self.log_weight = None
+        super().__init__(*args, **kwargs)
+
+    def init_thermal_state(self):
+        mps = random_phase_state(self.model, self.rng)
+        mps.compress_config = self.compress_config
+        tp = ThermalPureStateProp(mps, evolve_config=self.ievolve_config)
+        tp.evolve(None, self.insteps, self.temperature.to_beta() / 2j)
+        self.log_weight = tp.log_weights[-1]
+        return tp.latest_mps
+
+    def stop_evolve_criteria(self):
+        # all trajectories should share the same time steps
+        return False
+
+
+class TransportKuboEnsemble(ThermalStateEnsemble):
+    r"""
+    Calculate mobility via Green-Kubo formula as :class:`TransportKubo`, but with
+    :math:`e^{-\beta \hat H / 2}` replaced by an ensemble of thermal pure states
+    :math:`e^{-\beta \hat H / 2} |r\rangle` where :math:`|r\rangle` are random phase states.
+    See :mod:`renormalizer.mps.thermal_sampling`.
+    The trajectories are pure states, so the bond dimension required is usually much smaller than that of
+    the density matrix, and the trajectories are run in parallel by ``nprocs`` processes.
+
+    Args:
+        model (:class:`~renormalizer.model.Model`): system information.
+        temperature (:class:`~renormalizer.utils.quantity.Quantity`): simulation temperature.
+            Zero temperature is not supported.
+        nsamples (int): the number of trajectories run in every call of :meth:`evolve`.
+        distance_matrix (:class:`np.ndarray`): see :class:`TransportKubo`.
+        insteps (int): steps for imaginary time propagation.
+        ievolve_config (:class:`~renormalizer.utils.configs.EvolveConfig`): config when carrying out imaginary time propagation.
+        compress_config (:class:`~renormalizer.utils.configs.CompressConfig`): config when compressing MPS.
+        evolve_config (:class:`~renormalizer.utils.configs.EvolveConfig`): config when carrying out real time propagation.
+            The time steps of all trajectories should be the same.
+        nprocs (int): the number of processes to run the trajectories.
+        seed (int): the seed of the random phases.
+        dump_dir (str): the directory for numerical result output.
+        job_name (str): the name of the calculation job which determines the file name of the numerical result output.
+    """
+    def __init__(self, model: Model, temperature: Quantity, nsamples: int, distance_matrix: np.ndarray = None,
+                 insteps: int=1, ievolve_config=None, compress_config=None, evolve_config=None,
+                 nprocs: int=1, seed: int=None, dump_dir: str=None, job_name: str=None):
+        if temperature == 0:
+            raise ValueError("Can't set temperature to 0.")
+        super().__init__(model, nsamples, nprocs=nprocs, seed=seed, dump_dir=dump_dir, job_name=job_name)
+        self.temperature = temperature
+        self.distance_matrix = distance_matrix
+        self.insteps = insteps
+        self.ievolve_config = ievolve_config
+        self.compress_config = compress_config
+        self.evolve_config = evolve_config
+        self.auto_corr = self.auto_corr_err = None
+        self.auto_corr_decomposition = self.auto_corr_decomposition_err = None
+        self.mobility_in_au = self.mobility_in_au_err = None
+
+    def run_trajectory(self, rng, evolve_dt, nsteps, evolve_time):
+        def copy(config):
+            return None if config is None else config.copy()
+        kubo = _KuboTrajectory(rng, self.model, self.temperature, distance_matrix=self.distance_matrix,
+                               insteps=self.insteps, ievolve_config=copy(self.ievolve_config),
+                               compress_config=copy(self.compress_config), evolve_config=copy(self.evolve_config))
+        kubo.evolve(evolve_dt, nsteps, evolve_time)
+        return {
+            "evolve_times": kubo.evolve_times,
+            "log_weight": kubo.log_weight,
+            "auto_corr": kubo.auto_corr,
+            "auto_corr_decomposition": kubo.auto_corr_decomposition,
+            "mobility_in_au": kubo.calc_mobility()[0],
+        }
+
+    def update_statistics(self):
+        log_weights = np.array([sample["log_weight"] for sample in self.samples])
+
+        def average(key):
+            return weighted_mean(np.array([sample[key] for sample in self.samples]), log_weights)
+
+        self.auto_corr, self.auto_corr_err = average("auto_corr")
+        self.auto_corr_decomposition, self.auto_corr_decomposition_err = average("auto_corr_decomposition")
+        self.mobility_in_au, self.mobility_in_au_err = average("mobility_in_au")
+        logger.info(f"Mobility: {self.mobility_in_au / mobility2au} +/- {self.mobility_in_au_err / mobility2au}")
+
+    def calc_mobility(self):
+        return self.mobility_in_au, self.mobility_in_au / mobility2au
+
+    def calc_mobility_err(self):
+        return self.mobility_in_au_err, self.mobility_in_au_err / mobility2au
+
+    def get_dump_dict(self):
+        dump_dict = dict()
+        dump_dict["mol list"] = self.model.to_dict()
+        dump_dict["temperature"] = self.temperature.as_au()
+        dump_dict["samples"] = len(self.samples)
+        dump_dict["time series"] = self.evolve_times
+        dump_dict["auto correlation"] = self.auto_corr
+        dump_dict["auto correlation error"] = self.auto_corr_err
+        dump_dict["auto correlation decomposition"] = self.auto_corr_decomposition
+        dump_dict["auto correlation decomposition error"] = self.auto_corr_decomposition_err
+        dump_dict["mobility"] = self.calc_mobility()[1]
+        dump_dict["mobility error"] = self.calc_mobility_err()[1]
+        return dump_dict
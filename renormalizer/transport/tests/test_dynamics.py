@@ -3,6 +3,7 @@
 #         Weitang Li <liwt31@163.com>
 
 import os
+import json
 
 import pytest
 
@@ -10,7 +11,7 @@ from renormalizer.model import Phonon, Mol, HolsteinModel
 from renormalizer.mps import Mps, Mpo, ThermalProp, MpDm
 from renormalizer.mps.gs import optimize_mps
 from renormalizer.transport import ChargeDiffusionDynamics
-from renormalizer.utils import Quantity
+from renormalizer.utils import Quantity, load_results
 from renormalizer.utils import (
     BondDimDistri,
     CompressCriteria,
@@ -171,3 +172,65 @@ def test_band_limit_finite_t(
     ct2 = ChargeDiffusionDynamics(model, temperature=low_t, stop_at_edge=False)
     ct2.evolve(evolve_dt, nsteps)
     assert ct1.is_similar(ct2)
+
+
+def test_checkpoint(tmp_path):
+    evolve_config = EvolveConfig(method=EvolveMethod.tdvp_ps, guess_dt=0.1, adaptive=True)
+    ct = ChargeDiffusionDynamics(
+        band_limit_model, evolve_config=evolve_config, stop_at_edge=False,
+        dump_dir=str(tmp_path), job_name="checkpoint",
+    )
+    ct.checkpoint_interval = 2
+    ct.evolve(evolve_dt=2., nsteps=2)
+    assert os.path.exists(ct.checkpoint_path)
+    path = ct.dump_checkpoint(str(tmp_path / "step2.pkl.gz"))
+    ct.evolve(evolve_dt=2., nsteps=2)
+
+    resumed = ChargeDiffusionDynamics.resume(path)
+    assert len(resumed.evolve_times) == 3
+    resumed.evolve(evolve_dt=2., nsteps=2)
+    assert np.allclose(resumed.evolve_times, ct.evolve_times)
+    assert np.allclose(resumed.r_square_array, ct.r_square_array)
+
+
+@pytest.mark.parametrize("environ_storage", ("disk", "lru"))
+def test_checkpoint_environ_storage(tmp_path, environ_storage):
+    compress_config = CompressConfig(environ_storage=environ_storage, dump_matrix_dir=str(tmp_path))
+    evolve_config = EvolveConfig(method=EvolveMethod.tdvp_ps)
+    ct = ChargeDiffusionDynamics(
+        band_limit_model, compress_config=compress_config, evolve_config=evolve_config,
+        stop_at_edge=False, dump_dir=str(tmp_path), job_name="checkpoint",
+    )
+    ct.evolve(evolve_dt=2., nsteps=2)
+    assert ct.latest_mps._tdvp_environ is not None
+    path = ct.dump_checkpoint()
+    ct.evolve(evolve_dt=2., nsteps=2)
+
+    resumed = ChargeDiffusionDynamics.resume(path)
+    assert resumed.latest_mps._tdvp_environ is None
+    resumed.evolve(evolve_dt=2., nsteps=2)
+    assert np.allclose(resumed.evolve_times, ct.evolve_times)
+    assert np.allclose(resumed.r_square_array, ct.r_square_array)
+
+
+def test_dump_hdf5(tmp_path):
+    evolve_config = EvolveConfig(method=EvolveMethod.tdvp_ps)
+    ct = ChargeDiffusionDynamics(
+        band_limit_model, evolve_config=evolve_config, stop_at_edge=False,
+        dump_dir=str(tmp_path), job_name="hdf5",
+    )
+    ct.dump_format = "hdf5"
+    ct.dump_flush_interval = 2
+    ct.checkpoint_interval = 2
+    ct.evolve(evolve_dt=2., nsteps=2)
+    assert ct.dump_path.endswith("hdf5.h5")
+    res = load_results(ct.dump_path)
+    assert np.allclose(res["time series"], ct.evolve_times)
+    assert np.allclose(res["r square array"], ct.r_square_array)
+    assert res["mol list"] == json.loads(json.dumps(band_limit_model.to_dict(), default=lambda x: x.tolist()))
+    # the file is appended by the resumed job
+    resumed = ChargeDiffusionDynamics.resume(ct.checkpoint_path)
+    resumed.evolve(evolve_dt=2., nsteps=2)
+    res = load_results(ct.dump_path)
+    assert len(res["time series"]) == 5
+    assert np.allclose(res["electron occupations array"], resumed.e_occupations_array)
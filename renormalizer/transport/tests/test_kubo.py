@@ -8,7 +8,7 @@ from renormalizer.model import Phonon, Mol, HolsteinModel, Model
 from renormalizer.model.basis import BasisSimpleElectron, BasisSHO
 from renormalizer.model.op import Op
 from renormalizer.mps.backend import backend
-from renormalizer.transport.kubo import TransportKubo
+from renormalizer.transport.kubo import TransportKubo, TransportKuboEnsemble
 from renormalizer.utils import Quantity, CompressConfig, EvolveConfig, EvolveMethod, CompressCriteria
 from renormalizer.utils.qutip_utils import get_clist, get_blist, get_holstein_hamiltonian, get_qnidx, \
     get_peierls_hamiltonian
@@ -33,6 +33,27 @@ def test_holstein_kubo(scheme):
     assert np.allclose(kubo.auto_corr, qutip_res, rtol=rtol)
 
 
+def test_holstein_kubo_ensemble():
+    ph = Phonon.simple_phonon(Quantity(1), Quantity(1), 2)
+    mol = Mol(Quantity(0), [ph])
+    model = HolsteinModel([mol] * 3, Quantity(1), 3)
+    temperature = Quantity(1, "a.u.")
+    compress_config = CompressConfig(CompressCriteria.fixed, max_bonddim=24)
+    kubo = TransportKubo(model, temperature, compress_config=compress_config, insteps=4)
+    kubo.evolve(nsteps=10, evolve_time=2)
+    ensemble = TransportKuboEnsemble(model, temperature, 16, compress_config=compress_config, insteps=4,
+                                     nprocs=2, seed=2020)
+    ensemble.evolve(nsteps=10, evolve_time=2)
+    assert np.allclose(ensemble.evolve_times, kubo.evolve_times)
+    diff = ensemble.auto_corr - kubo.auto_corr
+    assert np.all(np.abs(diff.real) < 4 * ensemble.auto_corr_err.real)
+    assert np.all(np.abs(diff.imag) < 4 * ensemble.auto_corr_err.imag + 1e-8)
+    # the ensemble is extended by another call
+    ensemble.evolve(nsteps=10, evolve_time=2)
+    assert len(ensemble.samples) == 32
+    assert abs(ensemble.calc_mobility()[0] - kubo.calc_mobility()[0]) < 4 * ensemble.calc_mobility_err()[0]
+
+
 def get_qutip_holstein_kubo(model, temperature, time_series):
 
     nsites = len(model)
@@ -15,5 +15,7 @@ from renormalizer.utils.configs import (
     OFS,
 )
 
+from renormalizer.utils.profiler import profiler, Profiler
 from renormalizer.utils.tdmps import TdMpsJob
+from renormalizer.utils.result_store import ResultStore, load_results
 
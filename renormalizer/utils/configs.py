@@ -120,6 +120,34 @@ class CompressConfig:
 
     dump_matrix_dir : str, optional
         The directory to dump matrix when matrix is larger than ``dump_matrix_size``.
+        The environment tensors are also stored in this directory if ``environ_storage`` is not ``"memory"``.
+
+    environ_storage : str, optional
+        Where the L/R environment tensors in `renormalizer.mps.lib.Environ` are stored.
+        The default is ``"memory"``.
+
+        - ``memory``: keep all tensors in memory.
+        - ``disk``: store every tensor as a ``.npy`` file in ``dump_matrix_dir``
+          and read it back by memory mapping.
+        - ``lru``: store the tensors in disk and keep the ``environ_cache_size`` most recently used
+          tensors in memory. The next tensor in the sweep is prefetched by a background thread.
+
+    environ_cache_size : int, optional
+        Number of environment tensors kept in memory when ``environ_storage="lru"``. Default is 4.
+
+    svd_threads : int, optional
+        Number of threads to decompose the quantum number blocks concurrently in
+        SVD/QR (`renormalizer.mps.svd_qn.svd_qn`), which is used in compression, canonicalisation
+        and DMRG. The BLAS threads are divided among the threads if ``threadpoolctl``
+        is installed. Useful when there are many small blocks, such as in
+        multi-exciton or ab initio models. Default is 1 (no additional threads).
+
+    contract_algo : str, optional
+        The default algorithm of `renormalizer.mps.Mpo.contract` to compress ``mpo @ mps``,
+        which is used in the propagation and compression evolution and the Runge-Kutta evolution.
+        ``svd``, ``variational``, ``zipup`` or ``density``. ``zipup`` and ``density`` do not form
+        the full product of the MPO and the MPS and are recommended if memory is limited.
+        The default is ``svd``.
 
     ofs : `OFS`, optional
         Whether optimize the DOF ordering by OFS. The default value is ``None`` which means does not perform OFS.
@@ -149,7 +177,11 @@ class CompressConfig:
         dump_matrix_size = np.inf,
         dump_matrix_dir = "./",
         ofs: OFS = None,
-        ofs_swap_jw: bool = False
+        ofs_swap_jw: bool = False,
+        environ_storage: str = "memory",
+        environ_cache_size: int = 4,
+        svd_threads: int = 1,
+        contract_algo: str = "svd",
     ):
         # two sets of criteria here: threshold and max_bonddimension
         # `criteria` is to determine which to use
@@ -184,6 +216,16 @@ class CompressConfig:
         self.ofs: OFS = ofs
         self.ofs_swap_jw: bool = ofs_swap_jw
 
+        assert environ_storage in ["memory", "disk", "lru"]
+        self.environ_storage: str = environ_storage
+        self.environ_cache_size: int = environ_cache_size
+
+        assert svd_threads >= 1
+        self.svd_threads: int = svd_threads
+
+        assert contract_algo in ["svd", "variational", "zipup", "density"]
+        self.contract_algo: str = contract_algo
+
     @property
     def threshold(self):
         return self._threshold
@@ -318,6 +360,10 @@ class OptimizeConfig:
         # inverse = 1.0 or -1.0
         # -1.0 to get the largest eigenvalue
         self.inverse = 1.0
+        # contract only the symmetry-allowed blocks in the iterative eigensolver
+        # with `renormalizer.mps.block_sparse.BlockSparseTensor`.
+        # Useful when the quantum numbers split the tensors into many blocks
+        self.block_sparse = False
 
 
 class EvolveMethod(Enum):
@@ -400,6 +446,14 @@ class EvolveConfig:
         self.force_ovlp: bool = force_ovlp
         # auto switch between mu_vmf and vmf for a higher efficiency
         self.vmf_auto_switch: bool = True
+        # the maximum size of the Krylov subspace in tdvp_ps and tdvp_ps2.
+        # The Lanczos iteration is restarted if the subspace is larger
+        self.krylov_max_size: int = 100
+        # the storage of the Krylov vectors shared by the time steps. Created in the first step
+        self.krylov_workspace = None
+        # carry the environments of tdvp_ps and tdvp_ps2 to the next time step and only
+        # recontract the stale ones. Costs the memory of one set of environments per evolved MPS
+        self.reuse_environ: bool = True
 
     @property
     def is_tdvp(self):
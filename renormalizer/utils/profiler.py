@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from functools import wraps
+from typing import Callable, Dict, Iterable, List
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_KEY = "RENO_PROFILE"
+
+_NULL_REGION = nullcontext()
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
+
+
+def max_rss_mb():
+    """
+    The peak resident memory of the process in MB. ``None`` if not available.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS and KB on Linux
+    return rss / 1024 ** 2 if sys.platform == "darwin" else rss / 1024
+
+
+class _Region:
+
+    __slots__ = ("profiler", "name", "args", "counts", "start")
+
+    def __init__(self, profiler, name, args):
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+        self.counts = {}
+        self.start = None
+
+    def __enter__(self):
+        self.profiler._stack().append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        end = time.perf_counter_ns()
+        stack = self.profiler._stack()
+        # the regions are always closed in order except for abandoned generators
+        stack.remove(self)
+        self.profiler._record(self, end)
+        return False
+
+
+class Profiler:
+    r"""
+    Opt-in instrumentation of the hot paths of the algorithms.
+
+    When enabled, the time spent in the instrumented regions, such as the environment updates,
+    the eigensolvers, the Krylov and ODE propagators and ``svd_qn``, is recorded with the site index,
+    the number of iterations, the number and the estimated FLOPs of the effective Hamiltonian
+    contractions constructed by :func:`~renormalizer.mps.hop_expr.hop_expr`, and the peak memory of the process.
+    The counts are inclusive, i.e., the contractions in an eigensolver are counted in
+    the enclosing site region as well.
+
+    The events are written in the `Chrome trace format <https://docs.google.com/document/d/1CvAClvFfyA5R-PhYUmn5OOQtYMH4h6I0nSsKchNAySU>`_
+    if the path ends with ``.json``, which can be viewed by ``chrome://tracing`` or Perfetto,
+    and in JSON lines otherwise, one event per line. The events are streamed to the file so
+    the trace of a crashed job is kept. The global instance ``profiler`` is used by the package.
+    Setting the environment variable ``RENO_PROFILE`` to a path enables it for the whole process.
+
+    When disabled, an instrumented region costs one attribute lookup.
+    """
+    def __init__(self):
+        self.enabled: bool = False
+        self.path: str = None
+        # the events kept in memory if ``path`` is ``None``
+        self.events: List[Dict] = []
+        self._stats: Dict[str, Dict] = defaultdict(lambda: defaultdict(float))
+        self._fout = None
+        self._nevents = 0
+        self._chrome = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._t0 = 0
+
+    def start(self, path: str = None):
+        """
+        Start recording.
+
+        Parameters
+        ----------
+        path : str, optional
+            The path of the trace file. If ``None``, the events are kept in ``events``.
+        """
+        self.stop()
+        self.events = []
+        self._stats.clear()
+        self._nevents = 0
+        self.path = path
+        if path is not None:
+            self._chrome = path.endswith(".json")
+            self._fout = open(path, "w")
+            if self._chrome:
+                self._fout.write("[\n")
+        self._t0 = time.perf_counter_ns()
+        self.enabled = True
+
+    def stop(self):
+        """
+        Stop recording and close the trace file. The events and the summary are kept.
+        """
+        self.enabled = False
+        with self._lock:
+            if self._fout is not None:
+                if self._chrome:
+                    self._fout.write("\n]\n")
+                self._fout.close()
+                self._fout = None
+
+    def _stack(self) -> List[_Region]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def region(self, name: str, **args):
+        """
+        The context manager of an instrumented region.
+
+        Parameters
+        ----------
+        name : str
+            The name of the region.
+        args :
+            The arguments recorded with the event, such as the site index.
+        """
+        if not self.enabled:
+            return _NULL_REGION
+        return _Region(self, name, args)
+
+    def sweep(self, name: str, sites: Iterable, **args):
+        """
+        Iterate over ``sites`` with each iteration recorded as a region with
+        the argument ``site``. Used as ``for imps in profiler.sweep("tdvp_ps", mps.iter_idx_list(full=True))``.
+        """
+        if not self.enabled:
+            return sites
+        return self._sweep(name, sites, args)
+
+    def _sweep(self, name, sites, args):
+        for site in sites:
+            with self.region(name, site=site, **args):
+                yield site
+
+    def profile(self, name: str = None, args: Callable = None):
+        """
+        Decorator to record each call of a function as a region.
+
+        Parameters
+        ----------
+        name : str, optional
+            The name of the region. Default is the qualified name of the function.
+        args : callable, optional
+            Called with the arguments of the function and returns the ``dict`` of the arguments recorded.
+        """
+        def decorator(func):
+            region_name = func.__qualname__ if name is None else name
+
+            @wraps(func)
+            def wrapper(*a, **kw):
+                if not self.enabled:
+                    return func(*a, **kw)
+                region_args = {} if args is None else args(*a, **kw)
+                with _Region(self, region_name, region_args):
+                    return func(*a, **kw)
+            return wrapper
+        return decorator
+
+    def add(self, **counts):
+        """
+        Add the counts, such as the number of iterations, to all open regions of the current thread.
+        """
+        if not self.enabled:
+            return
+        for region in self._stack():
+            region_counts = region.counts
+            for k, v in counts.items():
+                region_counts[k] = region_counts.get(k, 0) + v
+
+    def _record(self, region: _Region, end: int):
+        dur = end - region.start
+        args = region.args
+        args.update(region.counts)
+        args["max_rss_mb"] = max_rss_mb()
+        event = {
+            "name": region.name,
+            "ph": "X",
+            "ts": (region.start - self._t0) / 1e3,
+            "dur": dur / 1e3,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            stat = self._stats[region.name]
+            stat["count"] += 1
+            stat["total"] += dur / 1e9
+            stat["max"] = max(stat["max"], dur / 1e9)
+            for k, v in region.counts.items():
+                stat[k] += v
+            if self._fout is None:
+                self.events.append(event)
+                return
+            line = json.dumps(event, default=_json_default)
+            if self._chrome and self._nevents:
+                line = ",\n" + line
+            elif not self._chrome:
+                line = line + "\n"
+            self._fout.write(line)
+            self._nevents += 1
+
+    def summary(self) -> Dict[str, Dict]:
+        """
+        The number of calls, the total and maximum time in seconds, and the sums of the
+        counts added by :meth:`add` (e.g. ``flops``) of each region.
+        """
+        with self._lock:
+            return {name: dict(stat) for name, stat in self._stats.items()}
+
+    def log_summary(self, level=logging.INFO):
+        for name, stat in sorted(self.summary().items(), key=lambda item: -item[1]["total"]):
+            others = ", ".join(f"{k}: {v:g}" for k, v in stat.items() if k not in ["count", "total", "max"])
+            logger.log(level, f"{name}: {int(stat['count'])} calls, {stat['total']:.3f} s, max {stat['max']:.3f} s"
+                              + (f", {others}" if others else ""))
+
+    def dump(self, path: str):
+        """
+        Write the events kept in memory to ``path`` in the format determined by the extension.
+        """
+        with open(path, "w") as fout:
+            if path.endswith(".json"):
+                json.dump(self.events, fout, default=_json_default)
+            else:
+                for event in self.events:
+                    fout.write(json.dumps(event, default=_json_default) + "\n")
+
+
+profiler = Profiler()
+
+if os.environ.get(PROFILE_KEY):
+    profiler.start(os.environ[PROFILE_KEY])
+
+    def _stop_profiler():
+        profiler.stop()
+        profiler.log_summary()
+    atexit.register(_stop_profiler)
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import hashlib
+from typing import Dict
+
+import numpy as np
+import h5py
+
+logger = logging.getLogger(__name__)
+
+
+# the kinds of the datasets, stored in the ``kind`` attribute of the datasets
+SERIES = "series"
+STATIC = "static"
+JSON = "json"
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, complex):
+        return [obj.real, obj.imag]
+    return str(obj)
+
+
+class ResultStore:
+    r"""
+    Append-only HDF5 store of the properties calculated in a :class:`~renormalizer.utils.TdMpsJob`.
+
+    Each value of the dumped ``dict`` is stored as a dataset named by the key. An array whose
+    first dimension is the number of time steps is stored as a chunked dataset extended along the
+    time axis, and only the new time steps are written. The other arrays are overwritten in place
+    and the values that are not arrays (such as ``dict``) are stored in JSON.
+
+    The file is kept open in the single-writer-multiple-reader (SWMR) mode of HDF5 and is flushed every
+    ``flush_interval`` appends, so the file can be read during the evolution (see :func:`load_results`)
+    and the data flushed before a crash of the job is not lost. No file is renamed, and the
+    datasets are rewritten only if the old time steps are changed.
+
+    Parameters
+    ----------
+    path : str
+        The path of the HDF5 file. An existing file is appended.
+    flush_interval : int
+        The number of appends between the flushes of the file.
+    """
+    def __init__(self, path: str, flush_interval: int = 1):
+        if flush_interval < 1:
+            raise ValueError(f"flush_interval should be positive. Got {flush_interval}")
+        self.path = path
+        self.flush_interval = flush_interval
+        self._file: h5py.File = None
+        self._unflushed = 0
+        # the last written time step of each time series dataset, to check that the old steps are unchanged
+        self._last_steps: Dict[str, np.ndarray] = {}
+        # the digest of each static or json dataset, to skip writing unchanged values
+        self._digests: Dict[str, str] = {}
+
+    def append(self, d: Dict, nsteps: int):
+        """
+        Write the new time steps in ``d``.
+
+        Parameters
+        ----------
+        d : dict
+            The properties with all time steps, usually obtained by ``get_dump_dict``.
+        nsteps : int
+            The number of the time steps.
+        """
+        if self._file is None:
+            self._open()
+        items = [(key, *self._classify(key, value, nsteps)) for key, value in d.items()]
+        new_items = [item for item in items if self._need_create(*item)]
+        if new_items and self._file.swmr_mode:
+            # datasets can not be created in the SWMR mode
+            self._open()
+        for item in new_items:
+            self._create(*item)
+        if not self._file.swmr_mode:
+            self._file.swmr_mode = True
+        for item in items:
+            self._write(*item)
+        self._unflushed += 1
+        if self.flush_interval <= self._unflushed:
+            self.flush()
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+        self._unflushed = 0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._unflushed = 0
+
+    def _open(self):
+        self.close()
+        self._file = h5py.File(self.path, "a", libver="latest")
+
+    def _classify(self, key, value, nsteps):
+        # returns the kind of the dataset, the data to write and the index of the first time step in the data
+        if not isinstance(value, (dict, str)) and value is not None:
+            ds = self._file.get(key)
+            start = 0
+            if isinstance(value, (list, tuple)) and ds is not None and ds.attrs["kind"] == SERIES \
+                    and 0 < len(ds) <= len(value):
+                # only the last written step and the new steps are converted
+                start = len(ds) - 1
+            try:
+                array = np.asarray(value[start:] if start else value)
+                if start and not np.array_equal(array[0], self._last_step(key)):
+                    # the old steps are changed
+                    start = 0
+                    array = np.asarray(value)
+            except ValueError:
+                # ragged
+                array = None
+            if array is not None and array.dtype.kind in "biufc":
+                is_series = ds.attrs["kind"] == SERIES if ds is not None else 0 < array.ndim and len(array) == nsteps
+                if is_series and 0 < array.ndim:
+                    return SERIES, array, start
+                return STATIC, np.asarray(value), 0
+        data = json.dumps(value, default=_json_default).encode()
+        return JSON, np.frombuffer(data, dtype=np.uint8), 0
+
+    def _last_step(self, key):
+        last_step = self._last_steps.get(key)
+        if last_step is None:
+            ds = self._file[key]
+            last_step = self._last_steps[key] = ds[len(ds) - 1]
+        return last_step
+
+    def _need_create(self, key, kind, array, start):
+        ds = self._file.get(key)
+        if ds is None or ds.attrs["kind"] != kind or ds.dtype != array.dtype:
+            return True
+        if kind == SERIES:
+            return ds.shape[1:] != array.shape[1:]
+        if kind == STATIC:
+            return ds.shape != array.shape
+        return False
+
+    def _create(self, key, kind, array, start):
+        if key in self._file:
+            del self._file[key]
+        self._last_steps.pop(key, None)
+        self._digests.pop(key, None)
+        if kind == STATIC:
+            ds = self._file.create_dataset(key, data=array)
+        else:
+            # chunks of about 64 KB along the time axis
+            row_bytes = max(array[:1].nbytes, 1) if kind == SERIES else 1
+            chunks = (max(1, 2 ** 16 // row_bytes),) + array.shape[1:]
+            ds = self._file.create_dataset(key, shape=(0,) + array.shape[1:], maxshape=(None,) + array.shape[1:],
+                                           dtype=array.dtype, chunks=chunks)
+        ds.attrs["kind"] = kind
+
+    def _write(self, key, kind, array, start):
+        ds = self._file[key]
+        if kind == SERIES:
+            nrows = len(ds)
+            total = start + len(array)
+            if total < nrows or (0 < nrows and not np.array_equal(array[nrows - 1 - start], self._last_step(key))):
+                # the old steps are changed. Rewrite the whole dataset
+                logger.debug(f"Rewriting {key} in {self.path}")
+                assert start == 0
+                nrows = 0
+            ds.resize(total, axis=0)
+            if nrows < total:
+                ds[nrows:] = array[nrows - start:]
+            if 0 < total:
+                self._last_steps[key] = array[-1].copy()
+            return
+        digest = hashlib.sha1(array.tobytes()).hexdigest()
+        if self._digests.get(key) == digest:
+            return
+        if kind == JSON:
+            ds.resize(len(array), axis=0)
+        ds[...] = array
+        self._digests[key] = digest
+
+    def __getstate__(self):
+        # the file is opened again after unpickling. The datasets might have been changed in between
+        state = self.__dict__.copy()
+        state["_file"] = None
+        state["_unflushed"] = 0
+        state["_last_steps"] = {}
+        state["_digests"] = {}
+        return state
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def load_results(path: str, swmr: bool = True) -> Dict:
+    """
+    Load the properties stored by :class:`ResultStore`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the HDF5 file.
+    swmr : bool
+        Whether open the file in the SWMR mode, which allows reading the file
+        while it is written by a running job. Default is ``True``.
+
+    Returns
+    -------
+    results : dict
+        The stored properties. The JSON values are decoded.
+    """
+    results = {}
+    with h5py.File(path, "r", libver="latest", swmr=swmr) as f:
+        for key, ds in f.items():
+            data = ds[()]
+            if ds.attrs["kind"] == JSON:
+                data = json.loads(data.tobytes().decode())
+            results[key] = data
+    return results
@@ -3,19 +3,27 @@
 #         Weitang Li <liwt31@163.com>
 
 
+import gzip
 import json
 import os
 import logging
+import pickle
 from datetime import datetime
 
 import numpy as np
 
 # this file shouldn't import anything from the `mps` module. IOW it's mps agnostic
 from renormalizer.utils.configs import EvolveConfig
+from renormalizer.utils.result_store import ResultStore
+from renormalizer.utils.profiler import profiler
 
 logger = logging.getLogger(__name__)
 
 
+# bump the version if the layout of the checkpoint is changed
+CHECKPOINT_VERSION = 1
+
+
 class TdMpsJob(object):
     def __init__(self, evolve_config: EvolveConfig = None, dump_mps: str=None, dump_dir: str=None, job_name: str=None):
         logger.info(f"Creating TDMPS job. dump_dir: {dump_dir}. job_name: {job_name}")
@@ -29,6 +37,8 @@ class TdMpsJob(object):
         self.evolve_times = [0]
         # output abstract of current mps every x steps
         self.info_interval = 1
+        # dump a checkpoint to restart the job every x steps. None: no checkpoint
+        self.checkpoint_interval = None
         # dump mps, None: not dumped, "all": dump all according to interval,  
         # "one": dump only the latest mps according to interval
         if dump_mps in [None, "all", "one"]:
@@ -37,6 +47,12 @@ class TdMpsJob(object):
             raise ValueError(f"dump_mps should be None, 'all', 'one'. Got {dump_mps}")
 
         self._dump_mps = None
+        # the format to dump the properties. "npz": rewrite the whole npz file every step.
+        # "hdf5": append the new time steps to an HDF5 file. See :class:`~renormalizer.utils.ResultStore`
+        self.dump_format = "npz"
+        # flush the HDF5 file every x steps
+        self.dump_flush_interval = 1
+        self._result_store = None
         self.dump_dir = dump_dir
         self.job_name = job_name
         mps = self.init_mps()
@@ -125,11 +141,13 @@ class TdMpsJob(object):
             logger.info("{} begin.".format(step_str))
             
             # evolve
-            new_mps = self.evolve_single_step(evolve_dt)
+            with profiler.region("evolve_single_step", step=len(self.evolve_times)):
+                new_mps = self.evolve_single_step(evolve_dt)
             
             # process
             self.evolve_times.append(self.latest_evolve_time + evolve_dt)
-            self.process_mps(new_mps)
+            with profiler.region("process_mps", step=len(self.evolve_times) - 1):
+                self.process_mps(new_mps)
             self.latest_mps = new_mps
             
             # wall time
@@ -150,12 +168,24 @@ class TdMpsJob(object):
             # dump
             if self._defined_output_path:
                 try:
-                    self.dump_dict()
+                    with profiler.region("dump_dict"):
+                        self.dump_dict()
                 except IOError:  # never quit calculation because of IOError
                     logger.exception("dumping dict failed with IOError")
                 dump_wall_time = datetime.now()
                 logger.info(f"Dumping time cost {dump_wall_time - evolution_wall_time}")
 
+            # checkpoint
+            if self.checkpoint_interval is not None and self._defined_output_path \
+                    and (len(self.evolve_times) - 1) % self.checkpoint_interval == 0:
+                try:
+                    self.dump_checkpoint()
+                except IOError:  # never quit calculation because of IOError
+                    logger.exception("dumping checkpoint failed with IOError")
+
+        if self._result_store is not None:
+            self._result_store.close()
+
         logger.info(f"{len(wall_times)-1} steps of evolution complete!")
         logger.info(
             "Normal termination. Time cost: %s" % (wall_times[-1] - wall_times[0])
@@ -183,18 +213,26 @@ class TdMpsJob(object):
             raise ValueError("Dump dir or job name not set")
         d = self.get_dump_dict()
         os.makedirs(self.dump_dir, exist_ok=True)
-        file_path = os.path.join(self.dump_dir, self.job_name + ".npz")
-        bak_path = file_path + ".bak"
-        if os.path.exists(file_path):
-            # in case of shutdown while dumping
+        if self.dump_format == "hdf5":
+            if self._result_store is None:
+                self._result_store = ResultStore(self.dump_path, self.dump_flush_interval)
+            self._result_store.flush_interval = self.dump_flush_interval
+            self._result_store.append(d, len(self.evolve_times))
+        elif self.dump_format == "npz":
+            file_path = self.dump_path
+            bak_path = file_path + ".bak"
+            if os.path.exists(file_path):
+                # in case of shutdown while dumping
+                if os.path.exists(bak_path):
+                    os.remove(bak_path)
+                os.rename(file_path, bak_path)
+
+            np.savez(file_path, **d)
+
             if os.path.exists(bak_path):
                 os.remove(bak_path)
-            os.rename(file_path, bak_path)
-
-        np.savez(file_path, **d)
-
-        if os.path.exists(bak_path):
-            os.remove(bak_path)
+        else:
+            raise ValueError(f"dump_format should be 'npz' or 'hdf5'. Got {self.dump_format}")
 
         # dump_mps
         if self._dump_mps is not None:
@@ -207,6 +245,83 @@ class TdMpsJob(object):
             self.latest_mps.dump(mps_path)
             
 
+    @property
+    def dump_path(self):
+        """
+        The path of the dumped properties, ``{dump_dir}/{job_name}.npz`` or ``{dump_dir}/{job_name}.h5``
+        according to ``dump_format``.
+        """
+        if not self._defined_output_path:
+            raise ValueError("Dump dir or job name not set")
+        ext = ".h5" if self.dump_format == "hdf5" else ".npz"
+        return os.path.join(self.dump_dir, self.job_name + ext)
+
+    @property
+    def checkpoint_path(self):
+        if not self._defined_output_path:
+            raise ValueError("Dump dir or job name not set")
+        return os.path.join(self.dump_dir, self.job_name + "_checkpoint.pkl.gz")
+
+    def dump_checkpoint(self, path: str = None):
+        """
+        Dump the whole job, including the latest MPS, the evolution time, the calculated properties
+        and the adaptive time step in ``evolve_config``, to restart the job with :meth:`resume`.
+        The checkpoint is first written to a temporary file and then renamed, so a job killed
+        during the dumping leaves the previous checkpoint intact.
+
+        Args:
+            path (str): the path of the checkpoint. Default is ``{dump_dir}/{job_name}_checkpoint.pkl.gz``.
+
+        Returns:
+            The path of the checkpoint.
+        """
+        if path is None:
+            path = self.checkpoint_path
+        header = {
+            "version": CHECKPOINT_VERSION,
+            "class": f"{self.__class__.__module__}.{self.__class__.__qualname__}",
+            "steps": len(self.evolve_times) - 1,
+            "evolve_time": self.latest_evolve_time,
+            "time_stamp": str(datetime.now()),
+        }
+        dirname = os.path.dirname(os.path.abspath(path))
+        os.makedirs(dirname, exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=1) as fout:
+            pickle.dump(header, fout)
+            pickle.dump(self, fout, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.info(f"Checkpoint dumped to {path}. {header}")
+        return path
+
+    @classmethod
+    def resume(cls, path: str):
+        """
+        Load a job dumped by :meth:`dump_checkpoint`. ``init_mps`` is not called again.
+        Continue the evolution by calling :meth:`evolve`, in which ``nsteps`` and ``evolve_time``
+        count from the checkpoint. For example, the remaining time of a job aiming at
+        ``total_time`` is ``total_time - job.latest_evolve_time``.
+
+        Args:
+            path (str): the path of the checkpoint.
+
+        Returns:
+            The restored job.
+        """
+        with gzip.open(path, "rb") as fin:
+            header = pickle.load(fin)
+            if header.get("version") != CHECKPOINT_VERSION:
+                raise ValueError(f"Unsupported checkpoint version: {header.get('version')}")
+            job = pickle.load(fin)
+        # jobs dumped before the attributes are introduced
+        job.__dict__.setdefault("dump_format", "npz")
+        job.__dict__.setdefault("dump_flush_interval", 1)
+        job.__dict__.setdefault("_result_store", None)
+        if not isinstance(job, cls):
+            raise TypeError(f"Checkpoint {path} contains {header['class']}, not {cls.__name__}")
+        logger.info(f"Job resumed from {path}. {header}")
+        return job
+
     def stop_evolve_criteria(self):
         return False
 
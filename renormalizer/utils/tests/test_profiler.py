@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+import pytest
+
+from renormalizer.mps import Mps, Mpo
+from renormalizer.mps.gs import optimize_mps
+from renormalizer.tests.parameter import holstein_model
+from renormalizer.utils import EvolveConfig, EvolveMethod, Profiler, profiler
+
+
+@pytest.fixture
+def started_profiler():
+    yield profiler
+    profiler.stop()
+
+
+def test_profiler(started_profiler):
+    mpo = Mpo(holstein_model)
+    mps = Mps.random(holstein_model, 1, 10)
+    mps.optimize_config.procedure = [[10, 0.4], [10, 0.2], [10, 0]]
+    profiler.start()
+    optimize_mps(mps, mpo)
+    mps = Mps.random(holstein_model, 1, 10)
+    mps.evolve_config = EvolveConfig(EvolveMethod.tdvp_ps)
+    mps.evolve(mpo, 10)
+    profiler.stop()
+
+    names = {event["name"] for event in profiler.events}
+    assert {"optimize_mps", "optimize_site", "eigensolver", "environ", "svd_qn",
+            "evolve", "tdvp_ps_site", "krylov"} <= names
+    summary = profiler.summary()
+    # the counts are inclusive
+    assert summary["optimize_site"]["hops"] == summary["eigensolver"]["hops"] > 0
+    assert summary["evolve"]["flops"] == summary["tdvp_ps_site"]["flops"] > 0
+    assert summary["evolve"]["krylov_vectors"] == summary["krylov"]["krylov_vectors"] > 0
+    sites = [event["args"]["site"] for event in profiler.events if event["name"] == "tdvp_ps_site"]
+    assert sorted(set(sites)) == list(range(len(mps)))
+    for event in profiler.events:
+        assert event["args"]["max_rss_mb"] > 0
+
+    # no event when disabled
+    n_events = len(profiler.events)
+    mps.evolve(mpo, 10)
+    assert len(profiler.events) == n_events
+
+
+@pytest.mark.parametrize("fname", ["trace.json", "trace.jsonl"])
+def test_profiler_output(tmpdir, fname):
+    path = os.path.join(str(tmpdir), fname)
+    p = Profiler()
+    p.start(path)
+    for i in p.sweep("site", range(5)):
+        with p.region("inner", shape=(i, 2)):
+            p.add(hops=2)
+        if i == 2:
+            break
+    p.stop()
+    with open(path) as fin:
+        if fname.endswith(".json"):
+            events = json.load(fin)
+        else:
+            events = [json.loads(line) for line in fin]
+    assert [event["name"] for event in events] == ["inner", "site"] * 3
+    assert [event["args"]["site"] for event in events[1::2]] == [0, 1, 2]
+    assert events[0]["args"]["shape"] == [0, 2]
+    assert p.summary()["site"]["hops"] == 6
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pickle
+
+import numpy as np
+
+from renormalizer.utils import ResultStore, load_results
+
+
+def test_result_store(tmpdir):
+    path = os.path.join(str(tmpdir), "test.h5")
+    store = ResultStore(path, flush_interval=2)
+    time_series, energies, rdms = [], [], []
+    for i in range(5):
+        time_series.append(0.1 * i)
+        energies.append(np.exp(1j * i))
+        rdms.append(np.eye(2) * i)
+        d = {"time series": time_series, "energy": energies, "rdm": rdms, "temperature": 0.1,
+             "mobility": float(i), "mol list": {"nmols": 2, "omega": np.array([1., 2.])}}
+        store.append(d, len(time_series))
+        # read by another reader during the evolution
+        res = load_results(path)
+        assert len(res["energy"]) == i + 1
+        assert res["mobility"] == i
+    # the time series are extended and the other values are overwritten
+    assert store._file["energy"].shape == (5,)
+    assert store._file["rdm"].shape == (5, 2, 2)
+    assert store._file["mobility"].shape == ()
+    # continue after unpickling
+    store = pickle.loads(pickle.dumps(store))
+    time_series.append(0.5)
+    energies.append(0)
+    rdms.append(np.eye(2) * 5)
+    store.append(d, len(time_series))
+    store.close()
+
+    res = load_results(path)
+    assert np.allclose(res["time series"], time_series)
+    assert np.allclose(res["energy"], energies)
+    assert np.allclose(res["rdm"], rdms)
+    assert res["temperature"] == 0.1
+    assert res["mol list"] == {"nmols": 2, "omega": [1., 2.]}
+
+
+def test_result_store_rewrite(tmpdir):
+    path = os.path.join(str(tmpdir), "test.h5")
+    store = ResultStore(path)
+    store.append({"x": np.arange(4)}, 4)
+    # old steps changed
+    store.append({"x": np.arange(5) + 1}, 5)
+    assert np.allclose(load_results(path)["x"], np.arange(5) + 1)
+    # fewer steps, such as restarting from a checkpoint
+    store.append({"x": np.arange(3)}, 3)
+    assert np.allclose(load_results(path)["x"], np.arange(3))
+    store.close()
+    # old steps of a list changed
+    store = ResultStore(path)
+    x = list(range(4))
+    store.append({"x": x}, 4)
+    x[3] = -1
+    x.append(4)
+    store.append({"x": x}, 5)
+    assert np.allclose(load_results(path)["x"], x)
+    store.close()